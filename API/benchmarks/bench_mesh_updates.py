@@ -0,0 +1,53 @@
+"""Encode time and bytes on the wire of bulk mesh updates, packed arrays vs the JSON models
+
+Run from the API folder: python benchmarks/bench_mesh_updates.py [max N, by default 1000000]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import oursin as urchin
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+class NullTransport(urchin.client.Transport):
+	"""Drops every event, counting its bytes"""
+	def __init__(self):
+		self.n_bytes = 0
+
+	def connected(self):
+		return True
+
+	def emit(self, event, data=None):
+		self.n_bytes += urchin.client.payload_size(data)
+
+def update(transport, meshes, positions, scales, colors, binary):
+	"""Returns (seconds, bytes on the wire) of one set_positions + set_scales + set_colors"""
+	urchin.meshes.binary = binary
+	transport.n_bytes = 0
+
+	start = time.perf_counter()
+	urchin.meshes.set_positions(meshes, positions)
+	urchin.meshes.set_scales(meshes, scales)
+	urchin.meshes.set_colors(meshes, colors)
+	return time.perf_counter() - start, transport.n_bytes
+
+if __name__ == '__main__':
+	max_n = int(float(sys.argv[1])) if len(sys.argv) > 1 else SIZES[-1]
+	transport = NullTransport()
+	urchin.client.use_transport(transport)
+	rng = np.random.default_rng(0)
+
+	meshes = []
+	print(f'{"N":>9} {"models MB":>10} {"models s":>9} {"packed MB":>10} {"packed s":>9} {"speedup":>8}')
+	for n in [size for size in SIZES if size <= max_n]:
+		meshes += urchin.meshes.create(n - len(meshes))
+		positions = rng.random((n, 3), dtype=np.float32) * 10000
+		scales = rng.random((n, 3), dtype=np.float32) + 0.5
+		colors = rng.random((n, 3), dtype=np.float32)
+
+		model_time, model_bytes = update(transport, meshes, positions, scales, colors, binary=False)
+		packed_time, packed_bytes = update(transport, meshes, positions, scales, colors, binary=True)
+		print(f'{n:>9} {model_bytes / 1e6:>10.3f} {model_time:>9.3f} {packed_bytes / 1e6:>10.3f} {packed_time:>9.3f} {model_time / packed_time:>8.1f}')
@@ -0,0 +1,51 @@
+"""Bytes on the wire and encode time of sparse vs dense Volume uploads
+
+Run from the API folder: python benchmarks/bench_sparse_volumes.py
+"""
+
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+SHAPE = (264, 228, 160) # 50um CCF
+FILL_FRACTIONS = [0.001, 0.01, 0.05, 0.2]
+
+def synthetic_volume(fill_fraction, rng):
+	"""Transparent volume with a few random filled spheres (annotation-like blobs)"""
+	volume = np.full(SHAPE, 255, dtype=np.uint8)
+	grid = np.ogrid[tuple(slice(0, size) for size in SHAPE)]
+	target = fill_fraction * volume.size
+	while np.count_nonzero(volume != 255) < target:
+		center = rng.integers(0, SHAPE)
+		radius = rng.integers(3, 12)
+		mask = sum((axis - c) ** 2 for axis, c in zip(grid, center)) <= radius ** 2
+		volume[mask] = rng.integers(0, 254)
+	return volume
+
+def upload(volume, **kwargs):
+	"""Returns (encode seconds, bytes on the wire)"""
+	with patch.object(urchin.client, 'sio') as sio:
+		start = time.perf_counter()
+		urchin.volumes.Volume(volume, **kwargs)
+		elapsed = time.perf_counter() - start
+
+	n_bytes = 0
+	for call in sio.emit.call_args_list:
+		data = call[0][1]
+		parts = data if isinstance(data, list) else [data]
+		n_bytes += sum(len(part) for part in parts)
+	return elapsed, n_bytes
+
+if __name__ == '__main__':
+	urchin.cache.enabled = False
+	rng = np.random.default_rng(0)
+
+	print(f'{"filled":>8} {"dense MB":>10} {"dense s":>9} {"sparse MB":>10} {"sparse s":>9} {"ratio":>7}')
+	for fill_fraction in FILL_FRACTIONS:
+		volume = synthetic_volume(fill_fraction, rng)
+		dense_time, dense_bytes = upload(volume)
+		sparse_time, sparse_bytes = upload(volume, sparse=True)
+		print(f'{fill_fraction:>8.1%} {dense_bytes / 1e6:>10.3f} {dense_time:>9.3f} {sparse_bytes / 1e6:>10.3f} {sparse_time:>9.3f} {dense_bytes / sparse_bytes:>7.1f}')
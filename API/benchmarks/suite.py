@@ -0,0 +1,282 @@
+"""Benchmarks of the hot client paths, run against the in-process loopback renderer
+
+Each scenario reports the messages and bytes that reached the renderer, the bytes the renderer
+sent back (screenshots, cache replies), the wall time and the peak Python memory (tracemalloc) of
+the measured step. Results can be stored as baselines and
+later runs compared against them.
+
+Run from the API folder:
+
+	python benchmarks/suite.py                  # default scenarios
+	python benchmarks/suite.py --large          # include the 1M particle, 10um volume and 15K screenshot scenarios
+	python benchmarks/suite.py -k particles     # scenarios whose name contains 'particles'
+	python benchmarks/suite.py --save           # store the results in baselines.json
+	python benchmarks/suite.py --compare        # flag regressions against baselines.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import oursin as urchin
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# CCF volume shapes (AP, ML, DV)
+CCF_SHAPES = {
+	'25um': (528, 320, 456),
+	'10um': (1320, 800, 1140),
+}
+
+SCENARIOS = {}
+WORKER_PREFIX = 'urchin-benchmark-result:'
+
+def scenario(name, large = False):
+	"""Register a scenario
+
+	The decorated function does the setup and returns the callable that is measured, which can
+	return a dict of metrics that replace the measured ones.
+	"""
+	def register(setup):
+		SCENARIOS[name] = (setup, large)
+		return setup
+	return register
+
+###### SCENARIOS #######
+
+def _particles(n, binary = False):
+	def setup():
+		urchin.particles.binary = binary
+		positions = np.random.default_rng(0).random((n, 3), dtype=np.float32) * 10000
+		colors = np.random.default_rng(1).random((n, 3), dtype=np.float32)
+
+		def run():
+			group = urchin.particles.ParticleGroup(n)
+			group.set_positions(positions)
+			group.set_colors(colors)
+		return run
+	return setup
+
+scenario('particles-10k')(_particles(10000))
+scenario('particles-100k')(_particles(100000))
+scenario('particles-1M', large = True)(_particles(1000000))
+scenario('particles-100k-binary')(_particles(100000, binary = True))
+scenario('particles-1M-binary', large = True)(_particles(1000000, binary = True))
+
+def _meshes_updates(n, binary = False):
+	def setup():
+		urchin.meshes.binary = binary
+		meshes = urchin.meshes.create(n)
+		positions = (np.random.default_rng(0).random((n, 3)) * 10000).tolist()
+
+		def run():
+			urchin.meshes.set_positions(meshes, positions)
+			for mesh, position in zip(meshes[:1000], positions):
+				mesh.set_position(position)
+		return run
+	return setup
+
+scenario('meshes-10k-updates')(_meshes_updates(10000))
+scenario('meshes-10k-updates-binary')(_meshes_updates(10000, binary = True))
+
+def _atlas_updates(deltas = False):
+	def setup():
+		atlas = urchin.ccf25
+		atlas.deltas = deltas
+		atlas.load()
+		areas = atlas.get_areas([area.acronym for area in atlas.data.areas])
+		rng = np.random.default_rng(0)
+		colors = rng.random((len(areas), 3)).tolist()
+		intensities = rng.random(len(areas)).tolist()
+
+		def run():
+			atlas.set_colors(areas, colors)
+			atlas.set_color_intensity(areas, intensities)
+		return run
+	return setup
+
+scenario('atlas-colors-intensities')(_atlas_updates())
+scenario('atlas-colors-intensities-deltas')(_atlas_updates(deltas = True))
+
+def _volume(resolution):
+	def setup():
+		shape = CCF_SHAPES[resolution]
+		volume = np.full(shape, np.nan, dtype=np.float32)
+		# a filled ellipsoid, roughly the brain's share of the CCF box
+		grid = np.ogrid[tuple(slice(0, size) for size in shape)]
+		inside = sum(((axis - size / 2) / (size / 2)) ** 2 for axis, size in zip(grid, shape)) < 1
+		volume[inside] = np.random.default_rng(0).random(int(inside.sum()), dtype=np.float32)
+		del inside
+
+		def run():
+			data, _ = urchin.volumes.compress_volume(volume)
+			urchin.volumes.Volume(data, block_size = 4000000)
+		return run
+	return setup
+
+scenario('volume-25um')(_volume('25um'))
+scenario('volume-10um', large = True)(_volume('10um'))
+
+def _screenshot(size):
+	def setup():
+		camera = urchin.camera.Camera()
+
+		def run():
+			asyncio.run(camera.screenshot(size))
+		return run
+	return setup
+
+scenario('screenshot-4K')(_screenshot([3840, 2160]))
+scenario('screenshot-15K', large = True)(_screenshot([15000, 15000]))
+
+@scenario('import-oursin')
+def import_time():
+	code = 'import time; t = time.perf_counter(); import oursin; print(time.perf_counter() - t)'
+
+	def run():
+		# report the import itself, not the interpreter startup
+		result = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True)
+		return {'seconds': float(result.stdout.strip())}
+	return run
+
+###### RUNNER #######
+
+def measure(name):
+	"""Run one scenario on a fresh loopback renderer
+
+	Returns
+	-------
+	dict
+		messages, bytes (client -> renderer), reply_bytes (renderer -> client), seconds, peak_mb
+	"""
+	setup, _ = SCENARIOS[name]
+	previous = urchin.client.transport
+	renderer = urchin.loopback.connect()
+	urchin.cache.clear()
+
+	try:
+		run = setup()
+		renderer.reset_stats()
+
+		tracemalloc.start()
+		start = time.perf_counter()
+		overrides = run()
+		seconds = time.perf_counter() - start
+		_, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+	finally:
+		if tracemalloc.is_tracing():
+			tracemalloc.stop()
+		urchin.client.use_transport(previous)
+
+	result = {
+		'messages': renderer.n_messages,
+		'bytes': renderer.n_bytes,
+		'reply_bytes': renderer.n_reply_bytes,
+		'seconds': seconds,
+		'peak_mb': peak / 1e6,
+	}
+	result.update(overrides or {})
+	return result
+
+def run_isolated(name):
+	"""Measure a scenario in a fresh interpreter, so that scenarios don't share state or memory
+	"""
+	result = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name], capture_output = True, text = True)
+	for line in result.stdout.splitlines():
+		if line.startswith(WORKER_PREFIX):
+			return json.loads(line[len(WORKER_PREFIX):])
+	return {'error': (result.stderr.strip().splitlines() or ['no result'])[-1]}
+
+def compare(results, baselines, tolerance):
+	"""Flag results that got worse than the baseline
+
+	Messages and bytes are deterministic and compared exactly, time and memory with a tolerance.
+	Metrics missing from the baseline are skipped.
+
+	Returns
+	-------
+	dict
+		scenario -> list of regression descriptions
+	"""
+	regressions = {}
+	for name, result in results.items():
+		baseline = baselines.get(name)
+		if baseline is None or 'error' in result or 'error' in baseline:
+			continue
+
+		problems = []
+		for metric in ('messages', 'bytes', 'reply_bytes'):
+			if metric in baseline and result[metric] > baseline[metric]:
+				problems.append(f'{metric} {baseline[metric]} -> {result[metric]}')
+		for metric in ('seconds', 'peak_mb'):
+			if result[metric] > baseline[metric] * (1 + tolerance):
+				problems.append(f'{metric} {baseline[metric]:.3f} -> {result[metric]:.3f}')
+		if len(problems) > 0:
+			regressions[name] = problems
+	return regressions
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = 'Urchin client benchmarks')
+	parser.add_argument('-k', dest = 'pattern', default = '', help = 'only run scenarios whose name contains this')
+	parser.add_argument('--large', action = 'store_true', help = 'include the large scenarios')
+	parser.add_argument('--save', action = 'store_true', help = f'store the results in {BASELINES}')
+	parser.add_argument('--compare', action = 'store_true', help = 'compare against the stored baselines')
+	parser.add_argument('--tolerance', type = float, default = 0.25, help = 'allowed relative slowdown, by default 0.25')
+	parser.add_argument('--worker', help = argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.worker is not None:
+		try:
+			result = measure(args.worker)
+		except Exception as e:
+			result = {'error': f'{type(e).__name__}: {e}'.splitlines()[0]}
+		print(WORKER_PREFIX + json.dumps(result))
+		return 0
+
+	names = [name for name, (_, large) in SCENARIOS.items()
+		  if args.pattern in name and (args.large or not large)]
+
+	results = {}
+	print(f'{"scenario":<32} {"messages":>9} {"MB":>10} {"reply MB":>10} {"seconds":>9} {"peak MB":>9}')
+	for name in names:
+		results[name] = run_isolated(name)
+		result = results[name]
+		if 'error' in result:
+			print(f'{name:<32} skipped, {result["error"]}')
+			continue
+		print(f'{name:<32} {result["messages"]:>9} {result["bytes"] / 1e6:>10.3f} {result["reply_bytes"] / 1e6:>10.3f} '
+			  f'{result["seconds"]:>9.3f} {result["peak_mb"]:>9.1f}')
+
+	stored = {}
+	if os.path.exists(BASELINES):
+		with open(BASELINES) as f:
+			stored = json.load(f)
+
+	status = 0
+	if args.compare:
+		regressions = compare(results, stored.get('scenarios', {}), args.tolerance)
+		for name, problems in regressions.items():
+			print(f'REGRESSION {name}: {", ".join(problems)}')
+		status = 1 if len(regressions) > 0 else 0
+
+	if args.save:
+		stored.setdefault('scenarios', {}).update(results)
+		stored['machine'] = {'platform': platform.platform(), 'python': platform.python_version(),
+					   'cpus': os.cpu_count()}
+		with open(BASELINES, 'w') as f:
+			json.dump(stored, f, indent = 2, sort_keys = True)
+
+	return status
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -8,12 +8,16 @@ __author__ = 'Daniel Birman'
 # load the client
 from . import client
 from .renderer import *
+from .client import batch
 
 # load sanitization
 from . import utils
+from . import cache
 
 # load the scene controls
 from . import camera
+from . import video
+from . import animation
 
 # load the object controls
 from . import lines
@@ -24,6 +28,7 @@ from . import text
 from . import volumes
 from . import texture
 from . import custom
+from . import loopback
 from . import dock
 
 # load the colors
@@ -31,3 +36,9 @@ from . import colors
 
 # load the atlases
 from .atlas import *
+
+def __getattr__(name):
+	# atlases (urchin.ccf25, ...) are created lazily on first access
+	if name in atlas.ATLAS_NAMES:
+		return getattr(atlas, name)
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
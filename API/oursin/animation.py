@@ -0,0 +1,327 @@
+"""Keyframe animation of camera paths
+
+A whole trajectory is precomputed in NumPy (quaternion slerp for the rotation, cubic splines for
+the target, zoom and pan, with per-segment easing), uploaded to the renderer once as a packed
+array and then stepped by frame index.
+"""
+
+from . import client
+from . import camera
+from . import utils
+from . import video
+
+import numpy as np
+
+# columns of the packed trajectory, NaN means the field is not animated
+FRAME_LAYOUT = ['qx', 'qy', 'qz', 'qw', 'ap', 'ml', 'dv', 'zoom', 'panX', 'panY']
+
+EASINGS = {
+	'linear': lambda s: s,
+	'ease_in': lambda s: s ** 3,
+	'ease_out': lambda s: 1 - (1 - s) ** 3,
+	'ease_in_out': lambda s: np.where(s < 0.5, 4 * s ** 3, 1 - (-2 * s + 2) ** 3 / 2),
+	'smoothstep': lambda s: s * s * (3 - 2 * s),
+}
+
+NAMED_ROTATIONS = {
+	'axial': [0, 0, 0],
+	'sagittal': [0, 90, -90],
+	'coronal': [-90, 0, 0],
+	'angled': [22.5, 22.5, 225],
+}
+
+def _quat_multiply(a, b):
+	"""Internal helper, Hamilton product of (N, 4) [x, y, z, w] quaternions
+	"""
+	ax, ay, az, aw = np.moveaxis(a, -1, 0)
+	bx, by, bz, bw = np.moveaxis(b, -1, 0)
+	return np.stack((
+		aw * bx + ax * bw + ay * bz - az * by,
+		aw * by - ax * bz + ay * bw + az * bx,
+		aw * bz + ax * by - ay * bx + az * bw,
+		aw * bw - ax * bx - ay * by - az * bz,
+	), axis=-1)
+
+def _axis_quat(angles, axis):
+	"""Internal helper, quaternions for rotations of angles (degrees) around a unit axis
+	"""
+	half = np.radians(angles) / 2
+	quat = np.zeros(half.shape + (4,))
+	quat[..., axis] = np.sin(half)
+	quat[..., 3] = np.cos(half)
+	return quat
+
+def euler_to_quaternion(rotations):
+	"""Convert camera rotations to quaternions
+
+	Rotations are (pitch, yaw, roll) in degrees, applied in the camera's order: roll, then pitch,
+	then yaw (pitch around x, yaw around y, roll around z).
+
+	Parameters
+	----------
+	rotations : (N, 3) array-like
+
+	Returns
+	-------
+	np.ndarray
+		(N, 4) [x, y, z, w] unit quaternions
+	"""
+	rotations = np.asarray(rotations, dtype=float).reshape(-1, 3)
+	pitch = _axis_quat(rotations[:, 0], 0)
+	yaw = _axis_quat(rotations[:, 1], 1)
+	roll = _axis_quat(rotations[:, 2], 2)
+	return _quat_multiply(_quat_multiply(yaw, pitch), roll)
+
+def slerp(q0, q1, t):
+	"""Spherical linear interpolation, vectorized over rows
+
+	Parameters
+	----------
+	q0, q1 : (N, 4) array
+		[x, y, z, w] unit quaternions
+	t : (N,) array
+		0 -> 1
+
+	Returns
+	-------
+	np.ndarray
+		(N, 4) unit quaternions, always along the shortest arc
+	"""
+	q0 = np.asarray(q0, dtype=float)
+	q1 = np.array(q1, dtype=float)
+	t = np.asarray(t, dtype=float)[:, np.newaxis]
+
+	dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+	q1 = np.where(dot < 0, -q1, q1)
+	dot = np.clip(np.abs(dot), 0, 1)
+
+	theta = np.arccos(dot)
+	sin_theta = np.sin(theta)
+	# fall back to a normalized lerp for (nearly) identical rotations
+	close = sin_theta < 1e-6
+	safe = np.where(close, 1, sin_theta)
+	w0 = np.where(close, 1 - t, np.sin((1 - t) * theta) / safe)
+	w1 = np.where(close, t, np.sin(t * theta) / safe)
+
+	out = w0 * q0 + w1 * q1
+	return out / np.linalg.norm(out, axis=-1, keepdims=True)
+
+def _segments(key_times, times, easings):
+	"""Internal helper, segment index and eased local time of each frame
+	"""
+	index = np.clip(np.searchsorted(key_times, times, side='right') - 1, 0, len(key_times) - 2)
+	span = key_times[index + 1] - key_times[index]
+	s = np.clip((times - key_times[index]) / np.where(span > 0, span, 1), 0, 1)
+
+	# the easing of a keyframe applies to the segment that ends on it
+	segment_easing = np.asarray(easings[1:])[index]
+	for name in np.unique(segment_easing):
+		mask = segment_easing == name
+		s[mask] = EASINGS[name](s[mask])
+	return index, s
+
+def spline(key_times, values, times, easings=None):
+	"""Cubic Hermite (Catmull-Rom) interpolation through keyframes, vectorized over frames
+
+	Parameters
+	----------
+	key_times : (K,) array
+		increasing keyframe times
+	values : (K, D) array
+	times : (N,) array
+		frame times, values are held constant outside the keyframe range
+	easings : list of string, optional
+		easing of the segment ending at each keyframe, by default linear
+
+	Returns
+	-------
+	np.ndarray
+		(N, D)
+	"""
+	key_times = np.asarray(key_times, dtype=float)
+	values = np.asarray(values, dtype=float).reshape(len(key_times), -1)
+	times = np.asarray(times, dtype=float)
+	if len(key_times) == 1:
+		return np.repeat(values, len(times), axis=0)
+	if easings is None:
+		easings = ['linear'] * len(key_times)
+
+	# finite difference tangents, one-sided at the ends
+	tangents = np.gradient(values, key_times, axis=0) if len(key_times) > 2 else \
+		np.repeat((values[1:] - values[:1]) / (key_times[1] - key_times[0]), 2, axis=0)
+
+	index, s = _segments(key_times, times, easings)
+	h = (key_times[index + 1] - key_times[index])[:, np.newaxis]
+	s = s[:, np.newaxis]
+	s2 = s * s
+	s3 = s2 * s
+
+	return ((2 * s3 - 3 * s2 + 1) * values[index]
+		 + (s3 - 2 * s2 + s) * h * tangents[index]
+		 + (-2 * s3 + 3 * s2) * values[index + 1]
+		 + (s3 - s2) * h * tangents[index + 1])
+
+class Animation:
+	"""Camera path defined by keyframes
+
+	Each field (rotation, target, zoom, pan) is interpolated over the keyframes that set it, so
+	keyframes don't need to specify every field.
+	"""
+	def __init__(self, cam = None):
+		"""
+		Parameters
+		----------
+		cam : Camera, optional
+			camera to animate, by default urchin.camera.main
+
+		Examples
+		--------
+		>>> anim = urchin.animation.Animation()
+		>>> anim.add_keyframe(0, rotation='axial', zoom=8)
+		>>> anim.add_keyframe(2, rotation='sagittal', easing='ease_in_out')
+		>>> anim.add_keyframe(5, rotation='angled', zoom=4)
+		>>> anim.upload(frame_rate=30)
+		>>> anim.set_frame(45)
+		"""
+		self.camera = cam if cam is not None else camera.main
+		self.keyframes = {'rotation': [], 'target': [], 'zoom': [], 'pan': []}
+		self.frame_rate = None
+		self.frames = None
+
+	def add_keyframe(self, time, rotation = None, target = None, zoom = None, pan = None, easing = 'ease_in_out'):
+		"""Add a keyframe
+
+		Parameters
+		----------
+		time : float
+			seconds from the start of the animation
+		rotation : vector3 or string, optional
+			(pitch, yaw, roll) or 'axial'/'coronal'/'sagittal'/'angled', see Camera.set_rotation
+		target : vector3, optional
+			target coordinate (ap, ml, dv) in um
+		zoom : float, optional
+		pan : list of two floats, optional
+		easing : string, optional
+			easing of the segment that ends on this keyframe, see EASINGS, by default 'ease_in_out'
+		"""
+		if easing not in EASINGS:
+			raise Exception(f'(urchin.animation) Easing {easing} is not supported, options are {list(EASINGS.keys())}')
+
+		if isinstance(rotation, str):
+			rotation = NAMED_ROTATIONS[rotation]
+
+		for field, value in (('rotation', rotation), ('target', target), ('zoom', zoom), ('pan', pan)):
+			if value is None:
+				continue
+			if field in ('rotation', 'target'):
+				value = utils.sanitize_vector3(value)
+			self.keyframes[field].append((float(time), value, easing))
+			self.keyframes[field].sort(key = lambda keyframe: keyframe[0])
+
+		self.frames = None
+
+	@property
+	def duration(self):
+		return max([keyframes[-1][0] for keyframes in self.keyframes.values() if len(keyframes) > 0], default = 0)
+
+	def compute(self, frame_rate = 30):
+		"""Precompute every frame
+
+		Parameters
+		----------
+		frame_rate : int, optional
+			by default 30
+
+		Returns
+		-------
+		np.ndarray
+			(n_frames, 10) float32, columns in FRAME_LAYOUT order
+		"""
+		n_frames = int(round(self.duration * frame_rate)) + 1
+		times = np.arange(n_frames) / frame_rate
+
+		frames = np.full((n_frames, len(FRAME_LAYOUT)), np.nan, dtype=np.float32)
+
+		rotations = self.keyframes['rotation']
+		if len(rotations) > 0:
+			key_times = np.array([keyframe[0] for keyframe in rotations])
+			quats = euler_to_quaternion([keyframe[1] for keyframe in rotations])
+			if len(rotations) == 1:
+				frames[:, 0:4] = quats[0]
+			else:
+				index, s = _segments(key_times, times, [keyframe[2] for keyframe in rotations])
+				frames[:, 0:4] = slerp(quats[index], quats[index + 1], s)
+
+		for field, columns in (('target', slice(4, 7)), ('zoom', slice(7, 8)), ('pan', slice(8, 10))):
+			keyframes = self.keyframes[field]
+			if len(keyframes) > 0:
+				frames[:, columns] = spline([keyframe[0] for keyframe in keyframes],
+								[keyframe[1] for keyframe in keyframes], times,
+								[keyframe[2] for keyframe in keyframes])
+
+		self.frame_rate = frame_rate
+		self.frames = frames
+		return frames
+
+	@property
+	def n_frames(self):
+		return 0 if self.frames is None else len(self.frames)
+
+	def upload(self, frame_rate = 30):
+		"""Compute the trajectory and send it to the renderer as a single packed array
+
+		Parameters
+		----------
+		frame_rate : int, optional
+			by default 30
+		"""
+		if self.frames is None or self.frame_rate != frame_rate:
+			self.compute(frame_rate)
+
+		data = {}
+		data['name'] = self.camera.id
+		data['frameRate'] = frame_rate
+		data['layout'] = FRAME_LAYOUT
+		client.emit_arrays('SetCameraAnimation', data, key = self.camera.id, frames = self.frames)
+
+	def set_frame(self, index):
+		"""Jump the camera to a frame of the uploaded trajectory
+
+		Parameters
+		----------
+		index : int
+		"""
+		if self.frames is None:
+			raise Exception('(urchin.animation) Call upload() before stepping frames')
+		if index < 0 or index >= self.n_frames:
+			raise Exception(f'(urchin.animation) Frame {index} is out of range, the animation has {self.n_frames} frames')
+
+		client.emit('SetCameraAnimationFrame', {self.camera.id: int(index)})
+
+	async def capture(self, file_name, frame_rate = 30, size = (1024,768), pipeline_depth = 1, workers = None,
+				   timeout = None, backend = 'auto', codec = 'h264', crf = 18, threads = 0, raw_frames = False):
+		"""Render every frame of the animation to a video file, must be awaited
+
+		The trajectory is uploaded once, each screenshot request only carries its frame index.
+		See Camera.capture_video for the parameters, pipeline_depth > 1 needs a renderer that
+		supports urchin.camera.concurrent_requests.
+
+		Examples
+		--------
+		>>> await anim.capture('flythrough.mp4')
+		"""
+		self.upload(frame_rate)
+
+		if backend == 'opencv':
+			out = video.open_writer(file_name, frame_rate, size, backend)
+		else:
+			out = video.open_writer(file_name, frame_rate, size, backend, codec = codec, crf = crf, threads = threads)
+
+		try:
+			await self.camera._capture_frames(self.n_frames, size, out.write, pipeline_depth, workers, timeout,
+									 image_format = 'raw' if raw_frames else None, animated = True)
+		except BaseException:
+			video.abort(out)
+			raise
+		out.release()
+		print(f'Animation captured on {self.camera.id} saved to {file_name}')
@@ -1,5 +1,14 @@
 from .ontology import *
 
-ccf25 = Atlas('ccf25')
-waxholm39 = Atlas('waxholm39')
-waxholm78 = Atlas('waxholm78')
\ No newline at end of file
+# atlases are created on first access, so that importing urchin doesn't parse any ontology files
+ATLAS_NAMES = ['ccf25', 'waxholm39', 'waxholm78']
+
+def __getattr__(name):
+    if name in ATLAS_NAMES:
+        atlas = Atlas(name)
+        globals()[name] = atlas
+        return atlas
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + ATLAS_NAMES)
@@ -3,7 +3,7 @@ from .. import utils
 from pathlib import Path
 
 import json
-from vbl_aquarium.models.urchin import AtlasModel, StructureModel
+from vbl_aquarium.models.urchin import AtlasModel, ColormapModel, StructureModel
 from vbl_aquarium.models.generic import *
 
 class CustomAtlas:
@@ -17,15 +17,54 @@ class CustomAtlas:
 
         print(data)
 
-        client.sio.emit('CustomAtlas', json.dumps(data))
+        client.emit('CustomAtlas', json.dumps(data))
 
 class Atlas:
+    instances = []
+    # send area changes as 'urchin-atlas-delta' messages with only the changed fields, the renderer
+    # must handle them. By default (False) every change re-sends the full 'urchin-atlas-update'.
+    # Set on the class for every atlas or on one atlas, e.g. urchin.ccf25.deltas = True
+    deltas = False
+
     def __init__(self, atlas_name):
-        # load the ontology structure file
+        """Create an atlas, the ontology file is only parsed on first use
+
+        Parameters
+        ----------
+        atlas_name : string
+            name of a structures file in atlas/data, e.g. 'ccf25'
+        """
+        self.atlas_name = atlas_name
         self.loaded = False
+        self._dirty = {}
+        self._parsed = False
+
+        Atlas.instances.append(self)
+
+    def __getattr__(self, name):
+        # only called when normal attribute lookup fails: parse the ontology on first use, then look
+        # for a structure acronym
+        if name.startswith('__') or '_parsed' not in self.__dict__:
+            raise AttributeError(name)
+
+        if not self._parsed:
+            self._parse()
+            return getattr(self, name)
+
+        try:
+            return self._structures[name]
+        except KeyError:
+            raise AttributeError(f'Atlas {self.atlas_name} has no attribute or area {name}')
+
+    def _parse(self):
+        """Internal helper function, load the ontology structure file and build the area models
+        """
+        self._parsed = True
+        self._structures = {}
         self.data = AtlasModel(
-            name = atlas_name,
-            areas = []
+            name = self.atlas_name,
+            areas = [],
+            colormap = ColormapModel()
         )
 
         current_script_directory = Path(__file__).resolve().parent
@@ -51,21 +90,78 @@ class Atlas:
                 update_callback=self._update
             )
 
-            setattr(self, structure_data['acronym'], area)
+            self._structures[structure_data['acronym']] = area
+
+        # the full state of a loaded atlas is sent once it exists, see load()
+        if self.loaded:
+            self.sync()
+
+    def _update(self, indices = (), fields = (), push = True):
+        """Internal helper function, mark area fields as changed and push the changes to Unity
+
+        Parameters
+        ----------
+        indices : list of int, optional
+            indexes of the areas that changed
+        fields : list of string, optional
+            StructureModel fields that changed
+        push : bool, optional
+            send the accumulated changes, by default True
+        """
+        for index in indices:
+            self._dirty.setdefault(index, set()).update(fields)
+
+        if push:
+            self._push()
+
+    def _push(self):
+        """Internal helper function, send the changed areas to Unity
 
-    def _update(self):
-        """Internal helper function, push data to Unity and update all values
+        With deltas enabled only the changed areas and fields are sent, the delta lists the atlas ID
+        and index of each changed area, plus the changed fields serialized with the same aliases as
+        the full AtlasModel. Otherwise the full atlas is re-sent.
         """
-        client.sio.emit('urchin-atlas-update', self.data.to_string())
+        if len(self._dirty) == 0:
+            return
+
+        if not self.deltas:
+            self.sync()
+            return
+
+        areas = []
+        for index, fields in sorted(self._dirty.items()):
+            area_data = self.data.areas[index].model_dump(mode='json', by_alias=True, include=fields)
+            area_data['Index'] = index
+            area_data['AtlasId'] = self.data.areas[index].atlas_id
+            areas.append(area_data)
+        self._dirty = {}
+
+        data = {}
+        data['Name'] = self.data.name
+        data['Areas'] = areas
+
+        client.emit('urchin-atlas-delta', json.dumps(data))
+
+    def sync(self):
+        """Push the full atlas state to Unity, e.g. after a reconnect
+
+        Any pending changes are included, so the change tracking is reset.
+        """
+        self._dirty = {}
+        client.emit('urchin-atlas-update', self.data.to_string(), key=self.data.name)
 
     def load(self):
         """Load this atlas
+
+        The ontology isn't parsed here, the full atlas state follows on first use of an area.
         """
         if self.loaded:
             print("(Warning) Atlas was already loaded, the renderer can have issues if you try to load an atlas twice.")
         
         self.loaded = True
-        client.sio.emit('urchin-atlas-load', self.data.name)
+        client.emit('urchin-atlas-load', self.atlas_name)
+        if self._parsed:
+            self.sync()
 
     def clear(self):
         """Clear all visible areas
@@ -75,14 +171,14 @@ class Atlas:
         for area in self.data.areas:
             area.visible = False
 
-        client.sio.emit('Clear', 'area')
+        client.emit('Clear', 'area')
 
     def load_defaults(self):
         """Load the left and right areas
 
         Note that this function is not stateful, if you save the scene it will not be reloaded.
         """
-        client.sio.emit('urchin-atlas-defaults', "")
+        client.emit('urchin-atlas-defaults', "")
 
     def set_reference_coord(self, reference_coord):
         """Set the reference coordinate for the atlas (Bregma by default)
@@ -92,7 +188,7 @@ class Atlas:
         reference_coord : list of float
         """
         self.data.reference_coord = utils.formatted_vector3(utils.sanitize_vector3(reference_coord))
-        self._update
+        self.sync()
 
     def get_areas(self, area_list):
         """Get the area objects given a list of area acronyms
@@ -140,8 +236,7 @@ class Atlas:
             self.data.areas[area.index].visible = area_visibility[i]
             self.data.areas[area.index].side = side.value
 
-        if push:
-            self._update()
+        self._update([area.index for area in area_list], ('visible', 'side'), push)
 
     def set_colors(self, area_list, area_colors, push = True):
         """Set color of multiple areas at once.
@@ -161,8 +256,7 @@ class Atlas:
         for i, area in enumerate(area_list):
             self.data.areas[area.index].color = utils.formatted_color(area_colors[i])
 
-        if push:
-            self._update()
+        self._update([area.index for area in area_list], ('color',), push)
         
     def set_colormap(self, colormap_name):
         """Set colormap used for mapping area *intensity* values to colors
@@ -181,8 +275,8 @@ class Atlas:
         colormap_name : string
             colormap name
         """
-        self.data.colormap = colormap_name
-        self._update()
+        self.data.colormap.name = utils.sanitize_string(colormap_name)
+        self.sync()
 
     def set_color_intensity(self, area_list, area_intensities, push = True):
         """Set intensity values, colors will be set according to the active colormap
@@ -201,8 +295,7 @@ class Atlas:
         for i, area in enumerate(area_list):
             self.data.areas[area.index].color_intensity = area_intensities[i]
 
-        if push:
-            self._update()
+        self._update([area.index for area in area_list], ('color_intensity',), push)
 
     def set_alphas(self, area_list, area_alphas, push = True):
         """Set alpha values, without changing colors
@@ -217,8 +310,7 @@ class Atlas:
         for i, area in enumerate(area_list):
             self.data.areas[area.index].color.a = area_alphas[i]
 
-        if push:
-            self._update()
+        self._update([area.index for area in area_list], ('color',), push)
 
     def set_materials(self, area_list, area_materials, push = True):
         """Set material of multiple areas at once.
@@ -244,8 +336,7 @@ class Atlas:
         for i, area in enumerate(area_list):
             self.data.areas[area.index].material = area_materials[i]
 
-        if push:
-            self._update()
+        self._update([area.index for area in area_list], ('material',), push)
 
 class Structure:
     """Structure attributes can be accessed as
@@ -278,8 +369,7 @@ class Structure:
         self.data.visible = visibility
         self.data.side = side.value
 
-        if push:
-            self.update_callback()
+        self.update_callback([self.index], ('visible', 'side'), push)
 
     def set_color(self, color, push = True):
         """Set area color.
@@ -295,8 +385,7 @@ class Structure:
         """
         self.data.color = utils.formatted_color(utils.sanitize_color(color))
 
-        if push:
-            self.update_callback()
+        self.update_callback([self.index], ('color',), push)
 
     def set_alpha(self, alpha, push = True):
         """Set area transparency.
@@ -311,8 +400,7 @@ class Structure:
         """
         self.data.color.a = utils.sanitize_float(alpha)
 
-        if push:
-            self.update_callback()
+        self.update_callback([self.index], ('color',), push)
 
 
     def set_intensity(self, intensity, push = True):
@@ -329,8 +417,7 @@ class Structure:
         """
         self.data.color_intensity = utils.sanitize_float(intensity)
 
-        if push:
-            self.update_callback()
+        self.update_callback([self.index], ('color_intensity',), push)
 
     def set_material(self, material, push = True):
         """Set material.
@@ -351,8 +438,7 @@ class Structure:
         """
         self.data.material = utils.sanitize_string(material)
 
-        if push:
-            self.update_callback()
+        self.update_callback([self.index], ('material',), push)
 
     # def set_data(area_data):
     #     """Set the data array for each CCF area model
@@ -364,7 +450,7 @@ class Structure:
     #     area_data : dict {string: float list}
     #         keys area IDs or acronyms, values are a list of floats
     #     """
-    #     client.sio.emit('SetAreaData', area_data)
+    #     client.emit('SetAreaData', area_data)
 
     # def set_data_index(area_index):
     #     """Set the data index for the CCF area models
@@ -374,4 +460,4 @@ class Structure:
     #     area_index : int
     #         data index
     #     """
-    #     client.sio.emit('SetAreaIndex', area_index)
\ No newline at end of file
+    #     client.emit('SetAreaIndex', area_index)
\ No newline at end of file
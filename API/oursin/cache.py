@@ -0,0 +1,218 @@
+"""Content-addressed upload cache
+
+Large payloads (volumes, textures, custom meshes) are hashed before they are compressed and sent.
+When the client has uploaded the same content before it asks the renderer whether it still holds
+the blob, on a hit the upload is skipped and the renderer re-uses its cached copy.
+
+Both sides keep a size-bounded LRU of blobs, the client-side LRU only tracks hashes so that
+content that was never uploaded doesn't cost a round trip.
+
+The cache is disabled by default, enable it with `urchin.cache.enabled = True` when the renderer
+answers cache queries.
+"""
+
+from . import client
+
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+try:
+	import xxhash
+except ImportError:
+	xxhash = None
+
+# off by default, the shipped renderer doesn't answer 'urchin-cache-query' yet. Set to True for a
+# renderer that does (e.g. the loopback renderer)
+enabled = False
+timeout = 2.0
+
+class LRUCache:
+	"""Least-recently-used set of content hashes, bounded by the total size of the content
+	"""
+	def __init__(self, max_bytes):
+		"""
+		Parameters
+		----------
+		max_bytes : int
+			total payload bytes to keep before evicting the least recently used entries
+		"""
+		self.max_bytes = max_bytes
+		self.n_bytes = 0
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def __contains__(self, digest):
+		return digest in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def touch(self, digest):
+		"""Mark an entry as recently used, returns False if it isn't cached
+		"""
+		with self.lock:
+			if digest not in self.entries:
+				return False
+			self.entries.move_to_end(digest)
+			return True
+
+	def add(self, digest, n_bytes, value = None):
+		"""Add an entry, evicting least recently used entries to stay under max_bytes
+
+		Returns
+		-------
+		list of string
+			evicted hashes
+		"""
+		evicted = []
+		with self.lock:
+			if digest in self.entries:
+				self.n_bytes -= self.entries.pop(digest)[0]
+			self.entries[digest] = (n_bytes, value)
+			self.n_bytes += n_bytes
+
+			while self.n_bytes > self.max_bytes and len(self.entries) > 1:
+				old_digest, (old_bytes, _) = self.entries.popitem(last = False)
+				self.n_bytes -= old_bytes
+				evicted.append(old_digest)
+		return evicted
+
+	def get(self, digest):
+		"""Get the value stored with an entry (and mark it as recently used), or None
+		"""
+		with self.lock:
+			if digest not in self.entries:
+				return None
+			self.entries.move_to_end(digest)
+			return self.entries[digest][1]
+
+	def remove(self, digest):
+		with self.lock:
+			if digest in self.entries:
+				self.n_bytes -= self.entries.pop(digest)[0]
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.n_bytes = 0
+
+# hashes that the renderer should still hold
+uploaded = LRUCache(4000000000)
+
+_query_counter = itertools.count()
+_pending = {}
+
+def content_hash(*buffers, meta = ''):
+	"""Hash a payload
+
+	Uses xxh3-128 when the xxhash package is installed, otherwise blake2b, the algorithm is part
+	of the returned key.
+
+	Parameters
+	----------
+	*buffers : bytes-like
+	meta : string, optional
+		extra description (dtype, shape, ...) that must also match
+
+	Returns
+	-------
+	string
+	"""
+	return stream_hash(buffers, meta = meta)
+
+def stream_hash(buffers, meta = ''):
+	"""Hash a payload that is produced piece by piece, see content_hash
+
+	Parameters
+	----------
+	buffers : iterable of bytes-like
+		e.g. a generator reading slabs from disk, the pieces are concatenated
+	meta : string, optional
+
+	Returns
+	-------
+	string
+	"""
+	if xxhash is not None:
+		hasher = xxhash.xxh3_128()
+		prefix = 'xxh3'
+	else:
+		hasher = hashlib.blake2b(digest_size = 16)
+		prefix = 'blake2b'
+
+	hasher.update(meta.encode())
+	for buffer in buffers:
+		hasher.update(buffer)
+	return f'{prefix}:{hasher.hexdigest()}'
+
+def _on_reply(data):
+	"""Internal callback for 'urchin-cache-reply' messages {"id": "", "hash": "", "hit": bool}
+	"""
+	query = _pending.get(data["id"])
+	if query is not None:
+		query["hit"] = bool(data["hit"])
+		query["event"].set()
+
+def query(digest):
+	"""Ask the renderer whether it holds a blob
+
+	Content that wasn't uploaded in this session (or was evicted from the client-side LRU) is a
+	miss without a round trip. If the renderer doesn't reply within `timeout` seconds the cache is
+	disabled for the rest of the session. Queries made on the event loop of the async client are
+	misses too, the loop can't receive the reply while the upload waits for it.
+
+	Parameters
+	----------
+	digest : string
+		see content_hash
+
+	Returns
+	-------
+	bool
+		True if the upload can be skipped
+	"""
+	global enabled
+
+	if not enabled or digest not in uploaded or not client.transport.can_block():
+		return False
+
+	query_id = str(next(_query_counter))
+	_pending[query_id] = {"event": threading.Event(), "hit": False}
+
+	try:
+		client.emit('urchin-cache-query', {"id": query_id, "hash": digest}, immediate = True)
+
+		if not _pending[query_id]["event"].wait(timeout):
+			client.request_completed('urchin-cache-query', query_id, failed = True)
+			print('(urchin.cache) Renderer did not reply to a cache query, disabling the upload cache')
+			enabled = False
+			return False
+
+		hit = _pending[query_id]["hit"]
+	finally:
+		del _pending[query_id]
+
+	if hit:
+		uploaded.touch(digest)
+	else:
+		uploaded.remove(digest)
+	return hit
+
+def add(digest, n_bytes):
+	"""Record that a blob was uploaded to the renderer
+
+	Parameters
+	----------
+	digest : string
+	n_bytes : int
+		uncompressed payload size
+	"""
+	if enabled:
+		uploaded.add(digest, n_bytes)
+
+def clear():
+	"""Forget all uploaded blobs, e.g. after the renderer was restarted
+	"""
+	uploaded.clear()
@@ -2,6 +2,7 @@
 
 from . import client
 from . import utils
+from . import video
 
 import PIL
 from PIL import Image
@@ -10,60 +11,281 @@ import numpy as np
 
 import io
 import json
+import time
+import itertools
 import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from vbl_aquarium.models.urchin import CameraRotationModel
 from vbl_aquarium.models.generic import FloatData
 		  
 receive_totalBytes = {}
 receive_bytes = {}
+receive_count = {}
 receive_camera = {}
+receive_futures = {}
+_request_counter = itertools.count()
+
+# the renderer renders each RequestCameraImg at its own lerp/frame and echoes the request id, so
+# several requests can be in flight at once. The stock renderer doesn't, with False (default)
+# requests on the same camera are serialized and video captures render one frame at a time
+# whatever their pipeline_depth
+concurrent_requests = False
 
 PIL.Image.MAX_IMAGE_PIXELS = 22500000
 
 # Handle receiving camera images back as screenshots
+# Incoming images are keyed by request id. Renderers that don't echo the request id reply in
+# request order, so their messages are matched to the oldest pending request for that camera.
+def _request_key(header, started):
+	"""Internal helper, find the pending request that a CameraImgMeta/CameraImg message belongs to
+
+	Parameters
+	----------
+	header : dict
+		message header, with "name" and optionally "id"
+	started : bool
+		True when looking for a request whose image buffer was already allocated
+
+	Returns
+	-------
+	string or None
+		None when no pending request matches
+	"""
+	if "id" in header:
+		return header["id"]
+
+	for request_id, camera in receive_camera.items():
+		if camera.id != header["name"]:
+			continue
+		if not started and request_id not in receive_totalBytes:
+			return request_id
+		if started and request_id in receive_totalBytes and receive_count[request_id] < receive_totalBytes[request_id]:
+			return request_id
+
+	return None
+
+def _drop(header):
+	"""Internal helper, ignore an image message that no pending request is waiting for
+
+	e.g. the late reply to a request that timed out, the other pending requests are not affected
+	"""
+	print(f'(Warning) Dropped an image message for {header.get("id", header.get("name"))}, no screenshot is waiting for it')
+
 def on_camera_img_meta(data_str):
 	"""Handler for receiving metadata about incoming images
 
 	Parameters
 	----------
 	data_str : string
-		JSON with two fields {"name":"", "totalBytes":""}
+		JSON with fields {"name":"", "totalBytes":"", "id":""}, the request id is optional
 	"""
 	global receive_totalBytes
 
-	data = json.loads(data_str)
+	try:
+		data = json.loads(data_str)
+
+		request_id = _request_key(data, started=False)
+		totalBytes = data["totalBytes"]
+	except Exception as e:
+		_fail_all(e)
+		return
+
+	if request_id not in receive_futures:
+		_drop(data)
+		return
 
-	name = data["name"]
-	totalBytes = data["totalBytes"]
+	# preallocate the full image, chunks are written in place
+	receive_totalBytes[request_id] = totalBytes
+	receive_bytes[request_id] = bytearray(totalBytes)
+	receive_count[request_id] = 0
 
-	receive_totalBytes[name] = totalBytes
-	receive_bytes[name] = bytearray()
+def _parse_camera_img(data):
+	"""Internal helper, unpack a CameraImg message into (request id, offset, bytes-like, header)
+
+	Chunks can arrive as a binary attachment [header_json, bytes] or as JSON with the bytes
+	as an int list. Without an "offset" field chunks are assumed to arrive in order.
+	"""
+	if isinstance(data, (list, tuple)):
+		header = json.loads(data[0]) if isinstance(data[0], str) else data[0]
+		byte_data = data[1]
+	else:
+		header = json.loads(data) if isinstance(data, str) else data
+		byte_data = bytes(header["data"])
+
+	request_id = _request_key(header, started=True)
+	offset = header.get("offset", receive_count.get(request_id, 0))
+	return request_id, offset, byte_data, header
 
 def on_camera_img(data_str):
 	"""Handler for receiving data about incoming images
 
 	Parameters
 	----------
-	data_str : string
-		JSON with two fields {"name":"", "bytes":""}
+	data_str : string or list
+		JSON with fields {"name":"", "data":[], "offset":0, "id":""} or a binary attachment
+		[{"name":"", "offset":0, "id":""}, bytes], the offset and request id are optional
 	"""
-	global receive_totalBytes, receive_bytes, receive_camera
+	global receive_totalBytes, receive_bytes, receive_count, receive_camera
+
+	try:
+		request_id, offset, byte_data, header = _parse_camera_img(data_str)
+	except Exception as e:
+		_fail_all(e)
+		return
 
-	data = json.loads(data_str)
+	if request_id not in receive_totalBytes:
+		_drop(header)
+		return
 
-	name = data["name"]
-	byte_data = bytes(data["data"])
+	n_bytes = len(byte_data)
+	if offset + n_bytes > receive_totalBytes[request_id]:
+		_resolve(request_id, ValueError(f'(urchin.camera) Image chunk for {request_id} overflows the expected {receive_totalBytes[request_id]} bytes'))
+		return
 
-	receive_bytes[name] = receive_bytes[name] + byte_data
+	memoryview(receive_bytes[request_id])[offset : offset + n_bytes] = byte_data
+	receive_count[request_id] += n_bytes
 	
-	if len(receive_bytes[name]) == receive_totalBytes[name]:
-		print(f'(Camera receive) Camera {name} received an image')
-		receive_camera[name].image_received = True
+	if receive_count[request_id] == receive_totalBytes[request_id]:
+		if request_id in receive_camera:
+			print(f'(Camera receive) Camera {receive_camera[request_id].id} received an image')
+		_resolve(request_id)
+
+def _resolve(request_id, exception = None):
+	"""Complete a pending screenshot future, safe to call from the socket.io thread
+
+	Parameters
+	----------
+	request_id : string
+	exception : Exception, optional
+		error to raise in the awaiting coroutine, by default None (image received)
+	"""
+	future = receive_futures.get(request_id)
+	if future is None:
+		return
+	client.request_completed('RequestCameraImg', request_id, failed = exception is not None)
+
+	def set_result():
+		if future.done():
+			return
+		if exception is None:
+			future.set_result(None)
+		else:
+			future.set_exception(exception)
+
+	future.get_loop().call_soon_threadsafe(set_result)
+
+def _fail_all(exception):
+	"""Propagate an error to every request waiting on a screenshot
+
+	Parameters
+	----------
+	exception : Exception
+	"""
+	for request_id in list(receive_futures.keys()):
+		_resolve(request_id, exception)
+
+def _on_disconnect():
+	"""Internal callback, fail pending screenshots when the connection drops
+	"""
+	_fail_all(ConnectionError('(urchin.camera) Disconnected from server while waiting for a screenshot'))
+
+def _request_image(camera, size, request_id, lerp = None, image_format = None, frame = None):
+	"""Internal helper, send a RequestCameraImg and register a future for the reply
+
+	Must be called from a running event loop. Use _release_image to collect the image bytes.
+
+	Parameters
+	----------
+	camera : Camera
+	size : list of int
+	request_id : string
+		unique key for this request, echoed back by the renderer
+	lerp : float, optional
+		camera lerp value to render this frame at, by default None
+	image_format : string, optional
+		'raw' to request an uncompressed RGB buffer instead of a PNG, by default None
+	frame : int, optional
+		frame of the uploaded camera animation to render, by default None
+
+	Returns
+	-------
+	asyncio.Future
+	"""
+	if size[0] > 15000 or size[1] > 15000:
+		raise Exception('(urchin.camera) Screenshots can''t exceed 15000x15000')
+
+	future = asyncio.get_running_loop().create_future()
+	receive_camera[request_id] = camera
+	receive_futures[request_id] = future
+
+	data = {"name": camera.id, "size": list(size), "id": request_id}
+	if lerp is not None:
+		data["lerp"] = lerp
+	if image_format is not None:
+		data["format"] = image_format
+	if frame is not None:
+		data["frame"] = frame
+
+	try:
+		# render with the latest throttled camera state
+		camera.flush_state()
+		client.emit('RequestCameraImg', json.dumps(data), immediate=True)
+	except Exception:
+		_release_image(request_id)
+		raise
+
+	return future
+
+def _release_image(request_id):
+	"""Internal helper, clear the receive state of a request and return its image bytes (or None)
+	"""
+	# a request released before its image arrived (e.g. timed out) counts as failed
+	client.request_completed('RequestCameraImg', request_id, failed = True)
+	receive_totalBytes.pop(request_id, None)
+	receive_count.pop(request_id, None)
+	receive_camera.pop(request_id, None)
+	receive_futures.pop(request_id, None)
+	return receive_bytes.pop(request_id, None)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def _decode_frame(image_bytes, size = None):
+	"""Internal helper, decode a screenshot into an RGB uint8 array
+
+	Raw (height, width, 3) RGB buffers are wrapped without copying, anything else is decoded by PIL.
+
+	Parameters
+	----------
+	image_bytes : bytes-like
+	size : list of int, optional
+		width/height of the frame, needed to recognize raw buffers
+	"""
+	if size is not None and len(image_bytes) == size[0] * size[1] * 3 and image_bytes[:8] != PNG_SIGNATURE:
+		return np.frombuffer(image_bytes, dtype=np.uint8).reshape(size[1], size[0], 3)
+
+	with Image.open(io.BytesIO(image_bytes)) as img:
+		return np.asarray(img.convert('RGB'))
 
 ## Camera renderer
 counter = 0
 
+# default maximum rate (Hz) of camera state updates for new cameras, None (or 0) sends every update
+max_rate = None
+_STATE_CONFLICTS = {'target': ['target', 'targetArea'], 'targetArea': ['target', 'targetArea']}
+
+def _sanitize_rate(rate):
+	"""Internal helper, None for unlimited (None or 0) or a positive float rate
+	"""
+	if rate is None or rate == 0:
+		return None
+	rate = float(rate)
+	if not rate > 0:
+		raise Exception(f'(urchin.camera) Maximum rate must be positive, None or 0 for unlimited, got {rate}')
+	return rate
+
 class Camera:
 	def __init__(self, main = False):		
 		if main:
@@ -72,13 +294,110 @@ class Camera:
 			global counter
 			counter += 1
 			self.id = f'Camera{counter}'
-			client.sio.emit('CreateCamera', [self.id])
+			client.emit('CreateCamera', [self.id])
 		self.in_unity = True
-		self.image_received_event = asyncio.Event()
-		self.loop = asyncio.get_event_loop()
+		self.image_received = False
 
 		self.background_color = '#ffffff'
 
+		self.max_rate = _sanitize_rate(max_rate)
+		self.n_dropped = 0
+		self.n_state_flushes = 0
+		self._pending_state = {}
+		self._state_lock = threading.RLock()
+		self._state_timer = None
+		self._last_state_flush = 0.0
+		self._request_lock = None
+		self._request_loop = None
+
+	@contextlib.asynccontextmanager
+	async def _serialized(self):
+		"""Internal helper, hold the image requests of this camera one at a time
+
+		A no-op when concurrent_requests is True, otherwise each screenshot/capture waits for the
+		previous one on the same camera to get its reply.
+		"""
+		if concurrent_requests:
+			yield
+			return
+
+		# asyncio locks belong to one event loop, each asyncio.run() gets a new one
+		loop = asyncio.get_running_loop()
+		if self._request_loop is not loop:
+			self._request_lock = asyncio.Lock()
+			self._request_loop = loop
+
+		async with self._request_lock:
+			yield
+
+	def set_max_rate(self, rate):
+		"""Throttle rotation/zoom/pan/target updates
+
+		When a rate is set only the latest value of each field is kept and the pending fields are
+		flushed together, at most `rate` times per second, each as its usual SetCamera* message.
+		Use this when setters are driven by sliders or other high frequency callbacks.
+
+		Parameters
+		----------
+		rate : float or None
+			maximum updates per second, e.g. the display refresh rate, None or 0 to send every update
+
+		Examples
+		--------
+		>>> urchin.camera.main.set_max_rate(60)
+		"""
+		rate = _sanitize_rate(rate)
+		self.flush_state()
+		self.max_rate = rate
+
+	@property
+	def queue_depth(self):
+		"""Number of camera fields waiting for the next throttled flush
+		"""
+		return len(self._pending_state)
+
+	def _set_state(self, field, event, value):
+		"""Internal helper, send a camera field right away or queue it for the next throttled flush
+		"""
+		if self.max_rate is None:
+			client.emit(event, {self.id: value})
+			return
+
+		with self._state_lock:
+			# a target coordinate and a target area replace each other
+			for replaced in _STATE_CONFLICTS.get(field, [field]):
+				if replaced in self._pending_state:
+					del self._pending_state[replaced]
+					self.n_dropped += 1
+			self._pending_state[field] = (event, value)
+
+			if self._state_timer is None:
+				delay = self._last_state_flush + 1 / self.max_rate - time.monotonic()
+				if delay <= 0:
+					self.flush_state()
+				else:
+					self._state_timer = threading.Timer(delay, self.flush_state)
+					self._state_timer.daemon = True
+					self._state_timer.start()
+
+	def flush_state(self):
+		"""Send the pending throttled camera fields now, one SetCamera* message per field
+		"""
+		with self._state_lock:
+			if self._state_timer is not None:
+				self._state_timer.cancel()
+				self._state_timer = None
+			if len(self._pending_state) == 0:
+				return
+
+			pending = self._pending_state
+			self._pending_state = {}
+			self._last_state_flush = time.monotonic()
+			self.n_state_flushes += 1
+
+			for event, value in pending.values():
+				client.emit(event, {self.id: value}, key=self.id)
+
 	def create(self):
 		"""Creates camera
 		
@@ -102,7 +421,7 @@ class Camera:
 		"""
 		if self.in_unity == False:
 			raise Exception("Camera is not created. Please create camera before calling method.")
-		client.sio.emit('DeleteCamera', [self.id])
+		client.emit('DeleteCamera', [self.id])
 		self.in_unity = False
 
 	def set_target_coordinate(self,camera_target_coordinate):
@@ -122,7 +441,7 @@ class Camera:
 		
 		camera_target_coordinate = utils.sanitize_vector3(camera_target_coordinate)
 		self.target = camera_target_coordinate
-		client.sio.emit('SetCameraTarget', {self.id: camera_target_coordinate})
+		self._set_state('target', 'SetCameraTarget', camera_target_coordinate)
 
 	# temporarily removed
 	# def set_position(self, position, preserve_target = True):
@@ -146,7 +465,7 @@ class Camera:
 	# 	self.position = position
 	# 	packet = position.copy()
 	# 	packet.append(preserve_target)
-	# 	client.sio.emit('SetCameraPosition', {self.id: packet})
+	# 	client.emit('SetCameraPosition', {self.id: packet})
 
 	def set_rotation(self, rotation):
 		"""Set the camera rotation (pitch, yaw, roll). The camera is locked to a target, so this rotation rotates around the target.
@@ -179,7 +498,7 @@ class Camera:
 		
 		rotation = utils.sanitize_vector3(rotation)
 		self.rotation = rotation
-		client.sio.emit('SetCameraRotation', {self.id: rotation})
+		self._set_state('rotation', 'SetCameraRotation', rotation)
 
 	def set_zoom(self,zoom):
 		"""Set the camera zoom. 
@@ -197,7 +516,7 @@ class Camera:
 			raise Exception("Camera is not created. Please create camera before calling method.")
 		
 		self.zoom = zoom
-		client.sio.emit('SetCameraZoom', {self.id: zoom})
+		self._set_state('zoom', 'SetCameraZoom', zoom)
 
 	def set_target_area(self, camera_target_area):
 		"""Set the camera rotation to look towards a target area
@@ -217,7 +536,7 @@ class Camera:
 		
 		camera_target_area
 		self.target = camera_target_area
-		client.sio.emit('SetCameraTargetArea', {self.id: camera_target_area})
+		self._set_state('targetArea', 'SetCameraTargetArea', camera_target_area)
 
 	def set_pan(self,pan_x, pan_y):
 		"""Set camera pan coordinates
@@ -237,7 +556,7 @@ class Camera:
 			raise Exception("Camera is not created. Please create camera before calling method.")
 		
 		self.pan = [pan_x, pan_y]
-		client.sio.emit('SetCameraPan',{self.id: self.pan})
+		self._set_state('pan', 'SetCameraPan', self.pan)
 
 	def set_mode(self, mode):
 		"""Set camera perspective mode
@@ -254,7 +573,7 @@ class Camera:
 		if self.in_unity == False:
 			raise Exception("Camera is not created. Please create camera before calling method.")
 		self.mode = mode
-		client.sio.emit('SetCameraMode', {self.id: mode})
+		client.emit('SetCameraMode', {self.id: mode})
 
 	def set_background_color(self, background_color):
 		"""Set camera background color
@@ -272,7 +591,7 @@ class Camera:
 		
 		self.background_color = utils.sanitize_color(background_color)
 
-		client.sio.emit('SetCameraColor', {self.id: self.background_color})
+		client.emit('SetCameraColor', {self.id: self.background_color})
 
 	def set_controllable(self):
 		"""Sets camera to controllable
@@ -284,9 +603,9 @@ class Camera:
 		if self.in_unity == False:
 			raise Exception("Camera is not created. Please create camera before calling method.")
 		self.controllable = True
-		client.sio.emit('SetCameraControl', self.id)
+		client.emit('SetCameraControl', self.id)
 		
-	async def screenshot(self, size=[1024,768], filename = 'return'):
+	async def screenshot(self, size=[1024,768], filename = 'return', timeout = None):
 		"""Capture a screenshot, must be awaited
 
 		Parameters
@@ -295,32 +614,29 @@ class Camera:
 			Size of the screenshot, by default [1024,768]
 		filename: string, optional
 			Filename to save to, relative to local path
+		timeout : float, optional
+			Seconds to wait for the image before raising asyncio.TimeoutError, by default None (wait forever)
 			
 		Examples
 		--------
 		>>> await urchin.camera.main.screenshot()
 		"""
-		global receive_totalBytes, receive_bytes, receive_camera
-		self.image_received_event.clear()
 		self.image_received = False
-		receive_camera[self.id] = self
-
-		if size[0] > 15000 or size[1] > 15000:
-			raise Exception('(urchin.camera) Screenshots can''t exceed 15000x15000')
-		
-		client.sio.emit('RequestCameraImg', json.dumps({"name":self.id, "size":size}))
-
-		while not self.image_received:
-			await asyncio.sleep(0.1)
-		# await self.image_received_event.wait()
-
-		# image is here, reconstruct it
-		img = Image.open(io.BytesIO(receive_bytes[self.id]))
+		# unique per call, so that concurrent screenshots of the same camera don't collide
+		request_id = f'{self.id}-shot{next(_request_counter)}'
+
+		async with self._serialized():
+			try:
+				future = _request_image(self, size, request_id)
+				await asyncio.wait_for(future, timeout)
+				self.image_received = True
+
+				# image is here, reconstruct it
+				img = Image.open(io.BytesIO(receive_bytes[request_id]))
+			finally:
+				_release_image(request_id)
 		
 		print(f'(Camera receive) {self.id} complete')
-		del receive_totalBytes[self.id]
-		del receive_bytes[self.id]
-		del receive_camera[self.id]
 
 		if not filename == 'return':
 			img.save(filename)
@@ -328,13 +644,25 @@ class Camera:
 			return img
 		
 	async def capture_video(self, file_name, start_rotation, end_rotation, frame_rate = 30,
-				   duration = 5, size = (1024,768)):
+				   duration = 5, size = (1024,768), pipeline_depth = 1, workers = None, timeout = None,
+				   backend = 'auto', codec = 'h264', crf = 18, threads = 0, raw_frames = False):
 		"""Capture a video and save it to a file, must be awaited
 
 		Warning: start and stop rotations are currently implemented in Euler angles
 		any rotation that uses multiple axes will *not* look correct! This will be
 		updated in a future release.
 
+		With pipeline_depth > 1 several frames are requested from the renderer at once (each
+		request carries its frame index and lerp value), PNG decoding runs in a thread pool and
+		frames are re-ordered before they are written, so that rendering, decoding and encoding
+		overlap. This needs a renderer that renders each request at its own lerp value, opt in
+		with `urchin.camera.concurrent_requests = True`. The stock renderer applies the lerp events
+		as they arrive, so by default frames are captured one at a time.
+
+		The ffmpeg backend streams raw RGB frames into an ffmpeg subprocess, which removes the
+		OpenCV dependency. With raw_frames the renderer is asked for uncompressed frames, which are
+		passed to ffmpeg straight from the receive buffer without decoding.
+
 		Parameters
 		----------
 		file_name : string
@@ -347,42 +675,177 @@ class Camera:
 			by default 30
 		size : list, optional
 			width/height, by default [1024,768]
+		pipeline_depth : int, optional
+			maximum number of frames in flight, by default 1 (fully serial), only used when
+			concurrent_requests is True
+		workers : int, optional
+			number of decoding threads, by default pipeline_depth
+		timeout : float, optional
+			Seconds to wait for each frame, by default None (wait forever)
+		backend : str, optional
+			'ffmpeg', 'opencv' or 'auto' (ffmpeg if it is on the PATH), by default 'auto'
+		codec : str, optional
+			ffmpeg codec, 'h264', 'h265' or 'prores', by default 'h264'
+		crf : int, optional
+			ffmpeg quality for h264/h265, lower is better, by default 18
+		threads : int, optional
+			ffmpeg encoder threads, by default 0 (automatic)
+		raw_frames : bool, optional
+			request uncompressed RGB frames from the renderer, by default False
 			
 		Examples
 		--------
 		>>> await urchin.camera.main.capture_video('output.mp4', start_rotation=[22.5, 22.5, 225], end_rotation=[22.5, 22.5, 0])
+		>>> urchin.camera.concurrent_requests = True # only for renderers that support it
+		>>> await urchin.camera.main.capture_video('output.mp4', [22.5, 22.5, 225], [22.5, 22.5, 0], pipeline_depth=4)
+		>>> await urchin.camera.main.capture_video('output.mov', [22.5, 22.5, 225], [22.5, 22.5, 0], backend='ffmpeg', codec='prores')
 		"""
-		try:
-			import cv2
-		except:
-			raise Exception('Please install cv2 by running `pip install opencv-python` in your terminal to use the Video features')
-		
-		fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-		out = cv2.VideoWriter(file_name, fourcc, frame_rate, size)
+		if backend == 'opencv':
+			out = video.open_writer(file_name, frame_rate, size, backend)
+		else:
+			out = video.open_writer(file_name, frame_rate, size, backend, codec = codec, crf = crf, threads = threads)
 
 		n_frames = frame_rate * duration
 
-		client.sio.emit('SetCameraLerpRotation', CameraRotationModel(
+		client.emit('SetCameraLerpRotation', CameraRotationModel(
 			start_rotation=utils.formatted_vector3(start_rotation),
 			end_rotation=utils.formatted_vector3(end_rotation)
 		))
 
-		for frame in range(n_frames):
-			perc = frame / n_frames
-
-			client.sio.emit('SetCameraLerp', FloatData(
-				id=self.id,
-				value=perc
-			))
-			
-			img = await self.screenshot([size[0], size[1]])
-			image_array = np.array(img)
-			image_array = cv2.cvtColor(image_array, cv2.COLOR_RGB2BGR)
-			out.write(image_array)
-		
+		try:
+			await self._capture_frames(n_frames, size, out.write, pipeline_depth, workers, timeout,
+							  image_format = 'raw' if raw_frames else None)
+		except BaseException:
+			video.abort(out)
+			raise
 		out.release()
 		print(f'Video captured on {self.id} saved to {file_name}')
 
+	async def _capture_frames(self, n_frames, size, write, pipeline_depth = 1, workers = None, timeout = None,
+						   image_format = None, animated = False):
+		"""Internal helper, render n_frames along the camera lerp (or the uploaded animation) and pass them to write() in order
+
+		Up to pipeline_depth frames are requested/decoded concurrently, decoding runs in a thread
+		pool and write() runs on a single background thread in frame order.
+
+		Parameters
+		----------
+		n_frames : int
+		size : list of int
+		write : callable
+			called with each (height, width, 3) RGB uint8 frame, in frame order
+		pipeline_depth : int, optional
+		workers : int, optional
+		timeout : float, optional
+		image_format : string, optional
+			see _request_image
+		animated : bool, optional
+			render the frames of the uploaded urchin.animation trajectory instead of the lerp, by default False
+		"""
+		if pipeline_depth > 1 and not concurrent_requests:
+			print('(Warning) Frames are captured one at a time, set urchin.camera.concurrent_requests = True '
+				  'if the renderer renders each request at its own lerp value')
+			pipeline_depth = 1
+
+		loop = asyncio.get_running_loop()
+		in_flight = asyncio.Semaphore(max(1, pipeline_depth))
+
+		decode_pool = ThreadPoolExecutor(max_workers = workers or max(1, pipeline_depth))
+		write_pool = ThreadPoolExecutor(max_workers = 1)
+
+		decoded = {}
+		writes = []
+		next_frame = 0
+		# unique per capture, so that frames of concurrent captures on the same camera don't collide
+		capture = next(_request_counter)
+
+		async def render(frame):
+			nonlocal next_frame
+			perc = frame / n_frames
+			request_id = f'{self.id}-capture{capture}-frame{frame}'
+
+			try:
+				if animated:
+					future = _request_image(self, size, request_id, image_format = image_format, frame = frame)
+				else:
+					client.emit('SetCameraLerp', FloatData(
+						id=self.id,
+						value=perc
+					))
+					future = _request_image(self, size, request_id, lerp = perc, image_format = image_format)
+				await asyncio.wait_for(future, timeout)
+
+				image_bytes = _release_image(request_id)
+				decoded[frame] = await loop.run_in_executor(decode_pool, _decode_frame, image_bytes, size)
+			finally:
+				_release_image(request_id)
+				in_flight.release()
+
+			# hand frames to the writer thread in order
+			while next_frame in decoded:
+				writes.append(loop.run_in_executor(write_pool, write, decoded.pop(next_frame)))
+				next_frame += 1
+
+		tasks = []
+		try:
+			async with self._serialized():
+				for frame in range(n_frames):
+					await in_flight.acquire()
+					if any(task.done() and task.exception() is not None for task in tasks):
+						in_flight.release()
+						break
+					tasks.append(asyncio.ensure_future(render(frame)))
+
+				await asyncio.gather(*tasks)
+			await asyncio.gather(*writes)
+		finally:
+			for task in tasks:
+				task.cancel()
+			decode_pool.shutdown(wait = False)
+			write_pool.shutdown(wait = True)
+
+async def screenshots(cameras, size = [1024,768], filenames = None, timeout = None):
+	"""Capture screenshots from several cameras at once, must be awaited
+
+	All requests are sent before any reply is awaited and the replies are matched to their
+	request by id, so the renderer can work on every view in parallel. The same camera can
+	appear more than once, its requests are sent one after the other unless
+	urchin.camera.concurrent_requests is True.
+
+	Parameters
+	----------
+	cameras : list of Camera
+	size : list, optional
+		Size of the screenshots, by default [1024,768]
+	filenames : list of string, optional
+		Filenames to save to, relative to local path, by default the images are returned
+	timeout : float, optional
+		Seconds to wait for all images before raising asyncio.TimeoutError, by default None (wait forever)
+
+	Returns
+	-------
+	list of PIL.Image
+		in the order of cameras, or None for images that were saved to a file
+
+	Examples
+	--------
+	>>> views = [urchin.camera.Camera() for _ in range(3)]
+	>>> for view, rotation in zip(views, ['axial', 'coronal', 'sagittal']):
+	>>> 	view.set_rotation(rotation)
+	>>> images = await urchin.camera.screenshots(views, [800, 600])
+	"""
+	cameras = utils.sanitize_list(cameras)
+	if filenames is None:
+		filenames = ['return'] * len(cameras)
+	elif len(filenames) != len(cameras):
+		raise Exception('(urchin.camera) Pass one filename per camera')
+
+	tasks = [asyncio.ensure_future(camera.screenshot(size, filename)) for camera, filename in zip(cameras, filenames)]
+	try:
+		return await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+	finally:
+		for task in tasks:
+			task.cancel()
 
 def set_light_rotation(angles):
 	"""Override the rotation of the main camera light
@@ -395,7 +858,7 @@ def set_light_rotation(angles):
 	angles = utils.sanitize_vector3(angles)
 	print(angles)
 	print(isinstance(angles,list))
-	client.sio.emit('SetLightRotation', angles)
+	client.emit('SetLightRotation', angles)
 
 def set_light_camera(camera_name = None):
 	"""Change the camera that the main light is linked to (the light will rotate the camera)
@@ -406,8 +869,8 @@ def set_light_camera(camera_name = None):
 		Name of camera to attach light to, by default None
 	"""
 	if (camera_name is None):
-		client.sio.emit('ResetLightLink')
+		client.emit('ResetLightLink')
 	else:
-		client.sio.emit('SetLightLink', camera_name)
+		client.emit('SetLightLink', camera_name)
 	
 main = Camera(main = True)
\ No newline at end of file
@@ -2,10 +2,18 @@
 import socketio
 import uuid
 import asyncio
+import json
+import time
+import threading
+import numpy as np
+from contextlib import contextmanager
+from vbl_aquarium.utils.vbl_base_model import VBLBaseModel
 
 from . import camera
 from . import volumes
 from . import meshes
+from . import cache
+from .atlas import ontology
 
 class bcolors:
     WARNING = '\033[93m'
@@ -14,53 +22,277 @@ class bcolors:
 ID = str(uuid.uuid1())[:8]
 
 sio = socketio.Client()
-@sio.event
+
 def connect():
 	print("(URN) connected to server")
 	change_id(ID)
 
-@sio.event
+	# re-send the full state of loaded atlases, the renderer may have missed updates while disconnected
+	for atlas in ontology.Atlas.instances:
+		if atlas.loaded:
+			atlas.sync()
+
 def disconnect():
     print("(URN) disconnected from server")
+    camera._on_disconnect()
 
-@sio.on('log')
-def message(data):
+def log(data):
 	print('(Renderer) ' + data)
 
-@sio.on('log-warning')
-def message(data):
+def log_warning(data):
 	print('(Renderer) ' + bcolors.WARNING + data)
 
-@sio.on('log-error')
-def message(data):
+def log_error(data):
 	print('(Renderer) ' + bcolors.FAIL + data)
 
 ###### CALLBACKS #######
 
-@sio.on('CameraImgMeta')
 def receive_camera_img_meta(data):
 	camera.on_camera_img_meta(data)
 	
-@sio.on('CameraImg')
 def receive_camera_img(data):
 	camera.on_camera_img(data)
 
-@sio.on('VolumeClick')
 def receive_volume_click(data):
 	volumes._volume_click(data)
 
-@sio.on('NeuronCallback')
 def receive_neuron_callback(data):
 	meshes._neuron_callback(data)
-	
+
+def receive_cache_reply(data):
+	cache._on_reply(data)
+	request_completed('urchin-cache-query', data.get('id'))
+
+# events sent by the renderer, registered on every transport
+handlers = {
+	'connect': connect,
+	'disconnect': disconnect,
+	'log': log,
+	'log-warning': log_warning,
+	'log-error': log_error,
+	'CameraImgMeta': receive_camera_img_meta,
+	'CameraImg': receive_camera_img,
+	'VolumeClick': receive_volume_click,
+	'NeuronCallback': receive_neuron_callback,
+	'urchin-cache-reply': receive_cache_reply,
+}
+
+def _register_handlers(socket_client):
+	for event, handler in handlers.items():
+		socket_client.on(event, handler)
+
+_register_handlers(sio)
+
+###### TRANSPORTS #######
+
+class Transport:
+	"""Interface between the API modules and the renderer
+
+	Every module sends through client.emit(), which hands the events to the active transport.
+	Transports deliver incoming renderer events by calling the functions in client.handlers.
+	"""
+	def connect(self, url):
+		raise NotImplementedError
+
+	def disconnect(self):
+		raise NotImplementedError
+
+	def connected(self):
+		raise NotImplementedError
+
+	def emit(self, event, data=None):
+		"""Send one event, data is JSON-serializable or a list mixing strings and bytes attachments
+		"""
+		raise NotImplementedError
+
+	def can_block(self):
+		"""Whether the calling thread can wait for a reply from the renderer without stalling the transport
+		"""
+		return True
+
+	def call_soon(self, callback):
+		"""Run a callback for a background thread (e.g. timed batch flushes), by default right away
+		"""
+		callback()
+
+class SocketIOTransport(Transport):
+	"""Threaded socket.io client (default), incoming events are handled on the socket.io thread
+	"""
+	def connect(self, url):
+		sio.connect(url)
+
+	def disconnect(self):
+		sio.disconnect()
+
+	def connected(self):
+		return sio.connected
+
+	def emit(self, event, data=None):
+		if data is None:
+			sio.emit(event)
+		else:
+			sio.emit(event, data)
+
+class AsyncSocketIOTransport(Transport):
+	"""asyncio socket.io client
+
+	Incoming events are handled on the event loop that connected. Emits from synchronous code
+	(i.e. all the API modules) are scheduled on the loop in order, use `await client.drain()`
+	to wait until they have been handed to the network, or `await client.emit_async()`.
+
+	Requires the aiohttp package, `pip install oursin[async]`
+	"""
+	def __init__(self, max_pending=1000):
+		"""
+		Parameters
+		----------
+		max_pending : int, optional
+			emits that can be queued before emit_async()/drain() wait, and before emits from
+			other threads block, by default 1000
+		"""
+		self.sio = socketio.AsyncClient()
+		_register_handlers(self.sio)
+
+		self.max_pending = max_pending
+		self.loop = None
+		self.pending = set()
+		self._space = None
+
+	async def connect(self, url):
+		try:
+			import aiohttp
+		except ImportError:
+			raise Exception('Please install aiohttp by running `pip install oursin[async]` in your terminal to use the async client')
+
+		self._start()
+		await self.sio.connect(url)
+
+	def _start(self):
+		"""Internal helper, bind to the running event loop
+		"""
+		self.loop = asyncio.get_running_loop()
+		self._space = asyncio.Condition()
+
+	async def disconnect(self):
+		await self.drain()
+		await self.sio.disconnect()
+
+	def connected(self):
+		return self.sio.connected
+
+	def _on_loop(self):
+		try:
+			return asyncio.get_running_loop() is self.loop
+		except RuntimeError:
+			return False
+
+	def can_block(self):
+		# replies are handled by the loop, blocking it means they never arrive
+		return not self._on_loop()
+
+	def call_soon(self, callback):
+		# run on the loop, its emits are then ordered with the loop's own emits and seen by drain()
+		if self.loop is None or self._on_loop():
+			callback()
+			return
+		try:
+			self.loop.call_soon_threadsafe(callback)
+		except RuntimeError:
+			# the loop was closed, nothing can be sent anymore
+			pass
+
+	def emit(self, event, data=None):
+		"""Schedule an emit on the event loop, returns an awaitable for its completion
+		"""
+		args = (event,) if data is None else (event, data)
+
+		if self.loop is None:
+			raise Exception('(urchin) The async client is not connected, call `await urchin.setup_async()` first')
+
+		if self._on_loop():
+			task = self.loop.create_task(self._send(args))
+			self.pending.add(task)
+			return task
+
+		# called from another thread, block while too many emits are pending
+		return asyncio.run_coroutine_threadsafe(self._send_when_ready(args), self.loop).result()
+
+	async def _send(self, args):
+		try:
+			await self.sio.emit(*args)
+		finally:
+			self.pending.discard(asyncio.current_task())
+			async with self._space:
+				self._space.notify_all()
+
+	async def _send_when_ready(self, args):
+		await self.wait_for_space()
+		task = self.emit(*args)
+		await task
+
+	async def wait_for_space(self):
+		"""Wait until fewer than max_pending emits are queued
+		"""
+		async with self._space:
+			await self._space.wait_for(lambda: len(self.pending) < self.max_pending)
+
+	async def drain(self):
+		"""Wait until every scheduled emit has been sent
+		"""
+		while len(self.pending) > 0:
+			await asyncio.gather(*list(self.pending), return_exceptions=True)
+
+transport = SocketIOTransport()
+
+def use_transport(new_transport):
+	"""Replace the transport used by every module
+
+	Parameters
+	----------
+	new_transport : Transport
+
+	Returns
+	-------
+	Transport
+		the previous transport
+	"""
+	global transport
+	previous = transport
+	transport = new_transport
+	return previous
+
+async def emit_async(event, data=None, key=None):
+	"""Awaitable emit with backpressure, for the async client
+
+	Waits while the transport has max_pending emits queued, then until this event is sent. With the
+	threaded client this is equivalent to emit().
+
+	Parameters
+	----------
+	see emit()
+	"""
+	if isinstance(transport, AsyncSocketIOTransport) and _batch_depth == 0:
+		# outside a batch the key has no effect, see emit()
+		data = _serialize(event, data)
+		await transport.wait_for_space()
+		await _send(event, data)
+	else:
+		emit(event, data, key)
+
+async def drain():
+	"""Wait until all emits scheduled on the async client have been sent
+	"""
+	if isinstance(transport, AsyncSocketIOTransport):
+		await transport.drain()
+
 # Helper functions
 def connected():
-	return sio.connected
+	return transport.connected()
 
 def close():
-	"""Disconnect from the echo server
+	"""Disconnect from the echo server, must be awaited when using the async client
 	"""
-	sio.disconnect()
+	return transport.disconnect()
 
 def change_id(newID):
 	"""Change the ID used to connect to the echo server
@@ -70,5 +302,499 @@ def change_id(newID):
 	newID : string
 		New ID to connect with
 	"""
-	sio.emit('ID',[newID,"send"])
+	transport.emit('ID',[newID,"send"])
 	print(f'Login sent with ID: {newID}, copy this ID into the renderer to connect.')
+
+###### EMIT AND BATCHING #######
+
+BATCH_EVENT = 'urchin-batch'
+
+_batch_lock = threading.RLock()
+_batch_depth = 0
+_batch_queue = {}
+_batch_counter = 0
+# _batch_counter of the last un-keyed event, keyed events are not merged across it
+_batch_barrier = 0
+_batch_stop = None
+
+def emit(event, data=None, key=None, immediate=False):
+	"""Send an event to the renderer, or queue it when a batch is active
+
+	Inside a batch, events that target the same object/field replace each other (last write wins)
+	and keep the position of the first write. Events whose data is a single-entry dict {id: value}
+	are keyed on that id automatically, other events can pass an explicit key. Un-keyed events
+	(e.g. deletes and clears) are always kept, in order, and keyed events are not merged across them.
+
+	Parameters
+	----------
+	event : string
+	data : any, optional
+		pydantic models (vbl_aquarium) are serialized to JSON here
+	key : hashable, optional
+		object identifier used to coalesce repeated updates of the same event
+	immediate : bool, optional
+		flush any pending batch and send this event right away, use for requests that expect a reply
+	"""
+	global _batch_counter, _batch_barrier
+
+	data = _serialize(event, data)
+
+	with _batch_lock:
+		if _batch_depth > 0 and not immediate:
+			if key is None and isinstance(data, dict) and len(data) == 1:
+				key = next(iter(data))
+
+			if key is None:
+				_batch_counter += 1
+				_batch_barrier = _batch_counter
+				queue_key = (event, None, _batch_counter)
+			else:
+				# replaced in place, a write queued before the last un-keyed event stays before it
+				queue_key = (event, key, _batch_barrier)
+
+			_batch_queue[queue_key] = (event, data)
+			return
+
+	if immediate:
+		flush()
+
+	_send(event, data)
+
+def _serialize(event, data):
+	"""Internal helper, serialize pydantic models (vbl_aquarium) to JSON, other data is returned as is
+	"""
+	if not isinstance(data, VBLBaseModel):
+		return data
+
+	start = time.perf_counter()
+	data = data.to_string()
+	if _metrics is not None:
+		_metrics.serialized(event, time.perf_counter() - start)
+	return data
+
+def _send(event, data):
+	"""Internal helper, hand an event to the transport and record it when metrics are enabled
+	"""
+	if _metrics is None:
+		return transport.emit(event, data)
+
+	_metrics.requested(event, data)
+	start = time.perf_counter()
+	result = transport.emit(event, data)
+	_metrics.sent(event, data, time.perf_counter() - start)
+	return result
+
+def flush():
+	"""Send all queued events as a single multi-event frame
+
+	The frame is a list of [event, data] pairs emitted on the 'urchin-batch' event.
+	"""
+	with _batch_lock:
+		if len(_batch_queue) == 0:
+			return
+		frame = [[event, data] for event, data in _batch_queue.values()]
+		_batch_queue.clear()
+
+	# send without the lock, the async transport blocks other threads until the loop has sent
+	# the frame and the loop thread may be queueing events at the same time
+	if len(frame) == 1:
+		_send(*frame[0])
+	else:
+		_send(BATCH_EVENT, frame)
+
+def queued(event, key):
+	"""Whether an event for this key is waiting in the current batch
+
+	Lets callers merge a new update into the queued one instead of replacing it.
+	"""
+	with _batch_lock:
+		return (event, key, _batch_barrier) in _batch_queue
+
+def _auto_flush(stop, flush_interval):
+	while not stop.wait(flush_interval):
+		transport.call_soon(flush)
+
+def start_batch(flush_interval=None):
+	"""Start queueing events, see urchin.batch()
+
+	Parameters
+	----------
+	flush_interval : float, optional
+		seconds between automatic flushes, by default None (flush only when the batch ends)
+	"""
+	global _batch_depth, _batch_stop
+
+	with _batch_lock:
+		_batch_depth += 1
+
+		if flush_interval is not None and _batch_stop is None:
+			_batch_stop = threading.Event()
+			threading.Thread(target=_auto_flush, args=(_batch_stop, flush_interval), daemon=True).start()
+
+def end_batch():
+	"""Stop queueing events and flush, see urchin.batch()
+	"""
+	global _batch_depth, _batch_stop
+
+	with _batch_lock:
+		if _batch_depth == 0:
+			raise Exception('(urchin) end_batch() called without a matching start_batch()')
+		_batch_depth -= 1
+		if _batch_depth > 0:
+			return
+
+		if _batch_stop is not None:
+			_batch_stop.set()
+			_batch_stop = None
+
+	flush()
+
+@contextmanager
+def batch(flush_interval=None):
+	"""Queue all renderer updates in this block and send them as one multi-event frame
+
+	Repeated updates to the same object are merged, only the last value is sent.
+
+	The frame is sent on the 'urchin-batch' event and unpacked by the echo server (Server/server.js),
+	which relays each [event, data] pair to the renderer as a separate event, in order. A
+	self-hosted echo server must be updated to a version that unpacks batches, otherwise every
+	update made inside the block is dropped.
+
+	Parameters
+	----------
+	flush_interval : float, optional
+		seconds between automatic flushes while the block runs, by default None
+
+	Examples
+	--------
+	>>> with urchin.batch():
+	>>> 	for mesh, position in zip(meshes, positions):
+	>>> 		mesh.set_position(position)
+	"""
+	start_batch(flush_interval)
+	try:
+		yield
+	finally:
+		end_batch()
+
+###### BINARY TRANSPORT #######
+
+def emit_binary(event, header, *buffers, key=None):
+	"""Emit a JSON header followed by raw byte buffers, sent as socket.io binary attachments
+
+	The payload is a list [header_json, buffer0, buffer1, ...]. Buffers can be bytes, bytearray,
+	memoryview or any object supporting the buffer protocol.
+
+	Parameters
+	----------
+	event : string
+	header : dict
+		JSON-serializable header describing the buffers
+	*buffers : bytes-like
+	key : hashable, optional
+		see emit()
+	"""
+	start = time.perf_counter()
+	payload = [json.dumps(header)]
+	for buffer in buffers:
+		payload.append(buffer if isinstance(buffer, bytes) else bytes(memoryview(buffer)))
+	if _metrics is not None:
+		_metrics.serialized(event, time.perf_counter() - start)
+	emit(event, payload, key=key)
+
+def emit_arrays(event, header, key=None, **arrays):
+	"""Emit NumPy arrays as raw binary attachments with a typed header
+
+	The header gets an 'arrays' field listing the name, dtype (numpy type string, e.g. '<f4') and
+	shape of each attached buffer, in order.
+
+	Parameters
+	----------
+	event : string
+	header : dict
+		JSON-serializable header, e.g. {'ID': 'pg1'}
+	key : hashable, optional
+		see emit()
+	**arrays : np.ndarray
+		named arrays to attach
+
+	Examples
+	--------
+	>>> client.emit_arrays('ParticleGroupPositions', {'ID': 'pg1'}, values=positions)
+	"""
+	start = time.perf_counter()
+	header = dict(header)
+	layout = []
+	buffers = []
+	for name, array in arrays.items():
+		array = np.ascontiguousarray(array)
+		layout.append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape)})
+		buffers.append(array.data)
+	header['arrays'] = layout
+	if _metrics is not None:
+		_metrics.serialized(event, time.perf_counter() - start)
+
+	emit_binary(event, header, *buffers, key=key)
+
+def decode_arrays(payload):
+	"""Decode a payload created by emit_arrays back into its header and arrays
+
+	Parameters
+	----------
+	payload : list
+		[header_json, buffer0, buffer1, ...]
+
+	Returns
+	-------
+	(dict, dict of np.ndarray)
+	"""
+	header = json.loads(payload[0])
+	arrays = {}
+	for layout, buffer in zip(header.get('arrays', []), payload[1:]):
+		arrays[layout['name']] = np.frombuffer(buffer, dtype=np.dtype(layout['dtype'])).reshape(layout['shape'])
+	return header, arrays
+
+###### INSTRUMENTATION #######
+
+# requests that expect a reply, their "id" field identifies the reply
+REQUEST_EVENTS = ['RequestCameraImg', 'urchin-cache-query']
+
+# upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+_metrics = None
+
+def payload_size(data):
+	"""Approximate the size of a payload on the wire, in bytes
+
+	Binary attachments count their length, everything else its JSON encoding.
+	"""
+	if data is None:
+		return 0
+	if isinstance(data, (bytes, bytearray, memoryview)):
+		return len(data)
+	if isinstance(data, str):
+		return len(data.encode())
+	if isinstance(data, (list, tuple)) and any(isinstance(item, (bytes, bytearray, memoryview)) for item in data):
+		return sum(payload_size(item) for item in data)
+	return len(json.dumps(data))
+
+def _request_id(data):
+	"""Internal helper, the "id" field of a request payload (JSON string or dict), or None
+	"""
+	try:
+		if isinstance(data, str):
+			data = json.loads(data)
+		return str(data['id'])
+	except (ValueError, TypeError, KeyError):
+		return None
+
+class Metrics:
+	"""Counters of the events sent to the renderer and latency histograms of request/reply pairs
+
+	Per event: the number of sends, payload bytes, time spent serializing (pydantic models, binary
+	packing) and time spent in the transport's emit. Events sent inside a batch frame are counted
+	individually, the emit time is recorded on the frame ('urchin-batch'). With the async client
+	the emit time only covers scheduling the send on the event loop.
+	"""
+	def __init__(self, trace_file = None):
+		"""
+		Parameters
+		----------
+		trace_file : string, optional
+			path of a JSONL file that gets one line per sent event and per completed request
+		"""
+		self.lock = threading.Lock()
+		self.start_time = time.time()
+		self.events = {}
+		self.requests = {}
+		self.pending = {}
+		self.trace = open(trace_file, 'a', buffering = 1) if trace_file is not None else None
+
+	def _event(self, event):
+		if event not in self.events:
+			self.events[event] = {'count': 0, 'bytes': 0, 'serialize_seconds': 0.0, 'emit_seconds': 0.0}
+		return self.events[event]
+
+	def _write(self, record):
+		if self.trace is not None:
+			self.trace.write(json.dumps(record) + '\n')
+
+	def serialized(self, event, seconds):
+		with self.lock:
+			self._event(event)['serialize_seconds'] += seconds
+
+	def requested(self, event, data):
+		"""Start the latency clock of the requests in an event, before it is sent (replies can arrive during the emit)
+		"""
+		contents = data if event == BATCH_EVENT else [[event, data]]
+		for sent_event, sent_data in contents:
+			if sent_event in REQUEST_EVENTS:
+				request_id = _request_id(sent_data)
+				if request_id is not None:
+					with self.lock:
+						self.pending[(sent_event, request_id)] = time.perf_counter()
+
+	def sent(self, event, data, seconds):
+		now = time.time()
+		contents = data if event == BATCH_EVENT else [[event, data]]
+
+		with self.lock:
+			n_bytes = 0
+			for sent_event, sent_data in contents:
+				size = payload_size(sent_data)
+				n_bytes += size
+				stats = self._event(sent_event)
+				stats['count'] += 1
+				stats['bytes'] += size
+
+				if event == BATCH_EVENT:
+					self._write({'time': now, 'event': sent_event, 'bytes': size, 'batch': True})
+
+			if event == BATCH_EVENT:
+				# the contained events already count the bytes
+				stats = self._event(event)
+				stats['count'] += 1
+			stats['emit_seconds'] += seconds
+			self._write({'time': now, 'event': event, 'bytes': n_bytes, 'emit_seconds': seconds})
+
+	def completed(self, request, request_id, failed = False):
+		with self.lock:
+			start = self.pending.pop((request, str(request_id)), None)
+			if start is None:
+				return
+			latency = time.perf_counter() - start
+
+			if request not in self.requests:
+				self.requests[request] = {'count': 0, 'failed': 0, 'sum_seconds': 0.0,
+							  'buckets': [0] * len(LATENCY_BUCKETS)}
+			stats = self.requests[request]
+			if failed:
+				stats['failed'] += 1
+			else:
+				stats['count'] += 1
+				stats['sum_seconds'] += latency
+				# per-bucket counts, made cumulative in snapshot()
+				index = int(np.searchsorted(LATENCY_BUCKETS, latency))
+				if index < len(LATENCY_BUCKETS):
+					stats['buckets'][index] += 1
+			self._write({'time': time.time(), 'request': request, 'id': str(request_id),
+						 'latency_seconds': latency, 'failed': failed})
+
+	def snapshot(self):
+		"""
+		Returns
+		-------
+		dict
+			{'since': unix time, 'events': {event: {...}}, 'requests': {request: {...}}, 'pending_requests': int},
+			request buckets are cumulative counts keyed by their upper bound
+		"""
+		with self.lock:
+			requests = {}
+			for request, stats in self.requests.items():
+				requests[request] = {'count': stats['count'], 'failed': stats['failed'], 'sum_seconds': stats['sum_seconds'],
+									 'buckets': dict(zip(LATENCY_BUCKETS, np.cumsum(stats['buckets']).tolist()))}
+			return {'since': self.start_time,
+					'events': {event: dict(stats) for event, stats in self.events.items()},
+					'requests': requests,
+					'pending_requests': len(self.pending)}
+
+	def close(self):
+		if self.trace is not None:
+			self.trace.close()
+			self.trace = None
+
+def enable_metrics(trace_file = None):
+	"""Start recording per-event counters, bytes, timings and request latencies
+
+	Disabled by default, when disabled sending an event costs a single check.
+
+	Parameters
+	----------
+	trace_file : string, optional
+		path of a JSONL file that gets one line per sent event and per completed request
+
+	Examples
+	--------
+	>>> urchin.client.enable_metrics()
+	>>> # ... build the figure ...
+	>>> urchin.client.metrics()['events']['MeshUpdate']
+	{'count': 100, 'bytes': 15300, 'serialize_seconds': 0.004, 'emit_seconds': 0.021}
+	"""
+	global _metrics
+	disable_metrics()
+	_metrics = Metrics(trace_file)
+
+def disable_metrics():
+	"""Stop recording metrics and close the trace file
+	"""
+	global _metrics
+	if _metrics is not None:
+		_metrics.close()
+		_metrics = None
+
+def metrics():
+	"""Snapshot of the recorded metrics, see Metrics.snapshot
+
+	Returns
+	-------
+	dict or None
+		None when metrics are disabled
+	"""
+	return _metrics.snapshot() if _metrics is not None else None
+
+def request_completed(request, request_id, failed = False):
+	"""Record the reply to a request listed in REQUEST_EVENTS, called by the modules handling the replies
+
+	Parameters
+	----------
+	request : string
+		event that sent the request, e.g. 'RequestCameraImg'
+	request_id : string
+	failed : bool, optional
+	"""
+	if _metrics is not None:
+		_metrics.completed(request, request_id, failed)
+
+def _prometheus_label(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def metrics_prometheus():
+	"""Export the recorded metrics in the Prometheus text format
+
+	Returns
+	-------
+	string
+	"""
+	snapshot = metrics()
+	if snapshot is None:
+		return ''
+
+	lines = []
+	counters = [('count', 'urchin_events_total', 'Events sent to the renderer'),
+				('bytes', 'urchin_event_bytes_total', 'Approximate payload bytes sent to the renderer'),
+				('serialize_seconds', 'urchin_serialize_seconds_total', 'Time spent serializing payloads'),
+				('emit_seconds', 'urchin_emit_seconds_total', 'Time spent in the transport emit')]
+	for field, name, description in counters:
+		lines.append(f'# HELP {name} {description}')
+		lines.append(f'# TYPE {name} counter')
+		for event, stats in sorted(snapshot['events'].items()):
+			lines.append(f'{name}{{event="{_prometheus_label(event)}"}} {stats[field]}')
+
+	name = 'urchin_request_latency_seconds'
+	lines.append(f'# HELP {name} Time from a request to its reply')
+	lines.append(f'# TYPE {name} histogram')
+	for request, stats in sorted(snapshot['requests'].items()):
+		label = _prometheus_label(request)
+		for bound, count in stats['buckets'].items():
+			lines.append(f'{name}_bucket{{request="{label}",le="{bound}"}} {count}')
+		lines.append(f'{name}_bucket{{request="{label}",le="+Inf"}} {stats["count"]}')
+		lines.append(f'{name}_sum{{request="{label}"}} {stats["sum_seconds"]}')
+		lines.append(f'{name}_count{{request="{label}"}} {stats["count"]}')
+
+	lines.append('# HELP urchin_requests_failed_total Requests that failed or timed out')
+	lines.append('# TYPE urchin_requests_failed_total counter')
+	for request, stats in sorted(snapshot['requests'].items()):
+		lines.append(f'urchin_requests_failed_total{{request="{_prometheus_label(request)}"}} {stats["failed"]}')
+
+	return '\n'.join(lines) + '\n'
@@ -2,7 +2,9 @@
 
 from . import client
 from . import utils
+from . import cache
 import json
+import numpy as np
 
 count = 0
 
@@ -31,20 +33,30 @@ class CustomMesh:
 
         data = {}
         data['ID'] = self.id
-        data['vertices'] = vertices
-        data['triangles'] = triangles
 
-        if not normals is None:
-            data['normals'] = normals
+        arrays = {}
+        arrays['vertices'] = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        arrays['triangles'] = np.asarray(triangles, dtype=np.int32).reshape(-1)
 
-        client.sio.emit('CustomMeshCreate', json.dumps(data))
+        if not normals is None:
+            arrays['normals'] = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+
+        # skip the geometry upload when the renderer already holds the same mesh
+        data['hash'] = cache.content_hash(*[array.data for array in arrays.values()],
+                                          meta = f'custommesh{[(k, v.shape) for k, v in arrays.items()]}')
+        if cache.query(data['hash']):
+            data['cached'] = True
+            client.emit_arrays('CustomMeshCreate', data)
+        else:
+            client.emit_arrays('CustomMeshCreate', data, **arrays)
+            cache.add(data['hash'], sum(array.nbytes for array in arrays.values()))
         
         self.in_unity = True
 
     def delete(self):
         """Destroy this object in the renderer scene
         """
-        client.sio.emit('CustomMeshDelete', self.id)
+        client.emit('CustomMeshDelete', self.id)
         self.in_unity = False
 
     def set_position(self, position = [0,0,0], use_reference = True):
@@ -71,7 +83,7 @@ class CustomMesh:
         data['Position'] = utils.formatted_vector3(position)
         data['UseReference'] = use_reference
 
-        client.sio.emit('CustomMeshPosition', json.dumps(data))
+        client.emit('CustomMeshPosition', json.dumps(data), key=self.id)
 
     def set_scale(self, scale = [1, 1, 1]):
         """_summary_
@@ -88,9 +100,9 @@ class CustomMesh:
         data['ID'] = self.id
         data['Value'] = utils.formatted_vector3(scale)
 
-        client.sio.emit('CustomMeshScale', json.dumps(data))
+        client.emit('CustomMeshScale', json.dumps(data), key=self.id)
 
 def clear():
     """Clear all custom meshes
     """
-    client.sio.emit('Clear','custommesh')
\ No newline at end of file
+    client.emit('Clear','custommesh')
\ No newline at end of file
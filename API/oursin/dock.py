@@ -34,10 +34,10 @@ def create_bucket(bucket_name, password, api_url = api_url):
 def save():
     """Save the current scene
     """
-    client.sio.emit('urchin-save')
+    client.emit('urchin-save', immediate=True)
 
 def load(url):
-    client.sio.emit('urchin-load', url)
+    client.emit('urchin-load', url)
 
 
 
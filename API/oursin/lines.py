@@ -27,7 +27,7 @@ class Line:
     global counter
     counter += 1
     self.id = 'l' + str(counter)
-    client.sio.emit('CreateLine', [self.id])
+    client.emit('CreateLine', [self.id])
     self.in_unity = True
 
   def delete(self):
@@ -40,7 +40,7 @@ class Line:
     Examples
     >>>l1.delete()
     """
-    client.sio.emit('DeleteLine', [self.id])
+    client.emit('DeleteLine', [self.id])
     self.in_unity = False
 
   def set_position(self, position):
@@ -62,7 +62,7 @@ class Line:
       position[i] = utils.sanitize_vector3(vec3)
     self.position = position
 
-    client.sio.emit('SetLinePosition', {self.id: self.position})
+    client.emit('SetLinePosition', {self.id: self.position})
 
   def set_color(self, color):
     """Set the color of line renderer
@@ -81,7 +81,7 @@ class Line:
 
     color = utils.sanitize_color(color)
     self.color = color
-    client.sio.emit('SetLineColor',{self.id: color})
+    client.emit('SetLineColor',{self.id: color})
 
 def create (n):
   """Create Line objects
@@ -113,4 +113,4 @@ def delete (lines_list):
   """
   lines_list = utils.sanitize_list(lines_list)
   lines_ids = [x.id for x in lines_list]
-  client.sio.emit("DeleteLine", lines_ids)
+  client.emit("DeleteLine", lines_ids)
@@ -0,0 +1,555 @@
+"""In-process loopback renderer
+
+LoopbackTransport replaces the socket.io connection with a LoopbackRenderer living in the same
+process. The renderer decodes every message the API sends, keeps the resulting scene state and
+answers screenshot and cache requests, which gives a deterministic, offline setup for tests and
+for measuring client-side throughput and latency.
+
+Examples
+--------
+>>> renderer = urchin.loopback.connect()
+>>> mesh = urchin.meshes.create(1)[0]
+>>> renderer.scene['meshes'][mesh.data.id]['Shape']
+'cube'
+"""
+
+from . import client
+from . import utils
+
+import io
+import json
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# screenshot replies are split into CameraImg messages of this size
+REPLY_CHUNK_SIZE = 1000000
+
+# {id: value} messages, event -> (scene category, field)
+SETTERS = {
+	'SetProbeColors': ('probes', 'color'),
+	'SetProbePos': ('probes', 'position'),
+	'SetProbeAngles': ('probes', 'angles'),
+	'SetProbeSize': ('probes', 'size'),
+	'SetProbeStyle': ('probes', 'style'),
+	'SetTextColors': ('texts', 'color'),
+	'SetTextPositions': ('texts', 'position'),
+	'SetTextText': ('texts', 'text'),
+	'SetTextSizes': ('texts', 'size'),
+	'SetLinePosition': ('lines', 'position'),
+	'SetLineColor': ('lines', 'color'),
+	'SetCameraTarget': ('cameras', 'target'),
+	'SetCameraRotation': ('cameras', 'rotation'),
+	'SetCameraZoom': ('cameras', 'zoom'),
+	'SetCameraTargetArea': ('cameras', 'targetArea'),
+	'SetCameraPan': ('cameras', 'pan'),
+	'SetCameraMode': ('cameras', 'mode'),
+	'SetCameraColor': ('cameras', 'background'),
+	'SetCameraAnimationFrame': ('cameras', 'frame'),
+	'SetFOVPos': ('textures', 'position'),
+	'SetFOVOffset': ('textures', 'offset'),
+	'SetParticlePos': ('particles', 'position'),
+	'SetParticleSize': ('particles', 'size'),
+	'SetParticleColor': ('particles', 'color'),
+}
+
+# [id, ...] messages, event -> scene category
+CREATES = {
+	'CreateProbes': 'probes',
+	'CreateText': 'texts',
+	'CreateLine': 'lines',
+	'CreateCamera': 'cameras',
+	'CreateFOV': 'textures',
+	'CreateParticles': 'particles',
+}
+
+DELETES = {
+	'DeleteProbes': 'probes',
+	'DeleteText': 'texts',
+	'DeleteLine': 'lines',
+	'DeleteCamera': 'cameras',
+	'DeleteFOV': 'textures',
+	'DeleteFOVs': 'textures',
+}
+
+# Clear targets -> scene categories
+CLEAR_TARGETS = {
+	'probe': ['probes'],
+	'volume': ['volumes'],
+	'text': ['texts'],
+	'mesh': ['meshes'],
+	'particle': ['particles'],
+	'custommesh': ['custom_meshes'],
+	'area': [],
+}
+
+class LoopbackRenderer:
+	"""Decodes renderer messages into a scene dictionary
+
+	Attributes
+	----------
+	scene : dict of dict
+		category ('meshes', 'particles', 'volumes', 'atlases', 'cameras', ...) -> object id -> state
+	events : collections.Counter
+		messages received per event, a batched frame counts once as 'urchin-batch' and once per contained event
+	n_bytes : int
+		approximate bytes received
+	n_replies, n_reply_bytes : int
+		messages and approximate bytes sent back to the client (screenshots, cache replies)
+	unhandled : collections.Counter
+		events that were received but aren't decoded
+	"""
+	def __init__(self, screenshot_color = None):
+		"""
+		Parameters
+		----------
+		screenshot_color : callable, optional
+			f(request) -> RGB tuple used to fill synthesized screenshots, by default the camera background color
+		"""
+		self.screenshot_color = screenshot_color
+		self.reset()
+
+	def reset(self):
+		"""Clear the scene and the statistics
+		"""
+		self.scene = defaultdict(dict)
+		self.blobs = {}
+		self.settings = {}
+		self.next_texture = None
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.events = Counter()
+		self.unhandled = Counter()
+		self.n_messages = 0
+		self.n_bytes = 0
+		self.n_replies = 0
+		self.n_reply_bytes = 0
+
+	def reply(self, event, data):
+		"""Send an event back to the client, through the client's handlers
+		"""
+		self.n_replies += 1
+		self.n_reply_bytes += len(event) + client.payload_size(data)
+		client.handlers[event](data)
+
+	def handle(self, event, data = None):
+		"""Decode one message sent by the client
+		"""
+		self.n_messages += 1
+		self.n_bytes += len(event) + client.payload_size(data)
+
+		if event == client.BATCH_EVENT:
+			self.events[event] += 1
+			for batched_event, batched_data in data:
+				self._dispatch(batched_event, batched_data)
+		else:
+			self._dispatch(event, data)
+
+	def _dispatch(self, event, data):
+		self.events[event] += 1
+
+		if event in SETTERS:
+			category, field = SETTERS[event]
+			for object_id, value in data.items():
+				self.scene[category].setdefault(object_id, {})[field] = value
+		elif event in CREATES:
+			for object_id in data:
+				self.scene[CREATES[event]].setdefault(object_id, {})
+		elif event in DELETES:
+			for object_id in data:
+				self.scene[DELETES[event]].pop(object_id, None)
+		else:
+			handler = getattr(self, '_on_' + event.replace('-', '_'), None)
+			if handler is None:
+				self.unhandled[event] += 1
+			else:
+				handler(data)
+
+	def _track_hash(self, header, value = None):
+		"""Internal helper, remember uploaded content for cache queries
+		"""
+		if header.get('hash') is not None and not header.get('cached', False):
+			self.blobs[header['hash']] = value
+
+	###### SCENE #######
+
+	def _on_ID(self, data):
+		self.settings['id'] = data[0]
+
+	def _on_Clear(self, data):
+		if data == 'all':
+			self.scene.clear()
+			return
+		for category in CLEAR_TARGETS.get(data, []):
+			self.scene[category].clear()
+
+	def _on_SetCameraControl(self, data):
+		self.scene['cameras'].setdefault(data, {})['controllable'] = True
+
+	def _on_SetLightRotation(self, data):
+		self.settings['lightRotation'] = data
+
+	def _on_SetLightLink(self, data):
+		self.settings['lightLink'] = data
+
+	def _on_ResetLightLink(self, data):
+		self.settings.pop('lightLink', None)
+
+	def _on_urchin_save(self, data):
+		pass
+
+	def _on_urchin_load(self, data):
+		self.settings['loaded'] = data
+
+	###### MESHES #######
+
+	def _on_MeshUpdate(self, data):
+		mesh = json.loads(data)
+		self.scene['meshes'][mesh['ID']] = mesh
+
+	def _on_MeshDelete(self, data):
+		self.scene['meshes'].pop(json.loads(data)['ID'], None)
+
+	def _on_MeshDeletes(self, data):
+		for mesh_id in json.loads(data)['IDs']:
+			self.scene['meshes'].pop(mesh_id, None)
+
+	def _mesh_values(self, data, field):
+		data = json.loads(data)
+		for mesh_id, value in zip(data['IDs'], data['Values']):
+			self.scene['meshes'].setdefault(mesh_id, {})[field] = value
+
+	def _on_MeshPositions(self, data):
+		self._mesh_values(data, 'Position')
+
+	def _on_MeshScales(self, data):
+		self._mesh_values(data, 'Scale')
+
+	def _on_MeshColors(self, data):
+		self._mesh_values(data, 'Color')
+
+	def _on_MeshMaterials(self, data):
+		self._mesh_values(data, 'Material')
+
+	def _mesh_arrays(self, data, field, components):
+		_, arrays = client.decode_arrays(data)
+		values = arrays['values']
+		if values.dtype == np.uint8:
+			# decode to the 0->1 colors of the JSON models
+			values = values / 255
+		meshes = self.scene['meshes']
+		for mesh_id, row in zip(arrays['ids'].tolist(), values.tolist()):
+			meshes.setdefault(str(mesh_id), {})[field] = dict(zip(components, row))
+
+	def _on_MeshPositionsArray(self, data):
+		self._mesh_arrays(data, 'Position', 'xyz')
+
+	def _on_MeshScalesArray(self, data):
+		self._mesh_arrays(data, 'Scale', 'xyz')
+
+	def _on_MeshColorsArray(self, data):
+		self._mesh_arrays(data, 'Color', 'rgba')
+
+	def _on_CustomMeshCreate(self, data):
+		header, arrays = client.decode_arrays(data)
+		self._track_hash(header)
+		mesh = self.scene['custom_meshes'].setdefault(header['ID'], {})
+		mesh.update(header)
+		mesh.update(arrays)
+
+	def _on_CustomMeshDelete(self, data):
+		self.scene['custom_meshes'].pop(data, None)
+
+	def _on_CustomMeshPosition(self, data):
+		data = json.loads(data)
+		self.scene['custom_meshes'].setdefault(data['ID'], {})['position'] = data['Position']
+
+	def _on_CustomMeshScale(self, data):
+		data = json.loads(data)
+		self.scene['custom_meshes'].setdefault(data['ID'], {})['scale'] = data['Value']
+
+	###### PARTICLES #######
+
+	def _on_ParticleGroupCreate(self, data):
+		model = json.loads(data)
+		n = model['N']
+		self.scene['particles'][model['ID']] = {
+			'material': model['Material'],
+			'positions': np.zeros((n, 3), dtype=np.float32),
+			'sizes': np.zeros(n, dtype=np.float32),
+			'colors': np.zeros((n, 4), dtype=np.uint8),
+		}
+
+	def _particle_values(self, data, field):
+		header, arrays = client.decode_arrays(data)
+		group = self.scene['particles'][header['ID']]
+		values = arrays['values'].reshape((-1,) + group[field].shape[1:])
+		if 'indices' in arrays:
+			group[field][arrays['indices']] = values
+		else:
+			group[field][:] = values
+
+	def _on_ParticleGroupPositions(self, data):
+		self._particle_values(data, 'positions')
+
+	def _on_ParticleGroupSizes(self, data):
+		self._particle_values(data, 'sizes')
+
+	def _on_ParticleGroupColors(self, data):
+		self._particle_values(data, 'colors')
+
+	def _on_ParticleGroupDelete(self, data):
+		self.scene['particles'].pop(data, None)
+
+	def _on_SetParticleMaterial(self, data):
+		self.settings['particleMaterial'] = data
+
+	###### VOLUMES #######
+
+	def _on_UpdateVolume(self, data):
+		meta = json.loads(data)
+		volume = self.scene['volumes'].setdefault(meta['name'], {'compressed': bytearray()})
+		volume['meta'] = meta
+		if 'levels' in meta:
+			volume.setdefault('levels', [np.full(shape, 255, dtype=np.uint8) for shape in meta['levels']])
+		elif meta.get('cached'):
+			volume['data'] = self.blobs[meta['hash']].copy()
+		elif meta.get('nBytes') is not None and 'data' not in volume:
+			volume['data'] = np.full(meta['nBytes'], 255, dtype=np.uint8)
+
+	def _volume_array(self, volume):
+		"""Volume data shaped as (AP, ML, DV) when the shape is known
+		"""
+		meta = volume['meta']
+		if volume['data'].ndim == 1:
+			volume['data'] = volume['data'].reshape(meta['shape'])
+		return volume['data']
+
+	def _on_SetVolumeData(self, data):
+		header = json.loads(data[0])
+		volume = self.scene['volumes'][header['name']]
+		meta = volume['meta']
+		compressed = volume['compressed']
+		end = header['offset'] + len(data[1])
+		if len(compressed) < end:
+			compressed.extend(bytes(end - len(compressed)))
+		compressed[header['offset'] : end] = data[1]
+
+		if len(compressed) == meta['nCompressedBytes']:
+			raw = np.frombuffer(zlib.decompress(compressed), dtype=np.uint8)
+			if 'brickSize' in meta and 'occupancy' in volume:
+				volume['data'] = _unpack_sparse(raw, volume['occupancy'], meta['brickSize'], meta['shape'])
+			else:
+				volume['data'] = raw.copy()
+			volume['compressed'] = bytearray()
+			self._track_hash(meta, volume['data'].reshape(-1).copy())
+
+	def _on_SetVolumeBlock(self, data):
+		header = json.loads(data[0])
+		volume = self.scene['volumes'][header['name']]
+		volume['data'].reshape(-1)[header['offset'] : header['offset'] + header['nBytes']] = np.frombuffer(zlib.decompress(data[1]), dtype=np.uint8)
+		volume['n_blocks'] = volume.get('n_blocks', 0) + 1
+		if volume['n_blocks'] == volume['meta']['nBlocks']:
+			self._track_hash(volume['meta'], volume['data'].reshape(-1).copy())
+
+	def _on_SetVolumeOccupancy(self, data):
+		header = json.loads(data[0])
+		grid = header['gridShape']
+		bits = np.unpackbits(np.frombuffer(data[1], dtype=np.uint8))[:int(np.prod(grid))]
+		self.scene['volumes'][header['name']]['occupancy'] = bits.reshape(grid).astype(bool)
+
+	def _on_SetVolumeBrick(self, data):
+		header = json.loads(data[0])
+		level = self.scene['volumes'][header['name']]['levels'][header['level']]
+		region = tuple(slice(offset, offset + size) for offset, size in zip(header['offset'], header['shape']))
+		level[region] = np.frombuffer(zlib.decompress(data[1]), dtype=np.uint8).reshape(header['shape'])
+
+	def _on_SetVolumeRegions(self, data):
+		header = json.loads(data[0])
+		volume = self.scene['volumes'][header['name']]
+		array = self._volume_array(volume)
+		for region, buffer in zip(header['regions'], data[1:]):
+			shape = region['shape']
+			target = tuple(slice(offset, offset + size) for offset, size in zip(region['offset'], shape))
+			array[target] = np.frombuffer(zlib.decompress(buffer), dtype=np.uint8).reshape(shape)
+
+	def _on_SetVolumeColormap(self, data):
+		header = json.loads(data[0])
+		self.scene['volumes'].setdefault(header['name'], {'compressed': bytearray()})['colormap'] = \
+			np.frombuffer(data[1], dtype=np.uint8).reshape(256, 4)
+
+	def _on_DeleteVolume(self, data):
+		self.scene['volumes'].pop(data, None)
+
+	def volume(self, name):
+		"""Get the decoded uint8 data of a volume
+
+		Parameters
+		----------
+		name : string
+			Volume.id
+
+		Returns
+		-------
+		np.ndarray
+			(AP, ML, DV) uint8 volume, or the flat data when the shape wasn't sent
+		"""
+		volume = self.scene['volumes'][name]
+		if 'levels' in volume:
+			return volume['levels'][0]
+		return self._volume_array(volume)
+
+	###### TEXTURES #######
+
+	def _on_SetFOVTextureDataMetaInit(self, data):
+		texture_id, n_chunks, height, width = data[:4]
+		texture = self.scene['textures'].setdefault(texture_id, {})
+		texture['shape'] = (height, width)
+		texture['chunks'] = [None] * n_chunks
+		texture['hash'] = data[5] if len(data) > 5 else None
+		if len(data) > 6 and data[6]:
+			texture['image'] = self.blobs.get(texture['hash'])
+
+	def _on_SetFOVTextureDataMeta(self, data):
+		self.next_texture = data
+
+	def _on_SetFOVTextureData(self, data):
+		# raw bytes, the texture and chunk index come from the preceding SetFOVTextureDataMeta
+		texture_id, index, immediate = self.next_texture
+		texture = self.scene['textures'][texture_id]
+		texture['chunks'][index] = bytes(data)
+		if immediate:
+			texture['image'] = b''.join(texture['chunks'])
+			self._track_hash({'hash': texture['hash']}, texture['image'])
+
+	###### ATLAS #######
+
+	def _on_urchin_atlas_load(self, data):
+		self.scene['atlases'].setdefault(data, {})
+
+	def _on_urchin_atlas_update(self, data):
+		atlas = json.loads(data)
+		self.scene['atlases'][atlas['Name']] = atlas
+
+	def _on_urchin_atlas_delta(self, data):
+		delta = json.loads(data)
+		areas = self.scene['atlases'][delta['Name']]['Areas']
+		for area in delta['Areas']:
+			index = area.pop('Index')
+			area.pop('AtlasId')
+			areas[index].update(area)
+
+	def _on_urchin_atlas_defaults(self, data):
+		self.settings['atlasDefaults'] = True
+
+	def _on_CustomAtlas(self, data):
+		atlas = json.loads(data)
+		self.scene['atlases'][atlas.get('name', atlas.get('Name'))] = atlas
+
+	###### CAMERA #######
+
+	def _on_SetCameraLerpRotation(self, data):
+		self.settings['lerpRotation'] = json.loads(data)
+
+	def _on_SetCameraLerp(self, data):
+		lerp = json.loads(data)
+		self.scene['cameras'].setdefault(lerp['ID'], {})['lerp'] = lerp['Value']
+
+	def _on_SetCameraAnimation(self, data):
+		header, arrays = client.decode_arrays(data)
+		self.scene['cameras'].setdefault(header['name'], {})['animation'] = arrays['frames']
+
+	def _on_RequestCameraImg(self, data):
+		"""Synthesize a screenshot, filled with the camera background color
+		"""
+		request = json.loads(data)
+		width, height = request['size']
+
+		if self.screenshot_color is not None:
+			color = self.screenshot_color(request)
+		else:
+			background = self.scene['cameras'].get(request['name'], {}).get('background', '#ffffff')
+			color = utils.hex_to_rgba(background)[:3]
+		image = np.empty((height, width, 3), dtype=np.uint8)
+		image[:] = color
+
+		if request.get('format') == 'raw':
+			image_bytes = image.tobytes()
+		else:
+			from PIL import Image
+			buffer = io.BytesIO()
+			Image.fromarray(image).save(buffer, format='PNG')
+			image_bytes = buffer.getvalue()
+
+		header = {'name': request['name'], 'id': request['id']}
+		self.reply('CameraImgMeta', json.dumps(dict(header, totalBytes=len(image_bytes))))
+		for offset in range(0, len(image_bytes), REPLY_CHUNK_SIZE):
+			self.reply('CameraImg', [json.dumps(dict(header, offset=offset)), image_bytes[offset : offset + REPLY_CHUNK_SIZE]])
+
+	###### CACHE #######
+
+	def _on_urchin_cache_query(self, data):
+		self.reply('urchin-cache-reply', {'id': data['id'], 'hash': data['hash'], 'hit': data['hash'] in self.blobs})
+
+def _unpack_sparse(bricks, occupancy, brick_size, shape):
+	"""Internal helper, rebuild a dense volume from the occupied bricks of a sparse upload
+	"""
+	bricks = bricks.reshape(-1, brick_size, brick_size, brick_size)
+	grid = occupancy.shape
+	dense = np.full((grid[0], grid[1], grid[2], brick_size, brick_size, brick_size), 255, dtype=np.uint8)
+	dense[occupancy] = bricks
+	dense = dense.transpose(0, 3, 1, 4, 2, 5).reshape([n * brick_size for n in grid])
+	return dense[:shape[0], :shape[1], :shape[2]].copy()
+
+class LoopbackTransport(client.Transport):
+	"""Transport that delivers every emit to an in-process LoopbackRenderer
+	"""
+	def __init__(self, renderer = None):
+		"""
+		Parameters
+		----------
+		renderer : LoopbackRenderer, optional
+			by default a new renderer
+		"""
+		self.renderer = renderer if renderer is not None else LoopbackRenderer()
+		self.is_connected = False
+
+	def connect(self, url = None):
+		self.is_connected = True
+		client.handlers['connect']()
+
+	def disconnect(self):
+		self.is_connected = False
+		client.handlers['disconnect']()
+
+	def connected(self):
+		return self.is_connected
+
+	def emit(self, event, data = None):
+		self.renderer.handle(event, data)
+
+def connect(renderer = None):
+	"""Replace the renderer connection with an in-process loopback renderer
+
+	Parameters
+	----------
+	renderer : LoopbackRenderer, optional
+		by default a new renderer
+
+	Returns
+	-------
+	LoopbackRenderer
+
+	Examples
+	--------
+	>>> renderer = urchin.loopback.connect()
+	>>> urchin.meshes.create(10)
+	>>> len(renderer.scene['meshes'])
+	10
+	"""
+	transport = LoopbackTransport(renderer)
+	client.use_transport(transport)
+	transport.connect()
+	return transport.renderer
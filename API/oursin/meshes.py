@@ -2,6 +2,7 @@
 
 from . import client
 import warnings
+import numpy as np
 from . import utils
 
 from vbl_aquarium.models.urchin import *
@@ -9,6 +10,10 @@ from vbl_aquarium.models.generic import *
 
 callback = None
 
+# send set_positions/set_scales/set_colors as the JSON models (default, understood by every
+# renderer), set to True to send them as packed arrays
+binary = False
+
 def _neuron_callback(callback_data):
   if callback is not None:
     callback(callback_data)
@@ -57,7 +62,7 @@ class Mesh:
   def _update(self):
     """Serialize and update the data in the Urchin Renderer
     """
-    client.sio.emit('MeshUpdate', self.data.to_string())
+    client.emit('MeshUpdate', self.data, key=self.data.id)
 
   def delete(self):
     """Deletes meshes
@@ -74,7 +79,7 @@ class Mesh:
     data = IDData
     data.id = self.data.id
 
-    client.sio.emit('MeshDelete', data.to_string())
+    client.emit('MeshDelete', data)
     self.in_unity = False
   
   def set_position(self, position):
@@ -210,7 +215,35 @@ def delete(meshes_list):
     ids = [x.data.id for x in meshes_list]
   )
 
-  client.sio.emit('MeshDeletes', data.to_string())
+  client.emit('MeshDeletes', data)
+
+def _value_dtypes():
+  """Internal helper, (vector dtype, color dtype) of the values passed to _emit_values
+
+  The JSON models keep the caller's floats (float64, colors in 0->1), the packed arrays are
+  float32 vectors and uint8 colors in 0->255.
+  """
+  if binary:
+    return np.float32, np.uint8
+  return np.float64, np.float64
+
+def _emit_values(event, meshes_list, values):
+  """Internal helper, send one row of values per mesh
+
+  As the JSON models on '<event>', or packed as an int32 id column and a (N, D) value buffer on
+  the '<event>Array' event when binary is True. See _value_dtypes for the layout of the values.
+  """
+  if binary:
+    ids = np.fromiter((int(mesh.data.id) for mesh in meshes_list), dtype=np.int32, count=len(meshes_list))
+    client.emit_arrays(event + 'Array', {}, ids=ids, values=values)
+    return
+
+  ids = [mesh.data.id for mesh in meshes_list]
+  if event == 'MeshColors':
+    data = IDListColorList(ids = ids, values = [utils.formatted_color(x) for x in values.tolist()])
+  else:
+    data = IDListVector3List(ids = ids, values = [utils.formatted_vector3(x) for x in values.tolist()])
+  client.emit(event, data)
 
 def set_positions(meshes_list, positions_list):
   """Set the positions of mesh renderers
@@ -219,22 +252,18 @@ def set_positions(meshes_list, positions_list):
   ----------
   meshes_list : list of mesh objects
 	  list of meshes being set
-  positions_list : list of list of three floats
-    vertex positions of each mesh
+  positions_list : list of list of three floats, or (N, 3) array
+    (ap, ml, dv) positions of each mesh in um, or a single position for all meshes
       
 	Examples
 	--------
 	>>> urchin.primitives.set_positions(cubes,[[3,3,3],[2,2,2]])
+	>>> urchin.meshes.set_positions(cubes, np.random.rand(len(cubes), 3) * 10000)
   """
   meshes_list = utils.sanitize_list(meshes_list)
-  positions_list = utils.sanitize_list(positions_list)
-
-  data = IDListVector3List(
-    ids = [x.data.id for x in meshes_list],
-    values = [utils.formatted_vector3(utils.sanitize_vector3([x[0]/1000, x[1]/1000, x[2]/1000])) for x in positions_list]
-  )
+  positions = utils.sanitize_vector3_array(positions_list, len(meshes_list), _value_dtypes()[0])
 
-  client.sio.emit('MeshPositions', data.to_string())
+  _emit_values('MeshPositions', meshes_list, positions / 1000)
 
 def set_scales(meshes_list, scales_list):
   """Set scale of mesh renderers
@@ -243,22 +272,17 @@ def set_scales(meshes_list, scales_list):
   ----------
   meshes_list : list of mesh objects
 	  list of meshes being scaled
-  scales_list : list of list of three floats
-    new scales of each mesh
+  scales_list : list of list of three floats, or (N, 3) array
+    new scales of each mesh, or a single scale for all meshes
       
 	Examples
 	--------
 	>>> urchin.primitives.set_scales(cubes,[[3,3,3],[2,2,2]])
   """
   meshes_list = utils.sanitize_list(meshes_list)
-  scales_list = utils.sanitize_list(scales_list)
-
-  data = IDListVector3List(
-    ids = [x.data.id for x in meshes_list],
-    values = [utils.formatted_vector3(utils.sanitize_vector3(x)) for x in scales_list]
-  )
+  scales = utils.sanitize_vector3_array(scales_list, len(meshes_list), _value_dtypes()[0])
 
-  client.sio.emit('MeshScales', data.to_string())
+  _emit_values('MeshScales', meshes_list, scales)
 
 def set_colors(meshes_list, colors_list):
   """Sets colors of mesh renderers
@@ -267,23 +291,19 @@ def set_colors(meshes_list, colors_list):
   ----------
   meshes_list : list of mesh objects
 	  list of meshes undergoing color change
-  colors_list : list of string hex colors
-      new hex colors for each mesh
+  colors_list : list of hex colors, (N, 3) or (N, 4) array, or a single color
+      float arrays are 0->1, integer arrays are 0->255
       
 	Examples
 	--------
 	>>> urchin.primitives.set_colors(cubes,["#000000","#000000"])
+	>>> urchin.meshes.set_colors(cubes, np.random.rand(len(cubes), 3))
 	
   """
   meshes_list = utils.sanitize_list(meshes_list)
-  colors_list = utils.sanitize_list(colors_list)
-
-  data = IDListColorList(
-    ids = [x.data.id for x in meshes_list],
-    values = [utils.formatted_color(utils.sanitize_vector3(x)) for x in colors_list]
-  )
+  colors = utils.sanitize_color_array(colors_list, len(meshes_list), _value_dtypes()[1])
 
-  client.sio.emit('MeshColors', data.to_string())
+  _emit_values('MeshColors', meshes_list, colors)
 
 def set_materials(meshes_list, materials_list):
   """Sets materials of mesh renderers
@@ -308,4 +328,4 @@ def set_materials(meshes_list, materials_list):
     values = [utils.sanitize_material(x) for x in materials_list]
   )
       
-  client.sio.emit('MeshMaterials', data.to_string()) 
\ No newline at end of file
+  client.emit('MeshMaterials', data) 
\ No newline at end of file
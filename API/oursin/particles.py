@@ -2,15 +2,236 @@
 
 from . import client
 import warnings
+import numpy as np
 from . import utils
 
+from vbl_aquarium.models.urchin import ParticleSystemModel
+
 ## Particle system
 counter = 0
+
+DEFAULT_SIZE = 0.1
+DEFAULT_COLOR = '#FF0000'
+
+# send groups as packed arrays (ParticleGroup* events), by default the per-particle
+# CreateParticles/SetParticle* events that every renderer version handles are used
+binary = False
+
+class ParticleGroup:
+	"""Group of particles stored as contiguous arrays and addressed by a single id in the renderer
+
+	Positions are stored as an (N, 3) float32 array in um, sizes as an (N,) float32 array and
+	colors as an (N, 4) uint8 RGBA array. All setters are vectorized, use a ParticleGroup directly
+	when working with tens of thousands of particles. With `urchin.particles.binary = True` the
+	arrays are sent as binary attachments, which requires a renderer that handles the
+	ParticleGroup* events.
+
+	Examples
+	--------
+	>>> group = urchin.particles.ParticleGroup(200000)
+	>>> group.set_positions(positions) # (200000, 3) array in um
+	"""
+	def __init__(self, n, material = None):
+		"""Create a group of particles in the renderer
+
+		Parameters
+		----------
+		n : int
+			number of particles
+		material : str, optional
+			by default the renderer's material, 'circle' for binary groups. The per-particle
+			events only support one material for all particles, see set_material
+		"""
+		global counter
+		counter += 1
+		self.id = f'pg{counter}'
+		self.n = int(n)
+
+		self.positions = np.zeros((self.n, 3), dtype=np.float32)
+		self.sizes = np.full(self.n, DEFAULT_SIZE, dtype=np.float32)
+		self.colors = np.empty((self.n, 4), dtype=np.uint8)
+		self.colors[:] = utils.hex_to_rgba(DEFAULT_COLOR)
+
+		if binary:
+			data = ParticleSystemModel(
+				id = self.id,
+				n = self.n,
+				material = utils.sanitize_string(material if material is not None else 'circle')
+			)
+			client.emit('ParticleGroupCreate', data)
+		else:
+			client.emit('CreateParticles', self._ids(None))
+			if material is not None:
+				set_material(material)
+		self.in_unity = True
+
+	def __len__(self):
+		return self.n
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += self.n
+		if index < 0 or index >= self.n:
+			raise IndexError(f'Particle index {index} out of range for group of size {self.n}')
+		return Particle(self, index)
+
+	def __iter__(self):
+		return (Particle(self, i) for i in range(self.n))
+
+	def _check(self):
+		if self.in_unity == False:
+			raise Exception("ParticleGroup does not exist in Unity, call create method first.")
+
+	def _indices(self, indices):
+		"""Internal helper, sanitize an index array (None means all particles)
+		"""
+		if indices is None:
+			return None
+		indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+		if indices.size > 0 and (indices.min() < 0 or indices.max() >= self.n):
+			raise IndexError(f'Particle indices out of range for group of size {self.n}')
+		return indices
+
+	def _ids(self, indices):
+		"""Internal helper, renderer ids of the particles of this group
+		"""
+		return [f'{self.id}-{i}' for i in (range(self.n) if indices is None else indices.tolist())]
+
+	def _emit(self, event, indices, values, legacy_event, legacy_values):
+		"""Internal helper, send a full or partial update of one of the group arrays
+
+		As a binary attachment on event, or as {particle id: value} on legacy_event
+		"""
+		if not binary:
+			client.emit(legacy_event, dict(zip(self._ids(indices), legacy_values)))
+		elif indices is None:
+			client.emit_arrays(event, {'ID': self.id}, key=self.id, values=values)
+		else:
+			client.emit_arrays(event, {'ID': self.id}, indices=indices.astype(np.int32), values=values)
+
+	def set_positions(self, positions, indices = None):
+		"""Set the position of particles in ap/ml/dv coordinates relative to the origin (0,0,0)
+
+		Parameters
+		----------
+		positions : (N, 3) array-like
+			(ap, ml, dv) coordinates in um
+		indices : array-like of int, optional
+			particles to update, by default all particles
+
+		Examples
+		--------
+		>>> group.set_positions(np.random.rand(group.n, 3) * 10000)
+		"""
+		self._check()
+		indices = self._indices(indices)
+		n = self.n if indices is None else indices.size
+		positions = utils.sanitize_vector3_array(positions, n)
+
+		if indices is None:
+			self.positions[:] = positions
+		else:
+			self.positions[indices] = positions
+
+		legacy = (positions.astype(np.float64) / 1000).tolist() if not binary else None
+		self._emit('ParticleGroupPositions', indices, positions * np.float32(0.001), 'SetParticlePos', legacy)
+
+	def set_sizes(self, sizes, indices = None):
+		"""Set the size of particles
+
+		Parameters
+		----------
+		sizes : array-like of float, or float
+		indices : array-like of int, optional
+			particles to update, by default all particles
+
+		Examples
+		--------
+		>>> group.set_sizes(0.02) # 20 um
+		"""
+		self._check()
+		indices = self._indices(indices)
+		n = self.n if indices is None else indices.size
+		sizes = utils.sanitize_float_array(sizes, n)
+
+		if indices is None:
+			self.sizes[:] = sizes
+		else:
+			self.sizes[indices] = sizes
+
+		self._emit('ParticleGroupSizes', indices, sizes, 'SetParticleSize', sizes.astype(np.float64).tolist())
+
+	def set_colors(self, colors, indices = None):
+		"""Set the color of particles
+
+		Parameters
+		----------
+		colors : list of hex colors, (N, 3) or (N, 4) array, or a single color
+			float arrays are 0->1, integer arrays are 0->255
+		indices : array-like of int, optional
+			particles to update, by default all particles
+
+		Examples
+		--------
+		>>> group.set_colors('#FFFFFF')
+		>>> group.set_colors(['#FF0000', '#00FF00'], indices=[0, 1])
+		"""
+		self._check()
+		indices = self._indices(indices)
+		n = self.n if indices is None else indices.size
+		colors = utils.sanitize_color_array(colors, n)
+
+		if indices is None:
+			self.colors[:] = colors
+		else:
+			self.colors[indices] = colors
+
+		hex_colors = [utils.rgba_to_hex(tuple(color)) for color in colors.tolist()] if not binary else None
+		self._emit('ParticleGroupColors', indices, colors, 'SetParticleColor', hex_colors)
+
+	def delete(self):
+		"""Delete this particle group from the renderer
+
+		The per-particle events can't delete individual particles, without binary groups the
+		particles are hidden (size 0) instead, use urchin.particles.clear() to remove all particles.
+		"""
+		self._check()
+		if binary:
+			client.emit('ParticleGroupDelete', self.id)
+		else:
+			client.emit('SetParticleSize', dict.fromkeys(self._ids(None), 0.0))
+		self.in_unity = False
+
 class Particle:
 	"""Particles should not be directly instantiated, use urchin.particles.create(n) and urchin.clear_particles()
+
+	A Particle is a view into one row of a ParticleGroup
 	"""
-	def __init__(self):
-		pass
+	__slots__ = ('group', 'index')
+
+	def __init__(self, group, index):
+		self.group = group
+		self.index = index
+
+	@property
+	def id(self):
+		return f'{self.group.id}-{self.index}'
+
+	@property
+	def in_unity(self):
+		return self.group.in_unity
+
+	@property
+	def position(self):
+		return self.group.positions[self.index].tolist()
+
+	@property
+	def size(self):
+		return float(self.group.sizes[self.index])
+
+	@property
+	def color(self):
+		return utils.rgba_to_hex(tuple(self.group.colors[self.index].tolist()))
 
 	def set_position(self, position):
 		"""Set the position of a particle in ap/ml/dv coordinates relative to the origin (0,0,0)
@@ -27,8 +248,7 @@ class Particle:
 		if self.in_unity == False:
 			raise Exception("Particle does not exist in Unity, call create method first.")
 		
-		self.position = utils.sanitize_vector3(position)
-		client.sio.emit('SetParticlePos', {self.id: [self.position[0]/1000, self.position[1]/1000, self.position[2]/1000]})
+		self.group.set_positions([utils.sanitize_vector3(position)], [self.index])
 
 	def set_size(self, size):
 		"""Set the size of a particle
@@ -44,9 +264,7 @@ class Particle:
 		if self.in_unity == False:
 			raise Exception("Particle does not exist in Unity, call create method first.")
 		
-		size = utils.sanitize_float(size)
-		self.size = size
-		client.sio.emit('SetParticleSize', {self.id: size})
+		self.group.set_sizes([utils.sanitize_float(size)], [self.index])
 	
 	def set_color(self, color):
 		"""Set the color of a particle
@@ -62,59 +280,13 @@ class Particle:
 		if self.in_unity == False:
 			raise Exception("Particle does not exist in Unity, call create method first.")
 		
-		color = utils.sanitize_color(color)
-		self.color = color
-		client.sio.emit('SetParticleColor', {self.id: color})
-
-	# todo: re-implement shape and material when we move to ParticleGroup instead of single Particle objects
-
-	# def set_shape(self, shape):
-	# 	"""Set the shape of a particle
-	# 	Options are
-	#  	 - 'sphere' (default)
-	#  	 - 'cube' better performance when rendering tens of thousands of neurons
-
-	# 	Parameters
-	# 	---------- 
-	# 	shape : string
-	# 		new shape of the neuron
-
-	# 	Examples
-	# 	--------
-	# 	>>>p1.set_shape('sphere')
-	# 	"""
-	# 	if self.in_unity == False:
-	# 		raise Exception("Particle does not exist in Unity, call create method first.")
-		
-	# 	self.shape = shape
-	# 	client.sio.emit('SetNeuronShape', {self.id: shape})
-
-	# def set_material(self, material):
-	# 	"""Set the material of neuron renderer
-	# 	Options are
-	#  	- 'lit-transparent' (default)
-	#  	- 'lit'
-	#  	- 'unlit'
-
-	# 	Parameters
-	# 	---------- 
-	# 	material : string
-	# 		new material of the neuron
-
-	# 	Examples
-	# 	--------
-	# 	>>>p1.set_material('lit-transparent')
-	# 	"""
-	# 	if self.in_unity == False:
-	# 		raise Exception("Particle does not exist in Unity, call create method first.")
-		
-	# 	self.material = material
-	# 	client.sio.emit('SetNeuronMaterial', {self.id: material})
+		self.group.set_colors([utils.sanitize_color(color)], [self.index])
 
 def create(num_particles):
 	"""Create particles
 
-	Note: particles must be created before setting other values
+	Note: particles must be created before setting other values. All particles created by one
+	call share a single ParticleGroup, use urchin.particles.ParticleGroup directly for large N.
 
 	Parameters
 	----------
@@ -124,81 +296,85 @@ def create(num_particles):
 	--------
 	>>> neurons = urchin.particles.create(3)
 	"""
-	global counter
-	neurons = []
-	for i in range(num_particles):
-		counter += 1
-		particle = Particle()
-		particle.id = f'n{str(counter)}'
-		particle.in_unity = True
-		neurons.append(particle)
-
-	client.sio.emit('CreateParticles', [x.id for x in neurons])
-	return neurons
+	group = ParticleGroup(num_particles)
+	return list(group)
 
 def clear():
 	"""Clear all particles
 
 	Note that there is no delete method for individual particles, they must all be cleared at once.
 	"""
-	client.sio.emit('Clear', 'particle')
+	client.emit('Clear', 'particle')
+
+def _split_by_group(particles_list):
+	"""Internal helper, map a list of Particle views (or a ParticleGroup) to {group: (list positions, indices)}
+	"""
+	if isinstance(particles_list, ParticleGroup):
+		return {particles_list: (None, None)}
+
+	particles_list = utils.sanitize_list(particles_list)
+
+	groups = {}
+	for i, particle in enumerate(particles_list):
+		rows, indices = groups.setdefault(particle.group, ([], []))
+		rows.append(i)
+		indices.append(particle.index)
+	return groups
+
+def _set_grouped(particles_list, values, setter):
+	"""Internal helper, apply a vectorized ParticleGroup setter to a list of particles
+	"""
+	for group, (rows, indices) in _split_by_group(particles_list).items():
+		if not group.in_unity:
+			warnings.warn(f"ParticleGroup with id {group.id} does not exist in Unity, call create method first.")
+			continue
+
+		if rows is None:
+			setter(group, values, None)
+		elif len(rows) == len(values) and rows[-1] == len(rows) - 1:
+			if len(indices) == group.n and indices == list(range(group.n)):
+				indices = None
+			setter(group, values, indices)
+		else:
+			setter(group, np.asarray(values)[rows], indices)
 
 def set_positions(particles_list, positions_list):
 	"""Set the position of particles in ap/ml/dv coordinates relative to the origin
 
 	Parameters
 	----------
-	particles_list : list of Particle
-	positions_list : list of list of three floats
+	particles_list : list of Particle, or ParticleGroup
+	positions_list : list of list of three floats, or (N, 3) array
 		list of positions of neurons (ap, ml, dv) in um
 
 	Examples
 	--------
 	>>> urchin.particles.set_positions([p1,p2,p3], [[1000,1000,1000],...,...])
 	"""
-	particles_list = utils.sanitize_list(particles_list)
-	positions_list = utils.sanitize_list(positions_list)
-
-	neuron_positions = {}
-	for i in range(len(particles_list)):
-		neuron = particles_list[i]
-		if neuron.in_unity:
-			pos = utils.sanitize_vector3(positions_list[i])
-			neuron_positions[neuron.id] = [pos[0]/1000, pos[1]/1000, pos[2]/1000]
-		else:
-			warnings.warn(f"Particle with id {neuron.id} does not exist in Unity, call create method first.")
-	client.sio.emit('SetParticlePos', neuron_positions)
+	_set_grouped(particles_list, positions_list, ParticleGroup.set_positions)
 
 def set_sizes(particles_list, sizes_list):
 	"""Set particles sizes
 
 	Parameters
 	----------
-	particles_list : list of Particle
-	sizes_list : list of float
+	particles_list : list of Particle, or ParticleGroup
+	sizes_list : list of float, (N,) array, or a single float
 
 	Examples
 	--------
 	>>> urchin.particles.set_sizes([p1,n2,n3], [0.01,0.02,0.03])
 	"""
-	particles_list = utils.sanitize_list(particles_list)
-	sizes_list = utils.sanitize_list(sizes_list)
-
-	neurons_sizes = {}
-	for i in range(len(particles_list)):
-		neuron = particles_list[i]
-		if neuron.in_unity:
-			neurons_sizes[neuron.id] = utils.sanitize_float(sizes_list[i])
-		else:
-			warnings.warn(f"Particle with id {neuron.id} does not exist in Unity, call create method first.")
-	client.sio.emit('SetParticleSize', neurons_sizes)
+	if not isinstance(particles_list, ParticleGroup) and np.ndim(sizes_list) == 0:
+		sizes_list = [sizes_list] * len(particles_list)
+	_set_grouped(particles_list, sizes_list, ParticleGroup.set_sizes)
 
 def set_colors(particles_list, colors_list):
 	"""Set neuron colors
 
 	Parameters
 	----------
-	particles_list : list of Particle
+	particles_list : list of Particle, or ParticleGroup
 	colors_list : list of string hex colors
 		list of colors of neurons
 
@@ -206,17 +382,9 @@ def set_colors(particles_list, colors_list):
 	--------
 	>>> urchin.particles.set_colors([p1,n2,n3], ['#FFFFFF','#000000','#FF0000'])
 	"""
-	particles_list = utils.sanitize_list(particles_list)
-	colors_list = utils.sanitize_list(colors_list)
-
-	neurons_colors = {}
-	for i in range(len(particles_list)):
-		neuron = particles_list[i]
-		if neuron.in_unity:
-			neurons_colors[neuron.id] = utils.sanitize_color(colors_list[i])
-		else:
-			warnings.warn(f"Particle with id {neuron.id} does not exist in Unity, call create method first.")
-	client.sio.emit('SetParticleColor', neurons_colors)
+	if not isinstance(particles_list, ParticleGroup) and isinstance(colors_list, str):
+		colors_list = [colors_list] * len(particles_list)
+	_set_grouped(particles_list, colors_list, ParticleGroup.set_colors)
 
 def set_material(material_name):
 	"""Change the material used to render neurons
@@ -240,5 +408,5 @@ def set_material(material_name):
 	"""
 	material_name = utils.sanitize_string(material_name)
 
-	client.sio.emit('SetParticleMaterial', material_name)
+	client.emit('SetParticleMaterial', material_name)
 
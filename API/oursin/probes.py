@@ -12,23 +12,23 @@ class Probe:
 
 		color = utils.sanitize_color(color)
 		self.color = color
-		client.sio.emit('SetProbeColors', {self.id:color})
+		client.emit('SetProbeColors', {self.id:color})
 
 		position = utils.sanitize_vector3(position)
 		self.position = position
-		client.sio.emit('SetProbePos', {self.id:position})
+		client.emit('SetProbePos', {self.id:position})
 
 		angle = utils.sanitize_vector3(angle)
 		self.angle = angle
-		client.sio.emit('SetProbeAngles', {self.id:angle})
+		client.emit('SetProbeAngles', {self.id:angle})
 		
 		style = utils.sanitize_string(style)
 		self.style = style
-		#client.sio.emit('SetProbeStyle', {self.id:style})
+		#client.emit('SetProbeStyle', {self.id:style})
 
 		scale = utils.sanitize_vector3(scale)
 		self.scale = scale
-		client.sio.emit('SetProbeSize', {self.id:scale})
+		client.emit('SetProbeSize', {self.id:scale})
 
 	def create(self):
 		"""Create probe objects
@@ -44,7 +44,7 @@ class Probe:
 		global counter
 		counter +=1
 		self.id = 'p' + str(counter)
-		client.sio.emit('CreateProbes', [self.id])
+		client.emit('CreateProbes', [self.id])
 		self.in_unity = True
 
 	def delete(self):
@@ -58,7 +58,7 @@ class Probe:
 		--------
 		>>> p1.delete()
 		"""
-		client.sio.emit('DeleteProbes', [self.id])
+		client.emit('DeleteProbes', [self.id])
 		self.in_unity = False
 
 	def set_color(self,color):
@@ -78,7 +78,7 @@ class Probe:
 		
 		color = utils.sanitize_color(color)
 		self.color
-		client.sio.emit('SetProbeColors', {self.id:color})
+		client.emit('SetProbeColors', {self.id:color})
 
 	def set_position(self, probe_positions):
 		"""Set probe tip position in AP/ML/DV coordinates in um relative to the zero coordinate (front, top, left)
@@ -96,7 +96,7 @@ class Probe:
 			raise Exception("Object does not exist in Unity, call create method first.")
 		
 		self.position = utils.sanitize_vector3(probe_positions)
-		client.sio.emit('SetProbePos', {self.id:[self.position[0]/1000, self.position[1]/1000, self.position[2]/1000]})
+		client.emit('SetProbePos', {self.id:[self.position[0]/1000, self.position[1]/1000, self.position[2]/1000]})
 
 	def set_angle(self, probe_angles):
 		"""Set probe azimuth/elevation/spin angles in degrees
@@ -117,7 +117,7 @@ class Probe:
 			raise Exception("Object does not exist in Unity, call create method first.")
 		probe_angles = utils.sanitize_vector3(probe_angles)
 		self.angle = probe_angles
-		client.sio.emit('SetProbeAngles', {self.id:probe_angles})
+		client.emit('SetProbeAngles', {self.id:probe_angles})
 
 	# def set_probe_style(self,probe_data):
 	# 	"""Set probe rendering style
@@ -136,7 +136,7 @@ class Probe:
 		
 	# 	probe_data = utils.sanitize_string(probe_data)
 	# 	self.style = probe_data
-	# 	client.sio.emit('SetProbeStyle', {self.id:probe_data})
+	# 	client.emit('SetProbeStyle', {self.id:probe_data})
 
 	def set_scale(self, probe_scale):
 		"""Set probe scale in mm units, by default probes are scaled to 70 um wide x 20 um deep x 3840 um tall which is the size of a NP 1.0 probe.
@@ -154,7 +154,7 @@ class Probe:
 			raise Exception("Object does not exist in Unity, call create method first.")
 		probe_scale = utils.sanitize_vector3(probe_scale)
 		self.scale = probe_scale
-		client.sio.emit('SetProbeSize', {self.id:probe_scale})
+		client.emit('SetProbeSize', {self.id:probe_scale})
 
 	
 def create(num_objects):
@@ -188,7 +188,7 @@ def delete(probes_list):
 	"""
 	probes_list = utils.sanitize_list(probes_list)
 	probe_ids = [x.id for x in probes_list]
-	client.sio.emit('DeleteProbes', probe_ids)
+	client.emit('DeleteProbes', probe_ids)
 
 def set_colors(probes_list, colors_list):
 	"""Set colors of probe objects
@@ -214,7 +214,7 @@ def set_colors(probes_list, colors_list):
 			probe_colors[probe.id] = utils.sanitize_color(colors_list[i])
 		else:
 			warnings.warn(f"Object with id {probe.id} does not exist in Unity, Please create object {probe.id}.")
-	client.sio.emit('SetProbeColors', probe_colors)
+	client.emit('SetProbeColors', probe_colors)
 
 def set_positions(probes_list, positions_list):
 	"""Set probe tip positions in AP/ML/DV coordinates in um relative to the zero point (front, left, top)
@@ -241,7 +241,7 @@ def set_positions(probes_list, positions_list):
 		else:
 			warnings.warn(f"Object with id {probe.id} does not exist. Please create object {probe.id}.")
 
-	client.sio.emit('SetProbePos', probe_pos)
+	client.emit('SetProbePos', probe_pos)
 
 def set_angles(probes_list, angles_list):
 	"""Set probe azimuth/elevation/spin angles in degrees
@@ -271,7 +271,7 @@ def set_angles(probes_list, angles_list):
 		else:
 			warnings.warn(f"Object with id {probe.id} does not exist. Please create object {probe.id}.")
 
-	client.sio.emit('SetProbeAngles', probe_angle)
+	client.emit('SetProbeAngles', probe_angle)
 
 # def set_probe_styles(probes_list,styles_list):
 # 	"""Set probe rendering style
@@ -303,7 +303,7 @@ def set_angles(probes_list, angles_list):
 # 			probe_styles[probe.id] = utils.sanitize_string(styles_list[i])
 # 		else:
 # 			warnings.warn(f"Object with id {probe.id} does not exist in Unity, Please create object {probe.id}.")
-# 	client.sio.emit('SetProbeStyle', probe_styles)
+# 	client.emit('SetProbeStyle', probe_styles)
 
 def set_scales(probes_list, scales_list):
 	"""Set probe scale in mm units, by default probes are scaled to 70 um wide x 20 um deep x 3840 um tall which is the size of a NP 1.0 probe.
@@ -330,4 +330,4 @@ def set_scales(probes_list, scales_list):
 		else:
 			warnings.warn(f"Object with id {probe.id} does not exist. Please create object {probe.id}.")
 
-	client.sio.emit('SetProbeSize', probe_scale)
\ No newline at end of file
+	client.emit('SetProbeSize', probe_scale)
\ No newline at end of file
@@ -33,23 +33,63 @@ def setup(localhost = False, standalone = False, verbose = True):
 		
 	log_messages = verbose
 
+	if not isinstance(client.transport, client.SocketIOTransport):
+		client.use_transport(client.SocketIOTransport())
+	client.transport.connect(_server_url(localhost))
+
+	if not standalone:
+		_open_viewer()
+
+async def setup_async(localhost = False, standalone = False, verbose = True, max_pending = 1000):
+	"""Connect with the asyncio socket.io client, must be awaited
+
+	All the API modules work unchanged, emits are scheduled on the running event loop and
+	renderer callbacks (e.g. screenshots) are delivered on it. Use `await urchin.client.drain()`
+	to wait for queued emits. Requires `pip install oursin[async]`.
+
+	Parameters
+	----------
+	localhost : bool, optional
+		connect to a local development server rather than the remote server, by default False
+	standalone : bool, optional
+		connect to a standalone Desktop build rather than the web-based Brain Viewer, by default False
+	max_pending : int, optional
+		emits queued before emit_async() applies backpressure, by default 1000
+
+	Examples
+	--------
+	>>> await urchin.setup_async()
+	>>> urchin.ccf25.load()
+	>>> await urchin.client.drain()
+	"""
+	if client.connected():
+		print(f'(urchin) Client is already connected. Use ID: {client.ID}')
+		return
+
+	client.use_transport(client.AsyncSocketIOTransport(max_pending))
+	await client.transport.connect(_server_url(localhost))
+
+	if not standalone:
+		_open_viewer()
+
+def _server_url(localhost):
 	if localhost:
-		client.sio.connect('http://localhost:5000')
+		return 'http://localhost:5000'
 	else:
-		client.sio.connect('https://urchin-commserver.herokuapp.com/')
+		return 'https://urchin-commserver.herokuapp.com/'
 
-	if not standalone:
-		#To open browser window:
-		url = f'https://data.virtualbrainlab.org/Urchin/?ID={client.ID}'
-		if not is_running_in_colab():
-			webbrowser.open(url)
-		else:
-			# Specify window features
-			window_features = "width=1200,height=800,toolbar=no,location=no,directories=no,status=no,menubar=no,scrollbars=yes,resizable=yes"
-			# Use the window.open function with window features
-			javascript_code = f'window.open("{url}", "_blank", "{window_features}");'
-			# Display the JavaScript code to open the new window
-			display(Javascript(javascript_code))
+def _open_viewer():
+	#To open browser window:
+	url = f'https://data.virtualbrainlab.org/Urchin/?ID={client.ID}'
+	if not is_running_in_colab():
+		webbrowser.open(url)
+	else:
+		# Specify window features
+		window_features = "width=1200,height=800,toolbar=no,location=no,directories=no,status=no,menubar=no,scrollbars=yes,resizable=yes"
+		# Use the window.open function with window features
+		javascript_code = f'window.open("{url}", "_blank", "{window_features}");'
+		# Display the JavaScript code to open the new window
+		display(Javascript(javascript_code))
 
 ######################
 # CLEAR #
@@ -58,24 +98,24 @@ def setup(localhost = False, standalone = False, verbose = True):
 def clear():
 	"""Clear the renderer scene of all objects
 	"""
-	client.sio.emit('Clear', 'all')
+	client.emit('Clear', 'all')
 
 def clear_probes():
 	"""Clear all probe objects
 	"""
-	client.sio.emit('Clear', 'probe')
+	client.emit('Clear', 'probe')
 
 def clear_volumes():
 	"""Clear all 3D volumes
 	"""
-	client.sio.emit('Clear', 'volume')
+	client.emit('Clear', 'volume')
 
 def clear_texts():
 	"""Clear all text
 	"""
-	client.sio.emit('Clear', 'text')
+	client.emit('Clear', 'text')
 
 def clear_meshes():
 	"""Clear all primitives
 	"""
-	client.sio.emit('Clear','mesh')
\ No newline at end of file
+	client.emit('Clear','mesh')
\ No newline at end of file
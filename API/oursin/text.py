@@ -17,11 +17,11 @@ class Text:
 
     color = utils.sanitize_color(color)
     self.color = color
-    client.sio.emit('SetTextColors',{self.id: color})
+    client.emit('SetTextColors',{self.id: color})
 
     position = utils.sanitize_list(position)
     self.position = position
-    client.sio.emit('SetTextPositions',{self.id: position})
+    client.emit('SetTextPositions',{self.id: position})
 
 
   def create(self):
@@ -38,7 +38,7 @@ class Text:
     global counter
     counter +=1
     self.id = 't' + str(counter)
-    client.sio.emit('CreateText',[self.id])
+    client.emit('CreateText',[self.id])
     self.in_unity = True
   
   def delete(self):
@@ -52,7 +52,7 @@ class Text:
     --------
     >>> t1.delete()
     """
-    client.sio.emit('DeleteText',[self.id])
+    client.emit('DeleteText',[self.id])
     self.in_unity = False
 
   def set_text(self, text_text):
@@ -71,7 +71,7 @@ class Text:
       raise Exception("Object does not exist in Unity, call create method first.")
     text_text = utils.sanitize_string(text_text)
     self.text = text_text
-    client.sio.emit('SetTextText',{self.id: text_text})
+    client.emit('SetTextText',{self.id: text_text})
 
   def set_color(self,text_color):
     """Set the color of a set of text objects
@@ -90,7 +90,7 @@ class Text:
     
     text_color = utils.sanitize_color(text_color)
     self.color = text_color
-    client.sio.emit('SetTextColors',{self.id: text_color})
+    client.emit('SetTextColors',{self.id: text_color})
 
   def set_font_size(self,text_size):
     """Set the font size of a set of text objects
@@ -107,7 +107,7 @@ class Text:
     if self.in_unity == False:
       raise Exception("Object does not exist in Unity, call create method first.")
     self.size = text_size
-    client.sio.emit('SetTextSizes',{self.id: text_size})
+    client.emit('SetTextSizes',{self.id: text_size})
 
   def set_position(self,position):
     """Set the positions of a set of text objects in UI canvas space
@@ -127,7 +127,7 @@ class Text:
     if self.in_unity == False:
       raise Exception("Object does not exist in Unity, call create method first.")
     self.position = utils.sanitize_list(position)
-    client.sio.emit('SetTextPositions',{self.id: self.position})
+    client.emit('SetTextPositions',{self.id: self.position})
 
 
 def create(n):
@@ -160,7 +160,7 @@ def set_texts(text_list, str_list):
   for i, text in enumerate(text_list):
     text_strs[text.id] = str_list[i]
   
-  client.sio.emit('SetTextText',text_strs)
+  client.emit('SetTextText',text_strs)
 
 def set_positions(text_list, pos_list):
   """Set the positions of multiple text objects
@@ -181,7 +181,7 @@ def set_positions(text_list, pos_list):
   for i, text in enumerate(text_list):
     text_poss[text.id] = pos_list[i]
   
-  client.sio.emit('SetTextPositions',text_poss)
+  client.emit('SetTextPositions',text_poss)
 
 def set_font_sizes(text_list, font_size_list):
   """_summary_
@@ -200,7 +200,7 @@ def set_font_sizes(text_list, font_size_list):
   for i, text in enumerate(text_list):
     text_font_sizes[text.id] = font_size_list[i]
   
-  client.sio.emit('SetTextSizes',text_font_sizes)
+  client.emit('SetTextSizes',text_font_sizes)
 
 def set_colors(text_list, color_list):
   """_summary_
@@ -219,4 +219,4 @@ def set_colors(text_list, color_list):
   for i, text in enumerate(text_list):
     text_colors[text.id] = color_list[i]
   
-  client.sio.emit('SetTextColors',text_colors)
\ No newline at end of file
+  client.emit('SetTextColors',text_colors)
\ No newline at end of file
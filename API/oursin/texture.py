@@ -2,8 +2,10 @@
 from . import client
 import warnings
 from . import utils
+from . import cache
 from PIL import Image
 from typing import List
+import numpy as np
 import io
 
 receive_fname = ''
@@ -34,7 +36,7 @@ class Texture:
         global counter
         counter += 1
         self.id = 'tex' + str(counter)
-        client.sio.emit('CreateFOV',[self.id])
+        client.emit('CreateFOV',[self.id])
         self.in_unity = True
 
     def delete(self):
@@ -47,7 +49,7 @@ class Texture:
         Examples
         >>> tex.delete()
         """
-        client.sio.emit('DeleteFOV',[self.id])
+        client.emit('DeleteFOV',[self.id])
         self.in_unity = False
 
     def set_position(self,positions):
@@ -72,7 +74,7 @@ class Texture:
             positions[i] = utils.sanitize_vector3(pos)
 
         self.position = utils.sanitize_list(positions)
-        client.sio.emit('SetFOVPos',{self.id: positions})
+        client.emit('SetFOVPos',{self.id: positions})
     
     def set_image(self, array):
         """Set the image data for texture
@@ -80,7 +82,8 @@ class Texture:
         Parameters
         ----------
         array : numpy array
-            luminance data for texture
+            luminance data for texture, can be a np.memmap, zarr array, HDF5 dataset or any
+            array-like, it is read in CHUNK_SIZE pieces and never modified
 
         Examples
         --------
@@ -89,24 +92,28 @@ class Texture:
         if self.in_unity == False:
             raise Exception("Texture does not exist in Unity, call create method first.")
 
-        # texture_file = utils.sanitize_string(texture_file)
-        # self.texture_file=texture_file
-
-        # img = Image.open(texture_file)
-        # Convert img to bytes
-        img_bytes = array.tobytes()
-        # img_bytes.seek(0)
-        # Split bytes into chunks
-        chunks = [img_bytes]
-            
-        client.sio.emit('SetFOVTextureDataMetaInit', [self.id, len(chunks), array.shape[0], array.shape[1], 'array'])
-
-        # Send img by chunk
-        # [TODO: Replace with a data structure]
-        for i,chunk in enumerate(chunks):
-            immediate_apply = True if i==len(chunks)-1 else False
-            client.sio.emit('SetFOVTextureDataMeta', [self.id,i,immediate_apply])
-            client.sio.emit('SetFOVTextureData',chunk)
+        array = utils.sanitize_array_like(array)
+        slices = list(utils.slab_slices(array.shape, array.dtype.itemsize, CHUNK_SIZE))
+
+        def chunks():
+            for chunk_slice in slices:
+                yield np.ascontiguousarray(array[chunk_slice]).tobytes()
+
+        # The hash and the cache flag are appended to the MetaInit list, when the renderer has the
+        # image cached no chunks follow
+        content_hash = cache.stream_hash(chunks(), meta = f'texture{array.dtype.str}{tuple(array.shape)}')
+        cached = cache.query(content_hash)
+
+        client.emit('SetFOVTextureDataMetaInit', [self.id, len(slices), array.shape[0], array.shape[1], 'array', content_hash, cached])
+        if cached:
+            return
+
+        # Send the raw image bytes by chunks of at most CHUNK_SIZE, each preceded by its meta
+        for i, chunk in enumerate(chunks()):
+            immediate_apply = i == len(slices) - 1
+            client.emit('SetFOVTextureDataMeta', [self.id, i, immediate_apply])
+            client.emit('SetFOVTextureData', chunk)
+        cache.add(content_hash, array.dtype.itemsize * int(np.prod(array.shape)))
 
     def set_offset(self, offset):
         """Set the vertical offset for this texture
@@ -116,7 +123,7 @@ class Texture:
         offset : float
             Vertical offset in mm
         """
-        client.sio.emit('SetFOVOffset', {self.id: offset})
+        client.emit('SetFOVOffset', {self.id: offset})
 
 
 def create(N):
@@ -157,7 +164,7 @@ def delete(textures_list):
             warnings.warn(f"fov with id {tex.id} does not exist in Unity, call create method first.")
 
     fovs_ids = [x.id for x in textures_list]
-    client.sio.emit('DeleteFOVs', fovs_ids)
+    client.emit('DeleteFOVs', fovs_ids)
 
 def set_positions(textures_list, positions_list):
     """Set the positions of textures in ap/ml/dv coordinates relative to the CCF (0,0,0) point
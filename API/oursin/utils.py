@@ -43,6 +43,209 @@ def sanitize_vector3(vector):
     return vector_list
 
 
+def sanitize_vector3_array(vectors, n=None, dtype=np.float32):
+    """Guarantee that an input is an (N, 3) float32 array, or raise an exception
+
+    Vectorized equivalent of sanitize_vector3, a single vector3 is broadcast to n rows
+
+    Parameters
+    ----------
+    vectors : array-like
+        (N, 3) array or list of vector3, or a single vector3
+    n : int, optional
+        expected number of rows, by default None
+    dtype : numpy dtype, optional
+        by default float32, use float64 to keep the input precision
+
+    Returns
+    -------
+    np.ndarray
+        (N, 3) array
+
+    Raises
+    ------
+    ValueError
+        Failed to coerce input to an (N, 3) array
+    """
+    try:
+        vectors = np.asarray(vectors, dtype=dtype)
+    except (TypeError, ValueError):
+        raise ValueError("Input vectors must be convertible to an array of floats.")
+
+    if vectors.shape == (3,) and n is not None:
+        vectors = np.broadcast_to(vectors, (n, 3))
+
+    if vectors.ndim != 2 or vectors.shape[1] != 3:
+        raise ValueError("Input vectors must have shape (N, 3).")
+
+    if n is not None and vectors.shape[0] != n:
+        raise ValueError(f"Expected {n} vectors, got {vectors.shape[0]}.")
+
+    return vectors
+
+def sanitize_float_array(values, n=None):
+    """Guarantee that an input is a length N float32 array, or raise an exception
+
+    Parameters
+    ----------
+    values : array-like
+        list of floats, or a single float to broadcast to n values
+    n : int, optional
+        expected number of values, by default None
+
+    Returns
+    -------
+    np.ndarray
+        (N,) float32 array
+    """
+    try:
+        values = np.asarray(values, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValueError("Input values must be convertible to an array of floats.")
+
+    if values.ndim == 0 and n is not None:
+        values = np.broadcast_to(values, (n,))
+
+    if values.ndim != 1:
+        raise ValueError("Input values must be one-dimensional.")
+
+    if n is not None and values.shape[0] != n:
+        raise ValueError(f"Expected {n} values, got {values.shape[0]}.")
+
+    return values
+
+def hex_to_rgba(hex_color):
+    """Convert a hex color string to an RGBA tuple
+
+    Parameters
+    ----------
+    hex_color : string
+        '#RRGGBB' or '#RRGGBBAA'
+
+    Returns
+    -------
+    tuple of int
+        (r, g, b, a) in 0->255
+    """
+    value = hex_color.lstrip('#')
+    if len(value) == 6:
+        value += 'ff'
+    if len(value) != 8:
+        raise ValueError(f"Color {hex_color} is not a valid hex color.")
+    try:
+        return tuple(bytes.fromhex(value))
+    except ValueError:
+        raise ValueError(f"Color {hex_color} is not a valid hex color.")
+
+def sanitize_color_array(colors, n=None, dtype=np.uint8):
+    """Guarantee that an input is an (N, 4) RGBA array, or raise an exception
+
+    Accepts hex strings, float RGB/RGBA values in 0->1 or integer RGB/RGBA values in 0->255 (float
+    arrays with values above 1 are also read as 0->255). A single color is broadcast to n rows. Hex
+    strings are only parsed once per unique color.
+
+    Parameters
+    ----------
+    colors : array-like
+        list of hex colors, (N, 3) or (N, 4) array, or a single color
+    n : int, optional
+        expected number of colors, by default None
+    dtype : numpy dtype, optional
+        by default uint8 values in 0->255, a float dtype returns the unquantized values in 0->1
+
+    Returns
+    -------
+    np.ndarray
+        (N, 4) array
+    """
+    as_float = np.dtype(dtype).kind == 'f'
+
+    if isinstance(colors, str):
+        colors = np.array([hex_to_rgba(colors)], dtype=np.uint8)
+        colors = (colors / 255).astype(dtype) if as_float else colors
+        return np.broadcast_to(colors, (1 if n is None else n, 4))
+
+    colors = np.asarray(colors)
+
+    if colors.dtype.kind in ('U', 'S', 'O'):
+        if colors.ndim != 1:
+            raise ValueError("Hex colors must be passed as a flat list of strings.")
+        unique, inverse = np.unique(colors.astype(str), return_inverse=True)
+        table = np.array([hex_to_rgba(c) for c in unique], dtype=np.uint8).reshape(-1, 4)
+        colors = table[inverse]
+        if as_float:
+            colors = (colors / 255).astype(dtype)
+    else:
+        if colors.ndim == 1 and n is not None:
+            colors = np.broadcast_to(colors, (n, colors.shape[0]))
+        if colors.ndim != 2 or colors.shape[1] not in (3, 4):
+            raise ValueError("Input colors must have shape (N, 3) or (N, 4).")
+
+        # integer (or float > 1) values are 0->255
+        full_range = colors.dtype.kind in ('i', 'u') or (colors.size > 0 and colors.max() > 1)
+        if as_float:
+            colors = colors.astype(dtype)
+            colors = np.clip(colors / 255 if full_range else colors, 0, 1)
+        elif full_range:
+            colors = np.clip(np.round(colors.astype(np.float32)), 0, 255).astype(np.uint8)
+        else:
+            colors = np.clip(np.round(colors.astype(np.float32) * 255), 0, 255).astype(np.uint8)
+
+        if colors.shape[1] == 3:
+            alpha = np.full((colors.shape[0], 1), 1 if as_float else 255, dtype=colors.dtype)
+            colors = np.concatenate((colors, alpha), axis=1)
+
+    if n is not None and colors.shape[0] != n:
+        raise ValueError(f"Expected {n} colors, got {colors.shape[0]}.")
+
+    return colors
+
+def sanitize_array_like(data, ndim=None):
+    """Accept an in-memory or lazy array without copying it
+
+    Objects that expose shape, dtype and slicing (np.memmap, zarr arrays, h5py datasets) are returned
+    as is so that they can be read slab by slab, anything else is converted with np.asarray.
+
+    Parameters
+    ----------
+    data : array-like
+    ndim : int, optional
+        required number of dimensions
+
+    Returns
+    -------
+    array-like
+    """
+    if not (hasattr(data, 'shape') and hasattr(data, 'dtype') and hasattr(data, '__getitem__')):
+        data = np.asarray(data)
+
+    if ndim is not None and len(data.shape) != ndim:
+        raise Exception(f"Expected a {ndim}D array, got shape {tuple(data.shape)}")
+    return data
+
+def slab_slices(shape, itemsize, slab_bytes=64000000, multiple=1):
+    """Iterate over slices along the first axis holding at most ~slab_bytes each
+
+    Parameters
+    ----------
+    shape : tuple of int
+    itemsize : int
+        bytes per element
+    slab_bytes : int, optional
+        by default 64MB
+    multiple : int, optional
+        slab thickness is rounded down to a multiple of this, by default 1
+
+    Returns
+    -------
+    generator of slice
+    """
+    row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * itemsize
+    step = max(1, int(slab_bytes // max(row_bytes, 1)))
+    step = max(multiple, step - step % multiple)
+    for start in range(0, shape[0], step):
+        yield slice(start, min(start + step, shape[0]))
+
 def sanitize_color(color):
     """Does nothing right now
 
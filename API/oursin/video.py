@@ -0,0 +1,142 @@
+"""Video encoders for camera captures"""
+
+import shutil
+import subprocess
+
+import numpy as np
+
+# ffmpeg output options for each codec
+FFMPEG_CODECS = {
+	'h264': ['-c:v', 'libx264', '-pix_fmt', 'yuv420p'],
+	'h265': ['-c:v', 'libx265', '-pix_fmt', 'yuv420p'],
+	'prores': ['-c:v', 'prores_ks', '-profile:v', '3', '-pix_fmt', 'yuv422p10le'],
+}
+
+class FFmpegWriter:
+	"""Stream raw RGB frames into an ffmpeg subprocess
+
+	Frames are written straight from their array buffer into ffmpeg's stdin, ffmpeg does the
+	color conversion and encoding on its own threads.
+	"""
+	def __init__(self, file_name, frame_rate, size, codec = 'h264', crf = 18, threads = 0, ffmpeg = None):
+		"""Start the encoder
+
+		Parameters
+		----------
+		file_name : string
+			output file, relative to local path
+		frame_rate : int
+		size : list of int
+			width/height of the frames
+		codec : str, optional
+			'h264', 'h265' or 'prores', by default 'h264'
+		crf : int, optional
+			constant rate factor (quality) for h264/h265, lower is better, by default 18
+		threads : int, optional
+			encoder threads, by default 0 (let ffmpeg decide)
+		ffmpeg : string, optional
+			path to the ffmpeg executable, by default the one found on the PATH
+		"""
+		ffmpeg = ffmpeg or shutil.which('ffmpeg')
+		if ffmpeg is None:
+			raise Exception('Please install ffmpeg (https://ffmpeg.org/download.html) and add it to your PATH to use the ffmpeg video backend')
+
+		if codec not in FFMPEG_CODECS:
+			raise Exception(f'Codec {codec} is not supported, options are {list(FFMPEG_CODECS.keys())}')
+
+		self.size = (int(size[0]), int(size[1]))
+
+		command = [ffmpeg, '-y', '-loglevel', 'error',
+			 '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+			 '-s', f'{self.size[0]}x{self.size[1]}', '-r', str(frame_rate),
+			 '-i', '-']
+		command += FFMPEG_CODECS[codec]
+		if codec != 'prores':
+			command += ['-crf', str(crf)]
+		command += ['-threads', str(threads), file_name]
+
+		self.process = subprocess.Popen(command, stdin = subprocess.PIPE)
+
+	def write(self, frame):
+		"""Write one frame
+
+		Parameters
+		----------
+		frame : np.ndarray
+			(height, width, 3) uint8 RGB frame
+		"""
+		if frame.shape != (self.size[1], self.size[0], 3) or frame.dtype != np.uint8:
+			raise Exception(f'(urchin.video) Expected a {self.size[1]}x{self.size[0]}x3 uint8 frame, got {frame.shape} {frame.dtype}')
+
+		self.process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+
+	def release(self):
+		"""Finish encoding and wait for ffmpeg to exit
+		"""
+		self.process.stdin.close()
+		if self.process.wait() != 0:
+			raise Exception(f'(urchin.video) ffmpeg exited with code {self.process.returncode}')
+
+class OpenCVWriter:
+	"""Write frames with OpenCV's VideoWriter (mp4v codec)
+	"""
+	def __init__(self, file_name, frame_rate, size):
+		try:
+			import cv2
+		except:
+			raise Exception('Please install cv2 by running `pip install opencv-python` in your terminal to use the Video features')
+
+		self.cv2 = cv2
+		fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+		self.out = cv2.VideoWriter(file_name, fourcc, frame_rate, tuple(size))
+
+	def write(self, frame):
+		"""Write one (height, width, 3) uint8 RGB frame
+		"""
+		self.out.write(self.cv2.cvtColor(frame, self.cv2.COLOR_RGB2BGR))
+
+	def release(self):
+		self.out.release()
+
+def abort(writer):
+	"""Release a writer after a failed capture
+
+	Errors from release() (e.g. ffmpeg exiting with an error after a broken pipe) are printed
+	instead of raised, so that they don't replace the error that stopped the capture.
+
+	Parameters
+	----------
+	writer : FFmpegWriter or OpenCVWriter
+	"""
+	try:
+		writer.release()
+	except Exception as e:
+		print(f'(urchin.video) Error while releasing the video writer after a failed capture: {e!r}')
+
+def open_writer(file_name, frame_rate, size, backend = 'auto', **kwargs):
+	"""Open a video writer
+
+	Parameters
+	----------
+	file_name : string
+	frame_rate : int
+	size : list of int
+		width/height
+	backend : str, optional
+		'ffmpeg', 'opencv' or 'auto' (ffmpeg when it is on the PATH, otherwise OpenCV), by default 'auto'
+	**kwargs
+		encoder options passed to FFmpegWriter (codec, crf, threads, ffmpeg)
+
+	Returns
+	-------
+	FFmpegWriter or OpenCVWriter
+	"""
+	if backend == 'auto':
+		backend = 'ffmpeg' if (kwargs.get('ffmpeg') or shutil.which('ffmpeg')) else 'opencv'
+
+	if backend == 'ffmpeg':
+		return FFmpegWriter(file_name, frame_rate, size, **kwargs)
+	elif backend == 'opencv':
+		return OpenCVWriter(file_name, frame_rate, size)
+	else:
+		raise Exception(f'Video backend {backend} is not supported, options are ffmpeg/opencv/auto')
@@ -2,14 +2,20 @@
 
 from . import client
 from . import utils
+from . import cache
+from . import camera
 import numpy as np
 import zlib
 import json
 import csv
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 counter = 0
 
 CHUNK_LIMIT = 1000000
+SPARSE_BRICK_SIZE = 16
 
 click_list = []
 verbose = False
@@ -59,87 +65,842 @@ class Volume:
 
 	Volumes should be created in (AP, ML, DV)
 	"""
-	def __init__(self, volume_data, colormap = None):
-		"""_summary_
+	def __init__(self, volume_data, colormap = None, block_size = None, workers = None, sparse = False,
+			  brick_size = SPARSE_BRICK_SIZE):
+		"""Create a volume and upload its data to the renderer
+
+		By default the whole volume is compressed as one zlib stream and sent in CHUNK_LIMIT pieces,
+		the renderer can only decompress once everything has arrived. When block_size is set the
+		volume is split into independent blocks which are compressed in a thread pool and sent as
+		soon as each one is ready, so compression, transmission and decompression overlap.
+
+		The content hash used by the upload cache covers the shape and the upload mode. It is
+		computed on the compressed payload while the volume is compressed, in block mode it takes
+		a separate pass over the volume that is skipped while the cache is disabled.
+
+		For mostly transparent volumes (e.g. annotations) use sparse=True, the volume is split into
+		bricks and only an occupancy bitmap plus the bricks that contain at least one non-255 voxel
+		are sent.
 
 		Parameters
 		----------
-		volume_data : _type_
-			_description_
-		colormap : _type_, optional
-			_description_, by default None
+		volume_data : uint8 volume
+			3D matrix of uint8 data, see compress_volume, NaN values are mapped to 255. Can be a
+			np.memmap, zarr array, HDF5 dataset or any array-like, it is read slab by slab and never modified
+		colormap : list of string or (256, 4) uint8 array, optional
+			hex colors for each uint8 value or a lookup table from colormap_lut, by default all black
+		block_size : int, optional
+			uncompressed bytes per independently compressed block, by default None (single stream)
+		workers : int, optional
+			compression threads for block mode, by default the number of CPUs
+		sparse : bool, optional
+			only send the non-empty bricks, by default False
+		brick_size : int, optional
+			voxels along each side of a brick in sparse mode, by default 16
+
+		Examples
+		--------
+		>>> vol = urchin.volumes.Volume(data, colormap)
+		>>> vol = urchin.volumes.Volume(data, colormap, block_size=4000000)
+		>>> vol = urchin.volumes.Volume(annotation, colormap, sparse=True)
+		>>> vol = urchin.volumes.Volume(np.load('volume.npy', mmap_mode='r'), colormap, block_size=4000000)
 		"""
 		global counter
 		self.id = f'volume{counter}'
 		counter += 1
 
-		volume_data[np.isnan(volume_data)] = 255
+		volume_data = utils.sanitize_array_like(volume_data, ndim = 3)
 
-		flattened_data = volume_data.flatten().astype(np.uint8).tobytes()
-		compressed_data = zlib.compress(flattened_data)
-
-		self.n_compressed_bytes = len(compressed_data)
+		self.shape = tuple(volume_data.shape)
+		self.n_bytes = int(np.prod(self.shape, dtype=np.int64))
+		self.block_size = block_size
+		self.n_blocks = None if block_size is None else int(np.ceil(self.n_bytes / block_size))
+		self.brick_size = brick_size if sparse else None
+		self.n_occupied = None
+		self._regions = []
 		self.visible = True
-		if colormap is not None:
-			self.colormap = colormap
+		self.colormap = _default_colormap() if colormap is None else sanitize_colormap(colormap)
+
+		if sparse:
+			mode = f'sparse{brick_size}'
+			compressor = zlib.compressobj()
+			occupancy = []
+			compressed_data = []
+			for _, slab in _uint8_slabs(volume_data, multiple = brick_size):
+				slab_occupancy, bricks = sparse_bricks(slab, brick_size)
+				occupancy.append(slab_occupancy)
+				compressed_data.append(compressor.compress(bricks))
+			compressed_data.append(compressor.flush())
+			compressed_data = b''.join(compressed_data)
+
+			occupancy = np.concatenate(occupancy)
+			self.n_occupied = int(occupancy.sum())
+			payload = [np.packbits(occupancy.flatten()).tobytes(), compressed_data]
+		elif block_size is None:
+			mode = 'dense'
+			compressor = zlib.compressobj()
+			compressed_data = [compressor.compress(slab) for _, slab in _uint8_slabs(volume_data)]
+			compressed_data.append(compressor.flush())
+			compressed_data = b''.join(compressed_data)
+			payload = [compressed_data]
+		else:
+			mode = f'block{block_size}'
+			# blocks are sent as soon as they are compressed, so the hash needs its own pass over the
+			# volume, only made while the cache is enabled
+			payload = (slab for _, slab in _uint8_slabs(volume_data)) if cache.enabled else None
+
+		self.hash = None if payload is None else cache.stream_hash(payload, meta = f'volume|u1|{self.shape}|{mode}')
+		self.cached = self.hash is not None and cache.query(self.hash)
+		if self.cached:
+			# the renderer already holds this data, only send the metadata
+			self.n_compressed_bytes = None
+			self.update()
+			print('Data found in the renderer cache, skipping upload')
+			return
+
+		if sparse:
+			self.n_compressed_bytes = len(compressed_data)
+			self.update()
+			self._send_occupancy(occupancy)
+			self._send_stream(compressed_data)
+		elif block_size is None:
+			self.n_compressed_bytes = len(compressed_data)
+			self.update()
+			self._send_stream(compressed_data)
 		else:
-			self.colormap = ['#000000'] * 255
+			self.n_compressed_bytes = None
+			self.update()
+			self.n_compressed_bytes = self._send_blocks(volume_data, workers)
 
-		self.update()
+		if self.hash is not None:
+			cache.add(self.hash, self.n_bytes)
 
+	def _send_stream(self, compressed_data):
+		"""Internal helper, send a single compressed stream in CHUNK_LIMIT pieces
+		"""
 		# send data packets
 		# split data into chunks
 		n_chunks = int(np.ceil(self.n_compressed_bytes / CHUNK_LIMIT))
 		print(f'Data fits in {n_chunks} chunks of 1MB or less')
+		compressed_view = memoryview(compressed_data)
 		offset = 0
 		for chunk in range(n_chunks):
 			# get the data
-			chunk_size = np.min((self.n_compressed_bytes - offset, CHUNK_LIMIT))
+			chunk_size = min(self.n_compressed_bytes - offset, CHUNK_LIMIT)
 
 			chunk_data = {}
 			chunk_data['name'] = self.id
 			chunk_data['offset'] = int(offset)
-			chunk_data['compressedByteChunk'] = list(compressed_data[offset : offset + chunk_size])
-			client.sio.emit('SetVolumeData', json.dumps(chunk_data))
+			client.emit_binary('SetVolumeData', chunk_data, compressed_view[offset : offset + chunk_size])
 
 			offset += chunk_size
 
+	def _send_occupancy(self, occupancy):
+		"""Internal helper, send the brick occupancy bitmap of a sparse volume
+
+		The bitmap covers the brick grid in C order, packed 8 bricks per byte (most significant bit first).
+		"""
+		occupancy_data = {}
+		occupancy_data['name'] = self.id
+		occupancy_data['gridShape'] = list(occupancy.shape)
+		client.emit_binary('SetVolumeOccupancy', occupancy_data, np.packbits(occupancy.flatten()).tobytes())
+
+	def _send_blocks(self, volume_data, workers = None):
+		"""Internal helper, compress independent blocks in a thread pool and send each one when ready
+
+		Each SetVolumeBlock message holds one complete zlib stream and the offset/length of the
+		uncompressed bytes it covers, blocks can arrive in any order. Blocks are read slab by slab
+		and at most two blocks per worker are held in memory.
+
+		Returns
+		-------
+		int
+			total compressed bytes
+		"""
+		n_compressed_bytes = 0
+		max_pending = 2 * (workers or os.cpu_count() or 1)
+
+		def send(future):
+			index, offset, n_bytes = futures.pop(future)
+			compressed_block = future.result()
+
+			block_data = {}
+			block_data['name'] = self.id
+			block_data['index'] = index
+			block_data['offset'] = offset
+			block_data['nBytes'] = n_bytes
+			client.emit_binary('SetVolumeBlock', block_data, compressed_block)
+			return len(compressed_block)
+
+		with ThreadPoolExecutor(max_workers = workers) as pool:
+			futures = {}
+			for index, block in enumerate(_blocks(volume_data, self.block_size)):
+				futures[pool.submit(zlib.compress, block)] = (index, index * self.block_size, len(block))
+
+				if len(futures) >= max_pending:
+					done, _ = wait(futures, return_when = FIRST_COMPLETED)
+					n_compressed_bytes += sum(send(future) for future in done)
+
+			for future in as_completed(list(futures)):
+				n_compressed_bytes += send(future)
+
+		print(f'Data sent in {self.n_blocks} independently compressed blocks')
+		return n_compressed_bytes
+
+	def update_region(self, slices, data):
+		"""Replace a sub-block of the volume
+
+		Only the changed region is compressed and sent, with its offset and shape. Inside
+		`urchin.batch()` all region updates of this volume are sent as one transfer, a region that
+		covers an earlier queued region replaces it and a region inside an earlier one is merged into it.
+
+		Parameters
+		----------
+		slices : tuple of three slices
+			region in (AP, ML, DV) voxels, e.g. np.s_[10:20, 0:5, 30:40]
+		data : uint8 array
+			new values with the shape of the region, NaN values are mapped to 255
+
+		Examples
+		--------
+		>>> vol.update_region(np.s_[100:120, 50:60, 80:90], roi)
+		"""
+		if len(slices) != 3:
+			raise Exception('(urchin.volumes) update_region expects one slice per axis')
+
+		start = []
+		stop = []
+		for sl, size in zip(slices, self.shape):
+			first, last, step = sl.indices(size)
+			if step != 1:
+				raise Exception('(urchin.volumes) update_region does not support strided slices')
+			start.append(first)
+			stop.append(max(first, last))
+		start = np.array(start)
+		stop = np.array(stop)
+
+		data = np.asarray(data)
+		if data.shape != tuple(stop - start):
+			raise Exception(f'(urchin.volumes) Region data has shape {data.shape}, expected {tuple(stop - start)}')
+		if np.issubdtype(data.dtype, np.floating):
+			data = np.where(np.isnan(data), 255, data)
+		data = data.astype(np.uint8)
+
+		# the renderer modifies its copy in place, it can't be re-used for the original content anymore
+		cache.uploaded.remove(self.hash)
+
+		if not client.queued('SetVolumeRegions', self.id):
+			self._regions = []
+
+		# drop the queued regions that the new one covers
+		regions = [region for region in self._regions
+			 if not (np.all(start <= region[0]) and np.all(region[1] <= stop))]
+
+		# merge into the latest region that contains the new one, unless a later region overlaps it
+		for region in reversed(regions):
+			region_start, region_stop, region_data, _ = region
+			if np.all(region_start <= start) and np.all(stop <= region_stop):
+				region_data[tuple(slice(a, b) for a, b in zip(start - region_start, stop - region_start))] = data
+				region[3] = zlib.compress(region_data)
+				break
+			if np.all(region_start < stop) and np.all(start < region_stop):
+				regions.append([start, stop, data.copy(), zlib.compress(data)])
+				break
+		else:
+			regions.append([start, stop, data.copy(), zlib.compress(data)])
+		self._regions = regions
+
+		region_data = {}
+		region_data['name'] = self.id
+		region_data['regions'] = [{'offset': region[0].tolist(), 'shape': (region[1] - region[0]).tolist()} for region in regions]
+		client.emit_binary('SetVolumeRegions', region_data, *[region[3] for region in regions], key=self.id)
+
 	def update(self):
 		data = {}
 		data['name'] = self.id
 		data['nCompressedBytes'] = self.n_compressed_bytes
+		data['hash'] = self.hash
+		data['cached'] = self.cached
+		if self.block_size is not None:
+			data['nBytes'] = self.n_bytes
+			data['nBlocks'] = self.n_blocks
+			data['blockSize'] = self.block_size
+		data['shape'] = list(self.shape)
+		if self.brick_size is not None:
+			data['brickSize'] = self.brick_size
+			data['nOccupied'] = self.n_occupied
 		data['visible'] = self.visible
-		data['colormap'] = self.colormap
 
-		client.sio.emit('UpdateVolume', json.dumps(data))
+		client.emit('UpdateVolume', json.dumps(data), key=self.id)
+		_send_colormap(self.id, self.colormap)
+
+	def set_colormap(self, colormap):
+		"""Replace the colormap, only the 1KB lookup table is sent
+
+		Parameters
+		----------
+		colormap : list of string or (256, 4) uint8 array
+			see colormap_lut
+		"""
+		self.colormap = sanitize_colormap(colormap)
+		_send_colormap(self.id, self.colormap)
 
 	def delete(self):
-		client.sio.emit('DeleteVolume', self.id)
+		client.emit('DeleteVolume', self.id)
+
+def sparse_bricks(volume_data, brick_size = SPARSE_BRICK_SIZE):
+	"""Split a uint8 volume into bricks and keep only the bricks with at least one non-255 voxel
+
+	The volume is padded with 255 to a multiple of brick_size, so all bricks have the same size.
+
+	Parameters
+	----------
+	volume_data : uint8 volume
+	brick_size : int, optional
+		voxels along each side of a brick, by default 16
+
+	Returns
+	-------
+	(bool grid, bytes)
+		occupancy of each brick and the occupied bricks in C order, each brick flattened in C order
+
+	Examples
+	--------
+	>>> occupancy, bricks = urchin.volumes.sparse_bricks(annotation)
+	>>> print(f'{occupancy.mean():.1%} of the bricks are occupied')
+	"""
+	grid = tuple(int(np.ceil(size / brick_size)) for size in volume_data.shape)
+	padding = [(0, n * brick_size - size) for n, size in zip(grid, volume_data.shape)]
+	if any(pad[1] > 0 for pad in padding):
+		volume_data = np.pad(volume_data, padding, constant_values=255)
+
+	bricks = volume_data.reshape(grid[0], brick_size, grid[1], brick_size, grid[2], brick_size)
+	bricks = bricks.transpose(0, 2, 4, 1, 3, 5)
+
+	occupancy = (bricks != 255).any(axis=(3, 4, 5))
+	return occupancy, bricks[occupancy].tobytes()
+
+def _default_colormap():
+	"""Internal helper, all black with a transparent index 255
+	"""
+	lut = np.zeros((256, 4), dtype=np.uint8)
+	lut[:255, 3] = 255
+	return lut
+
+def _send_colormap(name, lut):
+	"""Internal helper, send a (256, 4) uint8 lookup table as a single 1KB binary attachment
+	"""
+	client.emit_binary('SetVolumeColormap', {'name': name}, lut.tobytes(), key=name)
+
+BRICK_SIZE = 64
+SYNC_BYTES = 2000000
+
+def downsample(volume_data):
+	"""Halve each dimension of a uint8 volume
+
+	Each output voxel is the mean of the non-transparent voxels in its 2x2x2 block, blocks that are
+	fully transparent (255) stay transparent.
+
+	Parameters
+	----------
+	volume_data : uint8 volume
+
+	Returns
+	-------
+	uint8 volume
+	"""
+	shape = tuple((size + 1) // 2 for size in volume_data.shape)
+	total = np.zeros(shape, dtype=np.uint16)
+	count = np.zeros(shape, dtype=np.uint8)
+
+	for dx in (0, 1):
+		for dy in (0, 1):
+			for dz in (0, 1):
+				sub = volume_data[dx::2, dy::2, dz::2]
+				region = tuple(slice(0, size) for size in sub.shape)
+				mask = sub != 255
+				total[region] += np.where(mask, sub, 0).astype(np.uint16)
+				count[region] += mask
+
+	out = np.full(shape, 255, dtype=np.uint8)
+	filled = count > 0
+	out[filled] = np.round(total[filled] / count[filled]).astype(np.uint8)
+	return out
+
+def build_pyramid(volume_data, n_levels = None, brick_size = BRICK_SIZE):
+	"""Build a multi-resolution pyramid, level 0 is the full resolution volume
+
+	The volume is read slab by slab. A uint8 array-like (e.g. np.memmap) is kept as level 0 without
+	a copy, other dtypes are converted to uint8 with NaN mapped to 255. The first downsampled level
+	is built from the same slabs, the coarser ones from the level above.
+
+	Parameters
+	----------
+	volume_data : uint8 volume
+		any array-like, see Volume
+	n_levels : int, optional
+		number of levels, by default halve until the coarsest level fits in a single brick
+	brick_size : int, optional
+
+	Returns
+	-------
+	list of uint8 volumes
+	"""
+	def needs_level(levels):
+		if n_levels is None:
+			return max(levels[-1].shape) > brick_size
+		return len(levels) < n_levels
+
+	volume_data = utils.sanitize_array_like(volume_data, ndim = 3)
+	convert = volume_data.dtype != np.uint8
+	levels = [np.empty(volume_data.shape, dtype=np.uint8) if convert else volume_data]
+
+	if convert or needs_level(levels):
+		half = None
+		if needs_level(levels):
+			half = np.empty(tuple((size + 1) // 2 for size in volume_data.shape), dtype=np.uint8)
+			levels.append(half)
+
+		# even slabs, so that no 2x2x2 block of the downsample crosses two slabs
+		for slab_slice, slab in _uint8_slabs(volume_data, multiple = 2):
+			if convert:
+				levels[0][slab_slice] = slab
+			if half is not None:
+				half[slab_slice.start // 2 : (slab_slice.stop + 1) // 2] = downsample(slab)
+
+	while needs_level(levels):
+		levels.append(downsample(levels[-1]))
+	return levels
+
+def _brick_grid(shape, brick_size):
+	"""Internal helper, list the (index, slices) of the bricks covering a volume
+	"""
+	bricks = []
+	n_bricks = [int(np.ceil(size / brick_size)) for size in shape]
+	for i in range(n_bricks[0]):
+		for j in range(n_bricks[1]):
+			for k in range(n_bricks[2]):
+				index = (i, j, k)
+				slices = tuple(slice(b * brick_size, min((b + 1) * brick_size, size)) for b, size in zip(index, shape))
+				bricks.append((index, slices))
+	return bricks
+
+class BrickedVolume:
+	"""Multi-resolution volume streamed to the renderer as compressed bricks
+
+	A downsampled pyramid is built on the client and each level is split into bricks. The coarse
+	levels are sent immediately so that a first image appears quickly, the finer bricks are streamed
+	from a background thread, nearest to the camera target first.
+
+	Volumes should be created in (AP, ML, DV)
+	"""
+	def __init__(self, volume_data, colormap = None, brick_size = BRICK_SIZE, n_levels = None,
+			  resolution = 25, stream = True):
+		"""Create a bricked volume
+
+		Parameters
+		----------
+		volume_data : uint8 volume
+			3D matrix of uint8 data, see compress_volume, 255 is transparent and NaN values are
+			mapped to 255. A uint8 np.memmap, zarr array or HDF5 dataset is read brick by brick
+		colormap : list of string or (256, 4) uint8 array, optional
+			hex colors for each uint8 value or a lookup table from colormap_lut, by default all black
+		brick_size : int, optional
+			voxels along each side of a brick, by default 64
+		n_levels : int, optional
+			number of pyramid levels, by default until the coarsest level fits in one brick
+		resolution : float, optional
+			um per voxel at full resolution, used to prioritize bricks near the camera target, by default 25
+		stream : bool, optional
+			stream the finer levels from a background thread, by default True. When False call stream() yourself.
+
+		Examples
+		--------
+		>>> vol = urchin.volumes.BrickedVolume(data, colormap, resolution=10)
+		>>> vol.set_focus([5200, 5700, 330]) # stream the bricks around Bregma first
+		"""
+		global counter
+		self.id = f'volume{counter}'
+		counter += 1
+
+		self.brick_size = brick_size
+		self.resolution = resolution
+		self.levels = build_pyramid(volume_data, n_levels, brick_size)
+		self.visible = True
+		self.colormap = _default_colormap() if colormap is None else sanitize_colormap(colormap)
 
-def compress_volume(volume_data, n_colors=254):
+		self.focus = None
+		self.n_bricks = 0
+		self.n_bricks_sent = 0
+		self.n_compressed_bytes = 0
+
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._queue = []
+		self._thread = None
+
+		self.update()
+
+		# queue every brick, the coarsest levels that fit in SYNC_BYTES are sent right away
+		sync_bytes = 0
+		sync_levels = []
+		for level in reversed(range(len(self.levels))):
+			sync_bytes += int(np.prod(self.levels[level].shape, dtype=np.int64))
+			if len(sync_levels) > 0 and sync_bytes > SYNC_BYTES:
+				break
+			sync_levels.append(level)
+
+		for level, data in enumerate(self.levels):
+			for index, slices in _brick_grid(data.shape, brick_size):
+				self._queue.append((level, index, slices))
+		self.n_bricks = len(self._queue)
+
+		for level in sync_levels:
+			for brick in [brick for brick in self._queue if brick[0] == level]:
+				self._send_brick(*brick)
+		self._queue = [brick for brick in self._queue if brick[0] not in sync_levels]
+		self._prioritize()
+
+		if stream:
+			self._thread = threading.Thread(target=self.stream, daemon=True)
+			self._thread.start()
+
+	def update(self):
+		data = {}
+		data['name'] = self.id
+		data['visible'] = self.visible
+		data['brickSize'] = self.brick_size
+		data['levels'] = [list(level.shape) for level in self.levels]
+
+		client.emit('UpdateVolume', json.dumps(data), key=self.id)
+		_send_colormap(self.id, self.colormap)
+
+	def set_colormap(self, colormap):
+		"""Replace the colormap, only the 1KB lookup table is sent
+
+		Parameters
+		----------
+		colormap : list of string or (256, 4) uint8 array
+			see colormap_lut
+		"""
+		self.colormap = sanitize_colormap(colormap)
+		_send_colormap(self.id, self.colormap)
+
+	def delete(self):
+		self.stop()
+		client.emit('DeleteVolume', self.id)
+
+	def _focus_voxel(self):
+		"""Internal helper, the focus point in full resolution voxels
+		"""
+		focus = self.focus
+		if focus is None:
+			target = getattr(camera.main, 'target', None)
+			if isinstance(target, (list, tuple)) and len(target) == 3:
+				focus = target
+		if focus is None:
+			return np.array(self.levels[0].shape) / 2
+		return np.array(focus, dtype=float) / self.resolution
+
+	def _prioritize(self):
+		"""Internal helper, sort the queued bricks coarse to fine, then by distance to the focus point
+		"""
+		focus = self._focus_voxel()
+
+		def priority(brick):
+			level, index, slices = brick
+			center = np.array([(sl.start + sl.stop) / 2 for sl in slices]) * (2 ** level)
+			return (-level, float(np.linalg.norm(center - focus)))
+
+		with self._lock:
+			# the queue is popped from the end
+			self._queue.sort(key=priority, reverse=True)
+
+	def set_focus(self, coordinate):
+		"""Stream the bricks nearest to a coordinate first
+
+		By default bricks are prioritized around the main camera target.
+
+		Parameters
+		----------
+		coordinate : list of three floats
+			(ap, ml, dv) in um
+		"""
+		self.focus = utils.sanitize_vector3(coordinate)
+		self._prioritize()
+
+	def _send_brick(self, level, index, slices):
+		"""Internal helper, compress and send a single brick
+		"""
+		brick = np.ascontiguousarray(self.levels[level][slices])
+		compressed = zlib.compress(brick)
+
+		brick_data = {}
+		brick_data['name'] = self.id
+		brick_data['level'] = level
+		brick_data['index'] = list(index)
+		brick_data['offset'] = [sl.start for sl in slices]
+		brick_data['shape'] = list(brick.shape)
+		client.emit_binary('SetVolumeBrick', brick_data, compressed)
+
+		# stream() can run on the background thread and on the caller's thread at the same time
+		with self._lock:
+			self.n_compressed_bytes += len(compressed)
+			self.n_bricks_sent += 1
+
+	def stream(self):
+		"""Send the remaining bricks in priority order, runs in a background thread by default
+		"""
+		while not self._stop.is_set():
+			with self._lock:
+				if len(self._queue) == 0:
+					return
+				brick = self._queue.pop()
+			self._send_brick(*brick)
+
+	def wait(self, timeout = None):
+		"""Block until all bricks have been sent
+
+		Parameters
+		----------
+		timeout : float, optional
+		"""
+		if self._thread is not None:
+			self._thread.join(timeout)
+
+	def stop(self):
+		"""Stop streaming, bricks that were not sent yet are dropped
+		"""
+		self._stop.set()
+		self.wait()
+
+QUANTILE_SAMPLE_SIZE = 1000000
+SLAB_BYTES = 64000000
+
+def _slabs(shape, itemsize, slab_bytes=SLAB_BYTES, multiple=1):
+	"""Internal helper, iterate over slices along the first axis holding at most ~slab_bytes each
+	"""
+	return utils.slab_slices(shape, itemsize, slab_bytes, multiple)
+
+def _uint8_slabs(volume_data, slab_bytes=None, multiple=1):
+	"""Internal helper, read a volume slab by slab as C-contiguous uint8 arrays, NaN mapped to 255
+
+	The input is never modified, uint8 memmaps are read without a copy.
+	"""
+	slab_bytes = slab_bytes or SLAB_BYTES
+	for slab_slice in _slabs(volume_data.shape, volume_data.dtype.itemsize, slab_bytes, multiple):
+		slab = np.asarray(volume_data[slab_slice])
+		if np.issubdtype(slab.dtype, np.floating):
+			slab = np.where(np.isnan(slab), 255, slab)
+		yield slab_slice, np.ascontiguousarray(slab, dtype=np.uint8)
+
+def _blocks(volume_data, block_size):
+	"""Internal helper, split the flattened uint8 volume into block_size pieces, reading slab by slab
+	"""
+	pending = bytearray()
+	for _, slab in _uint8_slabs(volume_data, max(SLAB_BYTES, block_size)):
+		pending += memoryview(slab).cast('B')
+		while len(pending) >= block_size:
+			yield bytes(pending[:block_size])
+			del pending[:block_size]
+	if len(pending) > 0:
+		yield bytes(pending)
+
+def _sample_quantiles(volume_data, n_colors, sample_size, seed=0):
+	"""Internal helper, estimate quantiles of the non-NaN values from a random sample
+
+	The sample is drawn slab by slab so that no full copy of the volume is made. Volumes with fewer
+	than sample_size voxels use every value, which gives exact quantiles. The first and last
+	quantiles are always the exact min and max, so that every value maps to a color.
+	"""
+	rng = np.random.default_rng(seed)
+	total = int(np.prod(volume_data.shape, dtype=np.int64))
+	exact = total <= sample_size
+
+	samples = []
+	low, high = np.inf, -np.inf
+	for slab_slice in _slabs(volume_data.shape, volume_data.dtype.itemsize):
+		slab = np.asarray(volume_data[slab_slice]).reshape(-1)
+		valid = ~np.isnan(slab)
+		if valid.any():
+			low = min(low, slab[valid].min())
+			high = max(high, slab[valid].max())
+		if not exact:
+			n_sample = int(np.ceil(sample_size * slab.size / total))
+			index = rng.integers(0, slab.size, n_sample)
+			slab, valid = slab[index], valid[index]
+		samples.append(slab[valid])
+
+	samples = np.concatenate(samples)
+	if low > high:
+		raise Exception('(urchin.volumes) Volume only contains NaN values')
+	if samples.size == 0:
+		samples = np.array([low, high])
+
+	quantiles = np.quantile(samples, np.linspace(0,1,n_colors))
+	quantiles[0] = low
+	quantiles[-1] = high
+	return np.maximum.accumulate(quantiles)
+
+def compress_volume(volume_data, n_colors=254, sample_size=QUANTILE_SAMPLE_SIZE, out=None):
 	"""Compress a volume of float data into a uint8 volume by quantiles.
 
 	NaN values are mapped to 255 (transparent) for Urchin.
 
 	This is required for use with the urchin.volume.Volume object type.
 
+	Quantiles are estimated from a random sample of the non-NaN values (exact for volumes smaller
+	than sample_size), then the volume is quantized slab by slab into a preallocated uint8 output,
+	so the transient memory is bounded by the slab size rather than the volume size.
+
 	Parameters
 	----------
 	volume_data : float volume
-		3D matrix of float data
+		3D matrix of float data, np.memmap is supported
 	n_colors : int (optional)
-		Default to 254, number of un-reserved colors. 255 must always be reserved for NaN / transparency
+		Default to 254, number of un-reserved colors. 254 and 255 are reserved for transparency / NaN
+	sample_size : int (optional)
+		Number of voxels used to estimate the quantiles, by default 1e6
+	out : uint8 array (optional)
+		Output array with the same shape as volume_data, e.g. a np.memmap, by default a new array
 
 	Returns
 	-------
 	(uint8 volume, float[] map)
+
+	Examples
+	--------
+	>>> data, quantiles = urchin.volumes.compress_volume(volume)
+	>>> out = np.lib.format.open_memmap('volume.npy', mode='w+', dtype=np.uint8, shape=volume.shape)
+	>>> data, quantiles = urchin.volumes.compress_volume(volume, out=out)
 	"""
-	quantiles = np.quantile(volume_data.flatten(), np.linspace(0,1,n_colors))
+	if n_colors > 254:
+		raise Exception('(urchin.volumes) n_colors can be at most 254, indexes 254 and 255 are reserved for transparency')
+
+	quantiles = _sample_quantiles(volume_data, n_colors, sample_size)
+
+	if out is None:
+		out = np.empty(volume_data.shape, dtype=np.uint8)
+	elif out.shape != volume_data.shape or out.dtype != np.uint8:
+		raise Exception('(urchin.volumes) out must be a uint8 array with the same shape as volume_data')
+
+	for slab_slice in _slabs(volume_data.shape, volume_data.dtype.itemsize):
+		slab = np.asarray(volume_data[slab_slice])
+		# equivalent to np.digitize(slab, quantiles, right=True), NaN sorts to the end
+		indexes = np.minimum(np.searchsorted(quantiles, slab, side='left'), n_colors - 1)
+		indexes[np.isnan(slab)] = 255
+		out[slab_slice] = indexes
+
+	return out, quantiles
+
+# named colormaps, as evenly spaced control points from 0 to 1
+COLORMAPS = {
+	'reds': ['#000000', '#ff0000'],
+	'greens': ['#000000', '#00ff00'],
+	'blues': ['#000000', '#0000ff'],
+	'grays': ['#000000', '#ffffff'],
+	'viridis': ['#440154', '#482878', '#3e4989', '#31688e', '#26828e', '#1f9e89', '#35b779', '#6ece58', '#b5de2b', '#fde725'],
+	'magma': ['#000004', '#140e36', '#3b0f70', '#641a80', '#8c2981', '#b73779', '#de4968', '#f7705c', '#fe9f6d', '#fecf92', '#fcfdbf'],
+	'inferno': ['#000004', '#160b39', '#420a68', '#6a176e', '#932667', '#bc3754', '#dd513a', '#f37819', '#fca50a', '#f6d746', '#fcffa4'],
+	'plasma': ['#0d0887', '#41049d', '#6a00a8', '#8f0da4', '#b12a90', '#cc4778', '#e16462', '#f2844b', '#fca636', '#fcce25', '#f0f921'],
+	'cividis': ['#00224e', '#123570', '#3b496c', '#575d6d', '#707173', '#8a8779', '#a69d75', '#c4b56c', '#e4cf5b', '#fee838'],
+}
+
+def colormap_lut(colormap_name='greens', reserved_colors=[], datapoints=None, control_points=None):
+	"""Build a 256 x 4 RGBA lookup table
+
+	The layout matches colormap(), indexes [0 -> n) hold the colormap, followed by the reserved
+	colors, index 254 and 255 are transparent.
 
-	out = np.digitize(volume_data, quantiles, right=True).astype(np.uint8)
-	out[np.isnan(volume_data)] = 255
+	Parameters
+	----------
+	colormap_name : str, optional
+		one of COLORMAPS, by default 'greens'
+	reserved_colors : list of colors, optional
+		hex strings or RGB(A) values placed after the colormap, by default []
+	datapoints : list of float, optional
+		e.g. the quantiles returned by compress_volume, the colormap is sampled at the normalized
+		values instead of uniformly, by default None
+	control_points : list of (float, color), optional
+		custom colormap as (position, color) pairs with positions in 0->1, replaces colormap_name
+
+	Returns
+	-------
+	np.ndarray
+		(256, 4) uint8
+
+	Examples
+	--------
+	>>> data, quantiles = urchin.volumes.compress_volume(volume)
+	>>> lut = urchin.volumes.colormap_lut('viridis', datapoints=quantiles)
+	>>> lut = urchin.volumes.colormap_lut(control_points=[(0, '#000000'), (0.8, '#ff0000'), (1, '#ffff00')])
+	"""
+	n_unreserved = 254 - len(reserved_colors)
+	if n_unreserved < 1:
+		raise Exception('(urchin.volumes) Too many reserved colors, at most 253 are available')
+
+	if control_points is not None:
+		positions = np.array([point[0] for point in control_points], dtype=float)
+		colors = utils.sanitize_color_array(np.array([point[1] for point in control_points], dtype=object if isinstance(control_points[0][1], str) else None))
+		order = np.argsort(positions)
+		positions = positions[order]
+		colors = colors[order]
+	elif colormap_name in COLORMAPS:
+		colors = utils.sanitize_color_array(COLORMAPS[colormap_name])
+		positions = np.linspace(0, 1, len(colors))
+	else:
+		raise Exception(f'{colormap_name} is not a valid colormap option, options are {list(COLORMAPS.keys())}')
+
+	if datapoints is not None:
+		datapoints = np.asarray(datapoints, dtype=float)
+		value_range = np.max(datapoints) - np.min(datapoints)
+		t = (datapoints - np.min(datapoints)) / (value_range if value_range > 0 else 1)
+		# resample to one value per colormap entry
+		t = np.interp(np.linspace(0, len(t) - 1, n_unreserved), np.arange(len(t)), t)
+	else:
+		t = np.arange(n_unreserved) / n_unreserved
+
+	lut = np.zeros((256, 4), dtype=np.uint8)
+	for channel in range(4):
+		lut[:n_unreserved, channel] = np.round(np.interp(t, positions, colors[:, channel]))
+	if len(reserved_colors) > 0:
+		lut[n_unreserved:254] = utils.sanitize_color_array(np.array(reserved_colors, dtype=object if isinstance(reserved_colors[0], str) else None))
+
+	return lut
+
+def lut_to_hex(lut):
+	"""Convert an (N, 4) uint8 lookup table to a list of '#RRGGBBAA' strings
+	"""
+	hex_string = np.ascontiguousarray(lut, dtype=np.uint8).tobytes().hex()
+	return ['#' + hex_string[i : i + 8] for i in range(0, len(hex_string), 8)]
 
-	return out.astype(np.uint8), quantiles
+def sanitize_colormap(colormap):
+	"""Convert a colormap to a (256, 4) uint8 lookup table
+
+	Parameters
+	----------
+	colormap : list of hex strings or (N, 3)/(N, 4) array
+		colors for the first N indexes, missing entries (and index 255) are transparent
+
+	Returns
+	-------
+	np.ndarray
+		(256, 4) uint8
+	"""
+	colors = np.asarray(colormap)
+	if colors.shape == (256, 4) and colors.dtype == np.uint8:
+		return colors
+
+	if colors.dtype.kind in ('U', 'S', 'O'):
+		colors = utils.sanitize_color_array(np.asarray(colormap, dtype=object))
+	else:
+		colors = utils.sanitize_color_array(colors)
+	if colors.shape[0] > 255:
+		raise Exception('(urchin.volumes) A colormap can have at most 255 colors, index 255 is reserved for transparency')
+
+	lut = np.zeros((256, 4), dtype=np.uint8)
+	lut[:colors.shape[0]] = colors
+	return lut
 
 def colormap(colormap_name='greens', reserved_colors=[], datapoints=None):
 	"""Build a colormap
@@ -155,46 +916,28 @@ def colormap(colormap_name='greens', reserved_colors=[], datapoints=None):
 	indexes: 	[0->252, 	253->254, 				255]
 	colors: 	[greens, 	your reserved colors, 	transparent]
 
+	Volumes accept the hex list returned here, use colormap_lut() to get the packed table directly.
+
 	Colormap options
 	----------
 		reds: 0->255 R channel
 		greens: 0->255 G channel
 		blues: 0->255 B channel
+		grays, viridis, magma, inferno, plasma, cividis
 
 	Parameters
 	----------
 	colormap_name : str, optional
-		_description_, by default 'greens'
-	reserved_colors : _type_, optional
-		_description_, by default None
+		see COLORMAPS, by default 'greens'
+	reserved_colors : list of string, optional
+		hex colors placed after the colormap, by default []
+	datapoints : list of float, optional
+		see colormap_lut, by default None
 
 	Returns
 	-------
 	list of string
 		List of colormap hex colors in Urchin-compatible format
 	"""
-	colormap = []
-
-	n_unreserved = 254 - len(reserved_colors)
-
-	datapoints = (datapoints - np.min(datapoints)) / (np.max(datapoints) - np.min(datapoints))
-	datapoints = datapoints / np.max(datapoints)
-
-	for i in range(0, n_unreserved):
-		if datapoints is not None:
-			v = int(np.round(datapoints[i] * 255))
-		else:
-			v = int(np.round(i / n_unreserved * 255))
-
-		if colormap_name == 'reds':
-			colormap.append(utils.rgba_to_hex((v,0,0,255)))
-		elif colormap_name == 'greens':
-			colormap.append(utils.rgba_to_hex((0,v,0,255)))
-		elif colormap_name == 'blues':
-			colormap.append(utils.rgba_to_hex((0,0,v,255)))
-		else:
-			raise Exception(f'{colormap_name} is not a valid colormap option')
-
-	colormap.extend(reserved_colors)
-
-	return colormap
\ No newline at end of file
+	lut = colormap_lut(colormap_name, reserved_colors, datapoints)
+	return lut_to_hex(lut[:254])
@@ -0,0 +1,47 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+
+class TestAnimation(TestCase):
+    """Keyframe interpolation and trajectory upload"""
+
+    def test_slerp_stays_on_the_unit_sphere(self):
+        q = urchin.animation.euler_to_quaternion([[0, 0, 0], [0, 180, 0], [90, 45, 30]])
+        np.testing.assert_allclose(np.linalg.norm(q, axis=1), 1)
+
+        t = np.linspace(0, 1, 11)
+        path = urchin.animation.slerp(np.repeat(q[:1], 11, axis=0), np.repeat(q[1:2], 11, axis=0), t)
+        np.testing.assert_allclose(np.linalg.norm(path, axis=1), 1)
+        # constant angular velocity around the yaw axis
+        angles = 2 * np.degrees(np.arccos(np.clip(np.abs(path[:, 3]), 0, 1)))
+        np.testing.assert_allclose(angles, t * 180, atol=1e-6)
+
+    def test_spline_passes_through_keyframes(self):
+        key_times = [0, 1, 3]
+        values = [[0, 0], [1, 10], [0, 4]]
+        out = urchin.animation.spline(key_times, values, [0, 1, 3, 5])
+        np.testing.assert_allclose(out, [[0, 0], [1, 10], [0, 4], [0, 4]])
+
+    def test_upload_and_step(self):
+        with patch.object(urchin.client, 'sio') as sio:
+            anim = urchin.animation.Animation()
+            anim.add_keyframe(0, rotation='axial', zoom=8)
+            anim.add_keyframe(1, rotation=[0, 90, 0], zoom=4, easing='linear')
+            anim.upload(frame_rate=10)
+            anim.set_frame(5)
+
+        self.assertEqual(anim.n_frames, 11)
+        event, payload = sio.emit.call_args_list[0][0]
+        self.assertEqual(event, 'SetCameraAnimation')
+        header, arrays = urchin.client.decode_arrays(payload)
+        frames = arrays['frames']
+        self.assertEqual(header['layout'], urchin.animation.FRAME_LAYOUT)
+        self.assertEqual(frames.shape, (11, 10))
+        np.testing.assert_allclose(frames[5, 7], 6, atol=1e-5)
+        np.testing.assert_allclose(frames[5, :4], urchin.animation.euler_to_quaternion([0, 45, 0])[0], atol=1e-6)
+        self.assertTrue(np.all(np.isnan(frames[:, 4:7])))
+        self.assertEqual(sio.emit.call_args_list[1][0], ('SetCameraAnimationFrame', {'CameraMain': 5}))
@@ -0,0 +1,78 @@
+import json
+from unittest import TestCase
+
+import oursin as urchin
+
+
+class TestAtlasDeltas(TestCase):
+    """Atlas state changes are sent as full updates, or as deltas of the changed areas when enabled"""
+
+    def setUp(self):
+        self.previous = urchin.client.transport
+        self.renderer = urchin.loopback.connect()
+        self.atlas = urchin.atlas.Atlas('ccf25')
+        self.sent = []
+        handle = self.renderer.handle
+
+        def record(event, data=None):
+            self.sent.append((event, data))
+            handle(event, data)
+        self.renderer.handle = record
+
+    def tearDown(self):
+        urchin.atlas.Atlas.instances.remove(self.atlas)
+        urchin.client.use_transport(self.previous)
+
+    def events(self):
+        return [event for event, _ in self.sent]
+
+    def test_full_updates_by_default(self):
+        visp, = self.atlas.get_areas(['VISp'])
+        self.atlas.load()
+        self.sent.clear()
+
+        visp.set_color([1, 0, 0])
+        visp.set_visibility(True)
+        self.assertEqual(self.events(), ['urchin-atlas-update', 'urchin-atlas-update'])
+        area = json.loads(self.sent[-1][1])['Areas'][visp.index]
+        self.assertTrue(area['Visible'])
+        self.assertEqual(area['Color']['r'], 1)
+
+    def test_load_delta_and_resync(self):
+        self.atlas.deltas = True
+        root, visp, mop = self.atlas.get_areas(['root', 'VISp', 'MOp'])
+        self.atlas.load()
+        self.assertEqual(self.events(), ['urchin-atlas-load', 'urchin-atlas-update'])
+        self.assertEqual(self.renderer.scene['atlases']['ccf25']['Name'], 'ccf25')
+
+        self.sent.clear()
+        self.atlas.set_visibilities([root, visp], True)
+        visp.set_color([1, 0, 0])
+        self.assertEqual(self.events(), ['urchin-atlas-delta', 'urchin-atlas-delta'])
+
+        delta = json.loads(self.sent[0][1])
+        self.assertEqual([area['Index'] for area in delta['Areas']], [root.index, visp.index])
+        self.assertEqual(set(delta['Areas'][0]), {'Index', 'AtlasId', 'Visible', 'Side'})
+        delta = json.loads(self.sent[1][1])
+        self.assertEqual([(area['Index'], set(area)) for area in delta['Areas']], [(visp.index, {'Index', 'AtlasId', 'Color'})])
+
+        areas = self.renderer.scene['atlases']['ccf25']['Areas']
+        self.assertTrue(areas[visp.index]['Visible'])
+        self.assertEqual(areas[visp.index]['Color']['r'], 1)
+        self.assertFalse(areas[mop.index]['Visible'])
+
+        # changes accumulate without push and are folded into a resync
+        self.sent.clear()
+        mop.set_visibility(True, push=False)
+        self.assertEqual(self.sent, [])
+        self.atlas.sync()
+        self.assertEqual(self.events(), ['urchin-atlas-update'])
+        self.assertTrue(json.loads(self.sent[0][1])['Areas'][mop.index]['Visible'])
+
+        self.sent.clear()
+        self.atlas._push()
+        self.assertEqual(self.sent, [])
+
+    def test_colormap(self):
+        self.atlas.set_colormap('grey')
+        self.assertEqual(json.loads(self.sent[-1][1])['Colormap']['Name'], 'grey')
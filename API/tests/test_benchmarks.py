@@ -0,0 +1,56 @@
+import importlib.util
+import os
+from unittest import TestCase
+
+import oursin as urchin
+
+SUITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'suite.py')
+
+
+def load_suite():
+    spec = importlib.util.spec_from_file_location('urchin_benchmark_suite', SUITE_PATH)
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+    return suite
+
+
+class TestBenchmarkSuite(TestCase):
+    """Scenario measurement and baseline comparison of benchmarks/suite.py"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.suite = load_suite()
+
+    def test_measure_restores_the_transport(self):
+        transport = urchin.client.transport
+        result = self.suite.measure('particles-10k')
+
+        self.assertIs(urchin.client.transport, transport)
+        self.assertEqual(result['messages'], 3)
+        self.assertGreater(result['bytes'], 10000 * 3 * 4)
+        self.assertEqual(result['reply_bytes'], 0)
+
+    def test_screenshot_counts_the_reply(self):
+        self.suite.SCENARIOS['screenshot-small'] = (self.suite._screenshot([64, 32]), False)
+        try:
+            result = self.suite.measure('screenshot-small')
+        finally:
+            del self.suite.SCENARIOS['screenshot-small']
+
+        self.assertEqual(result['messages'], 1)
+        self.assertGreater(result['reply_bytes'], result['bytes'])
+
+    def test_compare(self):
+        baseline = {'messages': 3, 'bytes': 100, 'seconds': 1.0, 'peak_mb': 10.0}
+        results = {
+            'same': dict(baseline, seconds=1.2, reply_bytes=5),
+            'slower': dict(baseline, seconds=1.5),
+            'bigger': dict(baseline, bytes=101),
+            'failed': {'error': 'Exception'},
+            'new': dict(baseline),
+        }
+        baselines = {'same': baseline, 'slower': baseline, 'bigger': baseline, 'failed': baseline}
+
+        regressions = self.suite.compare(results, baselines, tolerance=0.25)
+        self.assertEqual(sorted(regressions), ['bigger', 'slower'])
+        self.assertEqual(regressions['bigger'], ['bytes 100 -> 101'])
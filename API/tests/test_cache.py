@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+
+class MockRenderer:
+    """Renderer stand-in that keeps a size-bounded blob cache and answers cache queries"""
+
+    def __init__(self, max_bytes=10**9):
+        self.blobs = urchin.cache.LRUCache(max_bytes)
+        self.events = []
+
+    def emit(self, event, data=None):
+        self.events.append(event)
+
+        if event == 'urchin-cache-query':
+            reply = {'id': data['id'], 'hash': data['hash'], 'hit': self.blobs.touch(data['hash'])}
+            # replies arrive on the socket.io thread
+            threading.Thread(target=urchin.client.receive_cache_reply, args=(reply,)).start()
+        elif event == 'UpdateVolume':
+            data = json.loads(data)
+            if not data['cached']:
+                self.blobs.add(data['hash'], 1)
+        elif event == 'SetFOVTextureDataMetaInit':
+            if not data[6]:
+                self.blobs.add(data[5], 1)
+        elif event == 'CustomMeshCreate':
+            header, arrays = urchin.client.decode_arrays(data)
+            if not header.get('cached'):
+                self.blobs.add(header['hash'], sum(array.nbytes for array in arrays.values()))
+
+
+class TestCache(TestCase):
+    """Content-addressed upload cache hit/miss protocol"""
+
+    def setUp(self):
+        urchin.cache.clear()
+        self.enabled = patch.object(urchin.cache, 'enabled', True)
+        self.enabled.start()
+        self.renderer = MockRenderer()
+        self.patch = patch.object(urchin.client, 'sio', emit=self.renderer.emit)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.enabled.stop()
+        urchin.cache.clear()
+
+    def test_volume_reupload_is_skipped(self):
+        volume = np.zeros((10, 10, 10), dtype=np.uint8)
+
+        first = urchin.volumes.Volume(volume.copy())
+        self.assertFalse(first.cached)
+        # the first upload doesn't need a query, the client never sent this content
+        self.assertNotIn('urchin-cache-query', self.renderer.events)
+        self.assertIn('SetVolumeData', self.renderer.events)
+
+        self.renderer.events.clear()
+        second = urchin.volumes.Volume(volume.copy())
+        self.assertTrue(second.cached)
+        self.assertEqual(second.hash, first.hash)
+        self.assertNotIn('SetVolumeData', self.renderer.events)
+
+    def test_volume_hash_covers_shape_and_mode(self):
+        volume = np.arange(1000, dtype=np.uint8).reshape(10, 10, 10)
+        reads = []
+
+        class Source:
+            shape = volume.shape
+            dtype = volume.dtype
+            ndim = 3
+
+            def __getitem__(self, key):
+                reads.append(key)
+                return volume[key]
+
+        dense = urchin.volumes.Volume(Source())
+        self.assertEqual(len(reads), 1)
+
+        hashes = {
+            dense.hash,
+            urchin.volumes.Volume(volume.reshape(10, 5, 20)).hash,
+            urchin.volumes.Volume(volume, sparse=True, brick_size=5).hash,
+            urchin.volumes.Volume(volume, block_size=100).hash,
+        }
+        self.assertEqual(len(hashes), 4)
+
+    def test_disabled_cache_uploads_without_queries(self):
+        volume = np.zeros((10, 10, 10), dtype=np.uint8)
+        reads = []
+
+        class Source:
+            shape = volume.shape
+            dtype = volume.dtype
+            ndim = 3
+
+            def __getitem__(self, key):
+                reads.append(key)
+                return volume[key]
+
+        with patch.object(urchin.cache, 'enabled', False):
+            urchin.volumes.Volume(volume.copy())
+            second = urchin.volumes.Volume(volume.copy())
+            blocks = urchin.volumes.Volume(Source(), block_size=100)
+
+        self.assertFalse(second.cached)
+        self.assertNotIn('urchin-cache-query', self.renderer.events)
+        self.assertEqual(self.renderer.events.count('SetVolumeData'), 2)
+        # block mode only hashes in a separate pass while the cache is enabled
+        self.assertIsNone(blocks.hash)
+        self.assertEqual(len(reads), 1)
+
+    def test_renderer_eviction_causes_reupload(self):
+        texture = urchin.texture.Texture()
+        image = np.arange(64, dtype=np.uint8).reshape(8, 8)
+
+        texture.set_image(image)
+        self.renderer.blobs.clear()
+
+        self.renderer.events.clear()
+        texture.set_image(image)
+        self.assertIn('urchin-cache-query', self.renderer.events)
+        self.assertEqual(len(self.renderer.blobs), 1)
+
+    def test_lru_eviction(self):
+        lru = urchin.cache.LRUCache(100)
+        lru.add('a', 40)
+        lru.add('b', 40)
+        lru.touch('a')
+        self.assertEqual(lru.add('c', 40), ['b'])
+        self.assertIn('a', lru)
+        self.assertEqual(lru.n_bytes, 80)
+
+    def test_no_reply_disables_cache(self):
+        urchin.cache.add('blake2b:0', 10)
+        with patch.object(urchin.cache, 'timeout', 0.01):
+            with patch.object(urchin.client, 'sio'):
+                self.assertFalse(urchin.cache.query('blake2b:0'))
+        self.assertFalse(urchin.cache.enabled)
+
+    def test_async_transport_uploads_instead_of_waiting(self):
+        transport = urchin.client.AsyncSocketIOTransport()
+        transport.sio.emit = self._async_emit
+        previous = urchin.client.use_transport(transport)
+        volume = np.zeros((10, 10, 10), dtype=np.uint8)
+
+        async def run():
+            transport._start()
+            urchin.volumes.Volume(volume.copy())
+            second = urchin.volumes.Volume(volume.copy())
+            await urchin.client.drain()
+            return second
+
+        try:
+            with patch.object(urchin.cache, 'timeout', 30):
+                second = asyncio.run(run())
+        finally:
+            urchin.client.use_transport(previous)
+
+        # the loop can't receive a reply while it waits for one, so no query is sent
+        self.assertFalse(second.cached)
+        self.assertTrue(urchin.cache.enabled)
+        self.assertNotIn('urchin-cache-query', self.renderer.events)
+        self.assertEqual(self.renderer.events.count('SetVolumeData'), 2)
+
+    async def _async_emit(self, event, data=None):
+        self.renderer.emit(event, data)
@@ -0,0 +1,245 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+import oursin as urchin
+
+
+def png_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((height, width, 3), 128, dtype=np.uint8)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def reply_from_thread(name, data, chunk_size=1000):
+    """Send a screenshot reply the way the socket.io thread does"""
+    def send():
+        urchin.camera.on_camera_img_meta(json.dumps({'name': name, 'totalBytes': len(data)}))
+        for offset in range(0, len(data), chunk_size):
+            urchin.camera.on_camera_img(json.dumps({'name': name, 'data': list(data[offset:offset + chunk_size])}))
+    threading.Thread(target=send).start()
+
+
+class TestCamera(TestCase):
+    """Screenshot round trips against a simulated renderer"""
+
+    def test_screenshot(self):
+        data = png_bytes(64, 48)
+
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: reply_from_thread(json.loads(payload)['name'], data)
+            img = asyncio.run(urchin.camera.main.screenshot([64, 48]))
+
+        self.assertEqual(img.size, (64, 48))
+        self.assertEqual(urchin.camera.receive_camera, {})
+
+    def test_screenshot_timeout(self):
+        with patch.object(urchin.client, 'sio'):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(urchin.camera.main.screenshot([64, 48], timeout=0.05))
+
+        self.assertEqual(urchin.camera.receive_camera, {})
+
+    def test_screenshot_disconnect(self):
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: threading.Thread(target=urchin.camera._on_disconnect).start()
+            with self.assertRaises(ConnectionError):
+                asyncio.run(urchin.camera.main.screenshot([64, 48], timeout=1))
+
+    def test_binary_chunks_out_of_order(self):
+        data = png_bytes(640, 480)
+        chunk_size = 4096
+        offsets = list(range(0, len(data), chunk_size))[::-1]
+
+        def send(name):
+            urchin.camera.on_camera_img_meta(json.dumps({'name': name, 'totalBytes': len(data)}))
+            for offset in offsets:
+                header = json.dumps({'name': name, 'offset': offset})
+                urchin.camera.on_camera_img([header, data[offset:offset + chunk_size]])
+
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: threading.Thread(target=send, args=(json.loads(payload)['name'],)).start()
+            img = asyncio.run(urchin.camera.main.screenshot([640, 480], timeout=5))
+
+        self.assertEqual(img.size, (640, 480))
+        np.testing.assert_array_equal(np.array(img), 128)
+
+    @patch.object(urchin.camera, 'concurrent_requests', True)
+    def test_pipelined_frames_are_written_in_order(self):
+        n_frames = 12
+
+        def reply(payload):
+            request = json.loads(payload)
+            frame = int(request['id'].split('frame')[1])
+            data = io.BytesIO()
+            Image.fromarray(np.full((8, 8, 3), frame, dtype=np.uint8)).save(data, format='PNG')
+            data = data.getvalue()
+
+            def send():
+                # later frames come back first
+                time.sleep(0.01 * (n_frames - frame))
+                urchin.camera.on_camera_img_meta(json.dumps({'name': request['name'], 'id': request['id'], 'totalBytes': len(data)}))
+                urchin.camera.on_camera_img([json.dumps({'name': request['name'], 'id': request['id']}), data])
+            threading.Thread(target=send).start()
+
+        written = []
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: reply(payload) if event == 'RequestCameraImg' else None
+            asyncio.run(urchin.camera.main._capture_frames(n_frames, [8, 8], lambda frame: written.append(int(frame[0, 0, 0])),
+                                                           pipeline_depth=4, timeout=5))
+
+        self.assertEqual(written, list(range(n_frames)))
+        self.assertEqual(urchin.camera.receive_futures, {})
+
+    def test_frames_are_serial_without_renderer_support(self):
+        in_flight = []
+
+        def reply(payload):
+            request = json.loads(payload)
+            in_flight.append(len(urchin.camera.receive_futures))
+            data = io.BytesIO()
+            Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(data, format='PNG')
+            data = data.getvalue()
+
+            def send():
+                time.sleep(0.01)
+                urchin.camera.on_camera_img_meta(json.dumps({'name': request['name'], 'id': request['id'], 'totalBytes': len(data)}))
+                urchin.camera.on_camera_img([json.dumps({'name': request['name'], 'id': request['id']}), data])
+            threading.Thread(target=send).start()
+
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: reply(payload) if event == 'RequestCameraImg' else None
+            asyncio.run(urchin.camera.main._capture_frames(6, [8, 8], lambda frame: None, pipeline_depth=4, timeout=5))
+
+        self.assertEqual(in_flight, [1] * 6)
+
+    @patch.object(urchin.camera, 'concurrent_requests', True)
+    def test_concurrent_captures_and_stray_replies(self):
+        requests = []
+
+        def reply(payload):
+            request = json.loads(payload)
+            requests.append(request['id'])
+            # a stale reply that nothing waits for is dropped without failing the pending captures
+            urchin.camera.on_camera_img_meta(json.dumps({'name': request['name'], 'id': 'stale', 'totalBytes': 4}))
+            urchin.camera.on_camera_img([json.dumps({'name': request['name'], 'id': 'stale'}), b'1234'])
+
+            data = io.BytesIO()
+            Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(data, format='PNG')
+            data = data.getvalue()
+            urchin.camera.on_camera_img_meta(json.dumps({'name': request['name'], 'id': request['id'], 'totalBytes': len(data)}))
+            urchin.camera.on_camera_img([json.dumps({'name': request['name'], 'id': request['id']}), data])
+
+        async def capture_twice():
+            camera = urchin.camera.main
+            await asyncio.gather(camera._capture_frames(2, [8, 8], lambda frame: None, timeout=5),
+                                 camera._capture_frames(2, [8, 8], lambda frame: None, timeout=5))
+
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = lambda event, payload: reply(payload) if event == 'RequestCameraImg' else None
+            asyncio.run(capture_twice())
+
+        self.assertEqual(len(requests), 4)
+        self.assertEqual(len(set(requests)), 4)
+        self.assertEqual(urchin.camera.receive_bytes, {})
+
+    def test_throttled_setters_coalesce(self):
+        with patch.object(urchin.client, 'sio') as sio:
+            camera = urchin.camera.Camera()
+            camera.set_max_rate(20)
+            sio.reset_mock()
+
+            for i in range(100):
+                camera.set_rotation([i, 0, 0])
+                camera.set_zoom(i)
+            camera.set_pan(1, 2)
+            camera.set_target_area('grey')
+            camera.set_target_coordinate([1, 2, 3])
+
+            self.assertEqual(camera.queue_depth, 4)
+            time.sleep(0.2)
+            self.assertEqual(camera.queue_depth, 0)
+
+        # flushed as the per-field events that the renderer already handles
+        events = [call[0] for call in sio.emit.call_args_list]
+        self.assertEqual(events, [('SetCameraRotation', {camera.id: [0, 0, 0]}),
+                                  ('SetCameraRotation', {camera.id: [99, 0, 0]}),
+                                  ('SetCameraZoom', {camera.id: 99}),
+                                  ('SetCameraPan', {camera.id: [1, 2]}),
+                                  ('SetCameraTarget', {camera.id: [1, 2, 3]})])
+        self.assertEqual(camera.n_dropped, 198)
+        self.assertEqual(camera.n_state_flushes, 2)
+
+    def test_max_rate_zero_is_unlimited(self):
+        with patch.object(urchin.client, 'sio') as sio:
+            camera = urchin.camera.Camera()
+            camera.set_max_rate(0)
+            camera.set_zoom(2)
+
+            with self.assertRaises(Exception):
+                camera.set_max_rate(-1)
+
+        self.assertIsNone(camera.max_rate)
+        self.assertEqual(sio.emit.call_args_list[-1][0][0], 'SetCameraZoom')
+
+    @patch.object(urchin.camera, 'concurrent_requests', True)
+    def test_screenshots_demultiplex_concurrent_requests(self):
+        requests = []
+
+        def reply_all():
+            # reply in reverse order, one image per request with its index as the color
+            for index, request in reversed(list(enumerate(requests))):
+                data = io.BytesIO()
+                Image.fromarray(np.full((6, 4, 3), index, dtype=np.uint8)).save(data, format='PNG')
+                data = data.getvalue()
+                urchin.camera.on_camera_img_meta(json.dumps({'name': request['name'], 'id': request['id'], 'totalBytes': len(data)}))
+                urchin.camera.on_camera_img([json.dumps({'name': request['name'], 'id': request['id']}), data])
+
+        def on_emit(event, payload=None):
+            if event == 'RequestCameraImg':
+                requests.append(json.loads(payload))
+                if len(requests) == len(cameras):
+                    threading.Thread(target=reply_all).start()
+
+        with patch.object(urchin.client, 'sio') as sio:
+            cameras = [urchin.camera.main, urchin.camera.Camera(), urchin.camera.main]
+            sio.emit.side_effect = on_emit
+            images = asyncio.run(urchin.camera.screenshots(cameras, [4, 6], timeout=5))
+
+        self.assertEqual(len({request['id'] for request in requests}), 3)
+        self.assertEqual([request['name'] for request in requests], [camera.id for camera in cameras])
+        self.assertEqual([int(np.array(img)[0, 0, 0]) for img in images], [0, 1, 2])
+        self.assertEqual(urchin.camera.receive_futures, {})
+
+    def test_screenshots_of_one_camera_are_serial(self):
+        requests = []
+        replied = []
+
+        def reply(name):
+            time.sleep(0.05)
+            replied.append(name)
+            data = png_bytes(4, 6)
+            urchin.camera.on_camera_img_meta(json.dumps({'name': name, 'totalBytes': len(data)}))
+            urchin.camera.on_camera_img([json.dumps({'name': name}), data])
+
+        def on_emit(event, payload=None):
+            if event == 'RequestCameraImg':
+                # a stock renderer, it doesn't echo request ids, record how many replies were sent before each request
+                requests.append(len(replied))
+                threading.Thread(target=reply, args=(json.loads(payload)['name'],)).start()
+
+        with patch.object(urchin.client, 'sio') as sio:
+            sio.emit.side_effect = on_emit
+            images = asyncio.run(urchin.camera.screenshots([urchin.camera.main] * 3, [4, 6], timeout=5))
+
+        # each request went out after the reply to the previous one
+        self.assertEqual(requests, [0, 1, 2])
+        self.assertEqual([img.size for img in images], [(4, 6)] * 3)
+        self.assertEqual(urchin.camera.receive_futures, {})
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+import numpy as np
+
+import oursin as urchin
+from vbl_aquarium.models.generic import FloatData
+
+
+class FakeAsyncClient:
+    """socketio.AsyncClient stand-in that records emits and yields to the loop on every send"""
+
+    def __init__(self):
+        self.emitted = []
+        self.connected = True
+
+    async def emit(self, event, data=None):
+        await asyncio.sleep(0)
+        self.emitted.append((event, data))
+
+
+class TestAsyncTransport(TestCase):
+    """Modules running unchanged on top of the asyncio transport"""
+
+    def setUp(self):
+        self.transport = urchin.client.AsyncSocketIOTransport(max_pending=4)
+        self.transport.sio = FakeAsyncClient()
+        self.previous = urchin.client.use_transport(self.transport)
+
+    def tearDown(self):
+        urchin.client.use_transport(self.previous)
+
+    def test_module_emits_are_ordered_and_drained(self):
+        async def run():
+            self.transport._start()
+            group = urchin.particles.ParticleGroup(10)
+            group.set_positions(np.ones((10, 3)) * 1000)
+            urchin.meshes.create(2)
+            self.assertEqual(self.transport.sio.emitted, [])
+
+            await urchin.client.drain()
+
+        asyncio.run(run())
+
+        events = [event for event, _ in self.transport.sio.emitted]
+        self.assertEqual(events, ['CreateParticles', 'SetParticlePos', 'MeshUpdate', 'MeshUpdate'])
+        self.assertEqual(len(self.transport.pending), 0)
+
+    def test_backpressure(self):
+        async def run():
+            self.transport._start()
+            queued = []
+
+            async def producer():
+                for i in range(20):
+                    await urchin.client.emit_async('SetFOVOffset', {'tex': i})
+                    queued.append(len(self.transport.pending))
+
+            # emits from another thread block until the loop has room
+            thread = threading.Thread(target=lambda: [urchin.client.emit('ThreadEvent', i) for i in range(10)])
+            thread.start()
+            await producer()
+            while thread.is_alive():
+                await asyncio.sleep(0.01)
+            await urchin.client.drain()
+            return queued
+
+        queued = asyncio.run(run())
+        self.assertLessEqual(max(queued), 4)
+
+        offsets = [data['tex'] for event, data in self.transport.sio.emitted if event == 'SetFOVOffset']
+        threaded = [data for event, data in self.transport.sio.emitted if event == 'ThreadEvent']
+        self.assertEqual(offsets, list(range(20)))
+        self.assertEqual(threaded, list(range(10)))
+
+    def test_emit_async_serializes_and_counts(self):
+        async def run():
+            self.transport._start()
+            await urchin.client.emit_async('SetCameraZoom', FloatData(id='c1', value=2.0))
+
+        urchin.client.enable_metrics()
+        try:
+            asyncio.run(run())
+            snapshot = urchin.client.metrics()
+        finally:
+            urchin.client.disable_metrics()
+
+        self.assertEqual(self.transport.sio.emitted, [('SetCameraZoom', FloatData(id='c1', value=2.0).to_string())])
+        self.assertEqual(snapshot['events']['SetCameraZoom']['count'], 1)
+        self.assertGreater(snapshot['events']['SetCameraZoom']['serialize_seconds'], 0)
+
+    def test_timed_batch_flushes_from_another_thread(self):
+        async def run():
+            self.transport._start()
+            with urchin.batch(flush_interval=0.001):
+                for i in range(2000):
+                    urchin.client.emit('SetCameraZoom', {'c1': i})
+                    urchin.client.emit('Clear', 'mesh')
+                    await asyncio.sleep(0)
+            await urchin.client.drain()
+
+        # a deadlock between the flush thread and the loop would hang asyncio.run
+        thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+        clears = 0
+        zooms = []
+        for event, data in self.transport.sio.emitted:
+            frame = data if event == urchin.client.BATCH_EVENT else [[event, data]]
+            clears += sum(batched_event == 'Clear' for batched_event, _ in frame)
+            zooms += [data['c1'] for batched_event, data in frame if batched_event == 'SetCameraZoom']
+        # every frame arrives and they arrive in order
+        self.assertEqual(clears, 2000)
+        self.assertEqual(zooms, sorted(zooms))
+        self.assertEqual(zooms[-1], 1999)
+
+
+class TestMetrics(TestCase):
+    """Opt-in instrumentation of the emit path"""
+
+    def setUp(self):
+        self.previous = urchin.client.transport
+        urchin.loopback.connect()
+
+    def tearDown(self):
+        urchin.client.disable_metrics()
+        urchin.client.use_transport(self.previous)
+
+    def test_counters_latency_and_exports(self):
+        with tempfile.TemporaryDirectory() as folder:
+            trace = os.path.join(folder, 'trace.jsonl')
+            urchin.client.enable_metrics(trace)
+
+            meshes = urchin.meshes.create(3)
+            with urchin.batch():
+                for mesh in meshes:
+                    mesh.set_position([1000, 0, 0])
+            asyncio.run(urchin.camera.Camera().screenshot([8, 8]))
+
+            snapshot = urchin.client.metrics()
+            prometheus = urchin.client.metrics_prometheus()
+            urchin.client.disable_metrics()
+            with open(trace) as f:
+                records = [json.loads(line) for line in f]
+
+        updates = snapshot['events']['MeshUpdate']
+        self.assertEqual(updates['count'], 6)
+        self.assertGreater(updates['bytes'], 0)
+        self.assertGreater(updates['serialize_seconds'], 0)
+        self.assertEqual(snapshot['events'][urchin.client.BATCH_EVENT]['count'], 1)
+
+        latency = snapshot['requests']['RequestCameraImg']
+        self.assertEqual((latency['count'], latency['failed']), (1, 0))
+        self.assertEqual(latency['buckets'][urchin.client.LATENCY_BUCKETS[-1]], 1)
+        self.assertEqual(snapshot['pending_requests'], 0)
+
+        self.assertIn('urchin_events_total{event="MeshUpdate"} 6', prometheus)
+        self.assertIn('urchin_request_latency_seconds_count{request="RequestCameraImg"} 1', prometheus)
+        self.assertEqual(sum(record.get('event') == 'MeshUpdate' for record in records), 6)
+        self.assertEqual(sum('latency_seconds' in record for record in records), 1)
+
+    def test_disabled_by_default(self):
+        urchin.meshes.create(1)
+        self.assertIsNone(urchin.client.metrics())
+        self.assertEqual(urchin.client.metrics_prometheus(), '')
@@ -0,0 +1,124 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+
+class TestLoopback(TestCase):
+    """Scene state decoded by the in-process loopback renderer"""
+
+    def setUp(self):
+        self.previous = urchin.client.transport
+        self.renderer = urchin.loopback.connect()
+        urchin.cache.clear()
+
+    def tearDown(self):
+        urchin.client.use_transport(self.previous)
+
+    @patch.object(urchin.particles, 'binary', True)
+    def test_particles_and_meshes(self):
+        group = urchin.particles.ParticleGroup(5)
+        group.set_positions(np.arange(15).reshape(5, 3) * 1000)
+        group.set_colors(['#00ff00'] * 2, indices=[1, 3])
+
+        with urchin.batch():
+            meshes = urchin.meshes.create(3)
+            for i, mesh in enumerate(meshes):
+                mesh.set_position([i * 1000, 0, 0])
+
+        particles = self.renderer.scene['particles'][group.id]
+        np.testing.assert_allclose(particles['positions'], np.arange(15).reshape(5, 3), rtol=1e-6)
+        self.assertEqual(particles['colors'][3].tolist(), [0, 255, 0, 255])
+        self.assertEqual([self.renderer.scene['meshes'][mesh.data.id]['Position']['x'] for mesh in meshes], [0, 1, 2])
+        self.assertEqual(self.renderer.events[urchin.client.BATCH_EVENT], 1)
+        self.assertEqual(sum(self.renderer.unhandled.values()), 0)
+
+    def test_bulk_mesh_updates_match_the_models(self):
+        meshes = urchin.meshes.create(4)
+        positions = np.arange(12).reshape(4, 3) * 1000
+        colors = ['#ff0000', '#00ff00', '#0000ff80', '#ffffff']
+
+        scenes = []
+        for binary in (True, False):
+            with patch.object(urchin.meshes, 'binary', binary):
+                urchin.meshes.set_positions(meshes, positions)
+                urchin.meshes.set_scales(meshes, [2, 2, 2])
+                urchin.meshes.set_colors(meshes, colors)
+            scenes.append({mesh.data.id: dict(self.renderer.scene['meshes'][mesh.data.id]) for mesh in meshes})
+
+        self.assertEqual(self.renderer.events['MeshPositionsArray'], 1)
+        self.assertEqual(self.renderer.events['MeshPositions'], 1)
+        for mesh in meshes:
+            packed, models = scenes[0][mesh.data.id], scenes[1][mesh.data.id]
+            for field in ('Position', 'Scale', 'Color'):
+                np.testing.assert_allclose(list(packed[field].values()), list(models[field].values()), rtol=1e-6)
+        self.assertAlmostEqual(scenes[0][meshes[2].data.id]['Color']['a'], 128 / 255)
+        self.assertEqual(scenes[0][meshes[3].data.id]['Scale'], {'x': 2, 'y': 2, 'z': 2})
+        self.assertEqual(sum(self.renderer.unhandled.values()), 0)
+
+    def test_bulk_mesh_models_keep_the_input_floats(self):
+        meshes = urchin.meshes.create(2)
+        urchin.meshes.set_positions(meshes, [[1234.5, 0, 0], [0, 0.1, 0]])
+        urchin.meshes.set_colors(meshes, [[0.3, 0.7, 0.123456], [1, 0, 0]])
+
+        # the JSON models are the default
+        self.assertEqual(self.renderer.events['MeshPositions'], 1)
+        self.assertNotIn('MeshPositionsArray', self.renderer.events)
+
+        first, second = [self.renderer.scene['meshes'][mesh.data.id] for mesh in meshes]
+        self.assertEqual(first['Position']['x'], 1.2345)
+        self.assertEqual(second['Position']['y'], 0.0001)
+        self.assertEqual(first['Color'], {'r': 0.3, 'g': 0.7, 'b': 0.123456, 'a': 1})
+
+    @patch.object(urchin.cache, 'enabled', True)
+    def test_volume_uploads_decode_to_the_input(self):
+        rng = np.random.default_rng(0)
+        volume = rng.integers(0, 254, (20, 16, 12)).astype(np.uint8)
+        volume[:, :8] = 255
+
+        dense = urchin.volumes.Volume(volume)
+        blocks = urchin.volumes.Volume(volume, block_size=500)
+        sparse = urchin.volumes.Volume(volume, sparse=True, brick_size=4)
+        bricked = urchin.volumes.BrickedVolume(volume, brick_size=8, stream=False)
+        bricked.stream()
+
+        for vol in (dense, blocks, sparse, bricked):
+            np.testing.assert_array_equal(self.renderer.volume(vol.id), volume)
+
+        # each upload mode has its own hash, a repeated upload is served from the renderer cache
+        self.assertEqual([vol.cached for vol in (dense, blocks, sparse)], [False, False, False])
+        for kwargs in ({}, {'block_size': 500}, {'sparse': True, 'brick_size': 4}):
+            vol = urchin.volumes.Volume(volume, **kwargs)
+            self.assertTrue(vol.cached)
+            np.testing.assert_array_equal(self.renderer.volume(vol.id), volume)
+
+        dense.update_region(np.s_[0:2, 0:2, 0:2], np.zeros((2, 2, 2)))
+        self.assertTrue(np.all(self.renderer.volume(dense.id)[:2, :2, :2] == 0))
+        self.assertTrue(np.all(self.renderer.volume(blocks.id)[:2, :2, :2] == volume[:2, :2, :2]))
+
+    @patch.object(urchin.cache, 'enabled', True)
+    def test_texture_chunks_and_cache(self):
+        image = np.arange(600, dtype=np.uint16).reshape(20, 30)
+        texture = urchin.texture.Texture()
+
+        with patch.object(urchin.texture, 'CHUNK_SIZE', 300):
+            texture.set_image(image)
+            self.assertEqual(self.renderer.events['SetFOVTextureDataMeta'], 4)
+            self.assertEqual(self.renderer.scene['textures'][texture.id]['image'], image.tobytes())
+
+            # a re-upload only sends the MetaInit with the hash
+            self.renderer.reset_stats()
+            urchin.texture.Texture().set_image(image.copy())
+            self.assertEqual(self.renderer.events['SetFOVTextureData'], 0)
+            self.assertEqual(sum(scene.get('image') == image.tobytes() for scene in self.renderer.scene['textures'].values()), 2)
+
+    def test_screenshot_reply(self):
+        camera = urchin.camera.Camera()
+        camera.set_background_color('#102030')
+        img = asyncio.run(camera.screenshot([32, 16]))
+
+        self.assertEqual(img.size, (32, 16))
+        self.assertEqual(np.array(img)[0, 0].tolist(), [0x10, 0x20, 0x30])
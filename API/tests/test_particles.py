@@ -0,0 +1,76 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+
+class TestParticleGroup(TestCase):
+    """ParticleGroup storage, setters and the messages they send"""
+
+    def setUp(self):
+        self.patch = patch.object(urchin.client, 'sio')
+        self.sio = self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def sent(self, event):
+        return [call[0][1] for call in self.sio.emit.call_args_list if call[0][0] == event]
+
+    def test_per_particle_events_by_default(self):
+        group = urchin.particles.ParticleGroup(3)
+        ids = [f'{group.id}-{i}' for i in range(3)]
+        self.assertEqual(self.sent('CreateParticles'), [ids])
+
+        group.set_positions(np.array([[1000, 2000, 3000]] * 3))
+        group.set_sizes(0.5, indices=[2])
+        group.set_colors([[255, 0, 0]], indices=[1])
+
+        self.assertEqual(self.sent('SetParticlePos')[0], dict.fromkeys(ids, [1.0, 2.0, 3.0]))
+        self.assertEqual(self.sent('SetParticleSize'), [{ids[2]: 0.5}])
+        self.assertEqual(self.sent('SetParticleColor'), [{ids[1]: '#ff0000ff'}])
+        self.assertEqual(group[1].color, '#ff0000ff')
+
+    @patch.object(urchin.particles, 'binary', True)
+    def test_binary_events(self):
+        group = urchin.particles.ParticleGroup(4)
+        self.assertEqual(len(self.sent('ParticleGroupCreate')), 1)
+
+        positions = np.arange(12, dtype=np.float32).reshape(4, 3) * 1000
+        group.set_positions(positions)
+        group.set_colors(np.array([[0, 0.5, 1]]), indices=[3])
+
+        header, arrays = urchin.client.decode_arrays(self.sent('ParticleGroupPositions')[0])
+        self.assertEqual(header['ID'], group.id)
+        np.testing.assert_allclose(arrays['values'], positions / 1000)
+
+        header, arrays = urchin.client.decode_arrays(self.sent('ParticleGroupColors')[0])
+        self.assertEqual(arrays['indices'].tolist(), [3])
+        self.assertEqual(arrays['values'].tolist(), [[0, 128, 255, 255]])
+
+        group.delete()
+        self.assertEqual(self.sent('ParticleGroupDelete'), [group.id])
+
+    def test_setters_store_the_arrays(self):
+        group = urchin.particles.ParticleGroup(3)
+        group.set_sizes(np.array([0.1, 0.2, 0.3]))
+        group[0].set_position([100, 200, 300])
+
+        np.testing.assert_allclose(group.sizes, [0.1, 0.2, 0.3])
+        self.assertEqual(group[0].position, [100, 200, 300])
+        with self.assertRaises(IndexError):
+            group.set_sizes([1.0], indices=[3])
+
+    def test_module_functions_accept_arrays(self):
+        particles = urchin.particles.create(3)
+        urchin.particles.set_sizes(particles, np.array([0.1, 0.2, 0.3]))
+        urchin.particles.set_positions(particles, np.ones((3, 3)) * 1000)
+        urchin.particles.set_colors(particles, np.array([[128, 64, 0]] * 3, dtype=np.int64))
+        urchin.particles.set_sizes(particles[:2], 0.05)
+
+        group = particles[0].group
+        np.testing.assert_allclose(group.sizes, [0.05, 0.05, 0.3])
+        np.testing.assert_allclose(group.positions, np.ones((3, 3)) * 1000)
+        self.assertEqual(group.colors[2].tolist(), [128, 64, 0, 255])
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+import oursin as urchin
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+# seconds, import time depends on the machine so the check only runs when a budget is set
+IMPORT_BUDGET = os.environ.get('URCHIN_IMPORT_BUDGET')
+
+
+class TestStartup(TestCase):
+    """Atlases are only built and parsed when they are used"""
+
+    def test_atlases_are_lazy(self):
+        code = ('import oursin; '
+                'print(any(a._parsed for a in oursin.atlas.Atlas.instances), "ccf25" in vars(oursin.atlas))')
+        self.assertEqual(run_python(code), 'False False')
+
+    @skipUnless(IMPORT_BUDGET, 'set URCHIN_IMPORT_BUDGET (seconds) to check the import time')
+    def test_import_time(self):
+        budget = float(IMPORT_BUDGET)
+        code = 'import time; t = time.perf_counter(); import oursin; print(time.perf_counter() - t)'
+        import_time = min(float(run_python(code)) for _ in range(3))
+        print(f'import oursin: {import_time * 1000:.0f} ms (budget {budget * 1000:.0f} ms)')
+        self.assertLess(import_time, budget)
+
+    def test_load_defers_the_parse(self):
+        previous = urchin.client.transport
+        renderer = urchin.loopback.connect()
+        atlas = urchin.atlas.Atlas('ccf25')
+        parse = atlas._parse
+        try:
+            with patch.object(atlas, '_parse', wraps=parse) as parser:
+                atlas.load()
+                self.assertEqual(parser.call_count, 0)
+                self.assertEqual(renderer.events['urchin-atlas-load'], 1)
+                self.assertNotIn('urchin-atlas-update', renderer.events)
+
+                atlas.root.set_visibility(True, push=False)
+                self.assertEqual(parser.call_count, 1)
+                self.assertEqual(renderer.events['urchin-atlas-update'], 1)
+        finally:
+            urchin.atlas.Atlas.instances.remove(atlas)
+            urchin.client.use_transport(previous)
@@ -1,5 +1,7 @@
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+import numpy as np
 
 import oursin as urchin
 
@@ -17,4 +19,59 @@ class TestClass(TestCase):
         
         self.assertEqual(urchin.utils.sanitize_vector3((1,2,3)), [1,2,3])
         
-        self.assertRaises(Exception, urchin.utils.sanitize_vector3, (1,2))
\ No newline at end of file
+        self.assertRaises(Exception, urchin.utils.sanitize_vector3, (1,2))
+
+    def test_sanitize_vector3_array(self):
+        vectors = urchin.utils.sanitize_vector3_array([[1,2,3],[4,5,6]])
+        self.assertEqual(vectors.shape, (2,3))
+        self.assertEqual(vectors.dtype, np.float32)
+
+        self.assertEqual(urchin.utils.sanitize_vector3_array([1,2,3], 4).shape, (4,3))
+
+        self.assertRaises(ValueError, urchin.utils.sanitize_vector3_array, [[1,2],[3,4]])
+        self.assertRaises(ValueError, urchin.utils.sanitize_vector3_array, [[1,2,3]], 2)
+
+    def test_sanitize_color_array(self):
+        colors = urchin.utils.sanitize_color_array(['#FF0000', '#00ff0080', '#FF0000'])
+        np.testing.assert_array_equal(colors, [[255,0,0,255],[0,255,0,128],[255,0,0,255]])
+
+        colors = urchin.utils.sanitize_color_array([[1,0,0],[0,0.5,1]])
+        np.testing.assert_array_equal(colors, [[255,0,0,255],[0,128,255,255]])
+
+        self.assertEqual(urchin.utils.sanitize_color_array('#FFFFFF', 5).shape, (5,4))
+        self.assertRaises(ValueError, urchin.utils.sanitize_color_array, ['#FFF'])
+
+    def test_emit_arrays_roundtrip(self):
+        positions = np.arange(12, dtype=np.float32).reshape(4,3)
+        colors = np.arange(16, dtype=np.uint8).reshape(4,4)
+
+        with patch.object(urchin.client, 'sio') as sio:
+            urchin.client.emit_arrays('Test', {'ID': 'a'}, positions=positions, colors=colors)
+            event, payload = sio.emit.call_args[0]
+
+        self.assertEqual(event, 'Test')
+        self.assertTrue(all(isinstance(buffer, bytes) for buffer in payload[1:]))
+
+        header, arrays = urchin.client.decode_arrays(payload)
+        self.assertEqual(header['ID'], 'a')
+        np.testing.assert_array_equal(arrays['positions'], positions)
+        np.testing.assert_array_equal(arrays['colors'], colors)
+
+    def test_batch_coalesces_updates(self):
+        with patch.object(urchin.client, 'sio') as sio:
+            with urchin.batch():
+                urchin.client.emit('SetCameraZoom', {'c1': 1.0})
+                urchin.client.emit('SetCameraZoom', {'c2': 1.0})
+                urchin.client.emit('SetCameraZoom', {'c1': 2.0})
+                urchin.client.emit('Clear', 'mesh')
+                urchin.client.emit('SetCameraZoom', {'c2': 3.0})
+                urchin.client.emit('SetCameraZoom', {'c2': 4.0})
+                sio.emit.assert_not_called()
+
+        # writes are replaced in place, but never merged across an un-keyed event
+        sio.emit.assert_called_once_with(urchin.client.BATCH_EVENT, [
+            ['SetCameraZoom', {'c1': 2.0}],
+            ['SetCameraZoom', {'c2': 1.0}],
+            ['Clear', 'mesh'],
+            ['SetCameraZoom', {'c2': 4.0}],
+        ])
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+# stand-in for ffmpeg: copies stdin to the output file (last argument)
+FAKE_FFMPEG = f'''#!{sys.executable}
+import sys, shutil
+with open(sys.argv[-1], 'wb') as f:
+    shutil.copyfileobj(sys.stdin.buffer, f)
+'''
+
+FAILING_FFMPEG = f'''#!{sys.executable}
+import sys
+sys.exit(1)
+'''
+
+
+class TestVideo(TestCase):
+    """Video encoder backends"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ffmpeg = os.path.join(self.tmp.name, 'ffmpeg')
+        with open(self.ffmpeg, 'w') as f:
+            f.write(FAKE_FFMPEG)
+        os.chmod(self.ffmpeg, os.stat(self.ffmpeg).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ffmpeg_streams_raw_frames(self):
+        out_file = os.path.join(self.tmp.name, 'out.mp4')
+        frames = [np.full((6, 8, 3), i, dtype=np.uint8) for i in range(5)]
+
+        writer = urchin.video.open_writer(out_file, 30, (8, 6), ffmpeg=self.ffmpeg)
+        self.assertIsInstance(writer, urchin.video.FFmpegWriter)
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+
+        with open(out_file, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(frame.tobytes() for frame in frames))
+
+    def test_ffmpeg_rejects_wrong_frame_size(self):
+        writer = urchin.video.FFmpegWriter(os.path.join(self.tmp.name, 'out.mp4'), 30, (8, 6), ffmpeg=self.ffmpeg)
+        self.assertRaises(Exception, writer.write, np.zeros((8, 8, 3), dtype=np.uint8))
+        writer.release()
+
+    def test_failed_capture_keeps_its_error(self):
+        failing = os.path.join(self.tmp.name, 'failing-ffmpeg')
+        with open(failing, 'w') as f:
+            f.write(FAILING_FFMPEG)
+        os.chmod(failing, os.stat(failing).st_mode | stat.S_IEXEC)
+
+        def open_writer(file_name, frame_rate, size, backend, **kwargs):
+            return urchin.video.FFmpegWriter(file_name, frame_rate, size, ffmpeg=failing)
+
+        # no renderer replies, the capture times out and ffmpeg then fails on release
+        with patch.object(urchin.client, 'sio'), patch.object(urchin.video, 'open_writer', open_writer):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(urchin.camera.main.capture_video(os.path.join(self.tmp.name, 'out.mp4'), [0, 0, 0], [0, 90, 0],
+                                                             duration=1, size=(8, 6), timeout=0.05))
+        self.assertEqual(urchin.camera.receive_futures, {})
+
+    def test_decode_raw_frame_without_copy(self):
+        buffer = bytearray(np.arange(8 * 6 * 3, dtype=np.uint8).tobytes())
+        frame = urchin.camera._decode_frame(buffer, (8, 6))
+        self.assertEqual(frame.shape, (6, 8, 3))
+        self.assertTrue(np.shares_memory(frame, np.frombuffer(buffer, dtype=np.uint8)))
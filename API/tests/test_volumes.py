@@ -0,0 +1,245 @@
+import json
+import os
+import tempfile
+import zlib
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import oursin as urchin
+
+
+class TestVolumes(TestCase):
+    """Volume quantization and upload"""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.volume = rng.random((40, 30, 20)).astype(np.float32)
+
+    def test_compress_volume_matches_exact_quantiles(self):
+        quantiles = np.quantile(self.volume.flatten(), np.linspace(0, 1, 254))
+        expected = np.digitize(self.volume, quantiles, right=True).astype(np.uint8)
+
+        out, out_quantiles = urchin.volumes.compress_volume(self.volume)
+
+        np.testing.assert_array_equal(out, expected)
+        np.testing.assert_allclose(out_quantiles, quantiles)
+
+    def test_compress_volume_nan_and_memmap(self):
+        volume = self.volume.copy()
+        volume[:10] = np.nan
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out = np.lib.format.open_memmap(os.path.join(tmp, 'out.npy'), mode='w+', dtype=np.uint8, shape=volume.shape)
+            result, quantiles = urchin.volumes.compress_volume(volume, out=out, sample_size=5000)
+
+            self.assertIs(result, out)
+            self.assertTrue(np.all(out[:10] == 255))
+            self.assertLess(out[10:].max(), 254)
+            self.assertFalse(np.any(np.isnan(quantiles)))
+            del out, result
+
+    def test_compress_volume_unsampled_extremes(self):
+        volume = np.random.default_rng(1).random((200, 100, 100), dtype=np.float32)
+        volume[150, 20, 30] = 10
+        volume[60, 70, 80] = -10
+
+        # 100 samples out of 2M voxels leave the single extreme voxels out
+        out, quantiles = urchin.volumes.compress_volume(volume, sample_size=100)
+
+        self.assertEqual((quantiles[0], quantiles[-1]), (-10, 10))
+        self.assertEqual(out[150, 20, 30], 253)
+        self.assertEqual(out[60, 70, 80], 0)
+        self.assertLess(out.max(), 254)
+
+        with self.assertRaises(Exception):
+            urchin.volumes.compress_volume(volume, n_colors=255)
+
+    def test_block_upload_is_byte_identical(self):
+        volume = (self.volume * 254).astype(np.uint8)
+        expected = volume.flatten().tobytes()
+
+        with patch.object(urchin.client, 'sio') as sio:
+            vol = urchin.volumes.Volume(volume.copy(), block_size=1000, workers=4)
+
+        blocks = [call[0][1] for call in sio.emit.call_args_list if call[0][0] == 'SetVolumeBlock']
+        self.assertEqual(len(blocks), vol.n_blocks)
+        self.assertEqual(vol.n_compressed_bytes, sum(len(block[1]) for block in blocks))
+
+        received = bytearray(vol.n_bytes)
+        for header, data in blocks:
+            header = json.loads(header)
+            received[header['offset'] : header['offset'] + header['nBytes']] = zlib.decompress(data)
+
+        self.assertEqual(bytes(received), expected)
+
+    def test_bricked_volume_streams_coarse_first(self):
+        volume = (self.volume * 254).astype(np.uint8)
+
+        with patch.object(urchin.client, 'sio') as sio:
+            vol = urchin.volumes.BrickedVolume(volume, brick_size=8, stream=False)
+            n_sync = vol.n_bricks_sent
+            vol.set_focus([0, 0, 0])
+            vol.stream()
+
+        headers = [json.loads(call[0][1][0]) for call in sio.emit.call_args_list if call[0][0] == 'SetVolumeBrick']
+        self.assertEqual(len(headers), vol.n_bricks)
+        self.assertGreater(n_sync, 0)
+
+        # coarse to fine, and within the full resolution level the brick at the focus comes first
+        levels = [header['level'] for header in headers]
+        self.assertEqual(levels, sorted(levels, reverse=True))
+        self.assertEqual([h for h in headers if h['level'] == 0][0]['index'], [0, 0, 0])
+
+        # the bricks of each level cover it exactly
+        for level, data in enumerate(vol.levels):
+            covered = sum(int(np.prod(h['shape'])) for h in headers if h['level'] == level)
+            self.assertEqual(covered, data.size)
+
+    def test_bricked_volume_reads_slabs(self):
+        volume = np.random.default_rng(0).random((21, 10, 7)).astype(np.float32) * 254
+        volume[3:5] = np.nan
+        expected = np.where(np.isnan(volume), 255, volume).astype(np.uint8)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'volume.npy')
+            np.save(path, volume)
+            source = np.load(path, mmap_mode='r')
+            np.save(path.replace('volume', 'uint8'), expected)
+            uint8_source = np.load(path.replace('volume', 'uint8'), mmap_mode='r')
+
+            with patch.object(urchin.client, 'sio'), patch.object(urchin.volumes, 'SLAB_BYTES', 300):
+                vol = urchin.volumes.BrickedVolume(source, brick_size=4, stream=False)
+                pyramid = urchin.volumes.build_pyramid(uint8_source, brick_size=4)
+
+            # the uint8 memmap is used as is, the float one is converted with NaN -> 255
+            self.assertIs(pyramid[0], uint8_source)
+            np.testing.assert_array_equal(vol.levels[0], expected)
+            reference = urchin.volumes.build_pyramid(expected.copy(), brick_size=4)
+            for level, reference_level in enumerate(reference):
+                np.testing.assert_array_equal(vol.levels[level], reference_level)
+                np.testing.assert_array_equal(pyramid[level], reference_level)
+            del source, uint8_source, pyramid
+
+    def test_downsample_keeps_transparency(self):
+        volume = np.full((4, 4, 3), 255, dtype=np.uint8)
+        volume[:2, :2, :2] = 10
+        volume[0, 0, 0] = 20
+
+        out = urchin.volumes.downsample(volume)
+        self.assertEqual(out.shape, (2, 2, 2))
+        self.assertEqual(out[0, 0, 0], 11)
+        self.assertTrue(np.all(out.flatten()[1:] == 255))
+
+    def test_sparse_upload_roundtrip(self):
+        volume = np.full((40, 30, 20), 255, dtype=np.uint8)
+        volume[3:7, 20:25, 2:4] = 17
+        volume[35:, :2, 19] = 200
+
+        with patch.object(urchin.client, 'sio') as sio:
+            vol = urchin.volumes.Volume(volume.copy(), sparse=True, brick_size=8)
+
+        emits = {call[0][0]: call[0][1] for call in sio.emit.call_args_list}
+        header = json.loads(emits['SetVolumeOccupancy'][0])
+        grid = header['gridShape']
+        occupancy = np.unpackbits(np.frombuffer(emits['SetVolumeOccupancy'][1], np.uint8))[:np.prod(grid)]
+        occupancy = occupancy.reshape(grid).astype(bool)
+        self.assertEqual(occupancy.sum(), vol.n_occupied)
+
+        bricks = np.frombuffer(zlib.decompress(emits['SetVolumeData'][1]), np.uint8).reshape(-1, 8, 8, 8)
+        received = np.full([n * 8 for n in grid], 255, dtype=np.uint8)
+        for brick, index in zip(bricks, np.argwhere(occupancy)):
+            i, j, k = index * 8
+            received[i:i + 8, j:j + 8, k:k + 8] = brick
+
+        np.testing.assert_array_equal(received[:40, :30, :20], volume)
+
+    def test_update_region_coalesces_in_batch(self):
+        volume = (self.volume * 254).astype(np.uint8)
+
+        with patch.object(urchin.client, 'sio') as sio:
+            vol = urchin.volumes.Volume(volume.copy())
+            sio.reset_mock()
+
+            with urchin.batch():
+                vol.update_region(np.s_[0:10, 0:10, 0:10], np.full((10, 10, 10), 1))
+                vol.update_region(np.s_[2:4, 2:4, 2:4], np.full((2, 2, 2), 2))
+                vol.update_region(np.s_[20:30, 0:5, 0:5], np.full((10, 5, 5), 3))
+                vol.update_region(np.s_[20:40, 0:10, 0:10], np.full((20, 10, 10), 4))
+
+            vol.update_region(np.s_[0:1, 0:1, -1:], np.array([[[np.nan]]]))
+
+        self.assertEqual(sio.emit.call_count, 2)
+        header, *buffers = sio.emit.call_args_list[0][0][1]
+        regions = json.loads(header)['regions']
+        self.assertEqual(regions, [{'offset': [0, 0, 0], 'shape': [10, 10, 10]},
+                                   {'offset': [20, 0, 0], 'shape': [20, 10, 10]}])
+
+        for region, buffer in zip(regions, buffers):
+            offset, shape = region['offset'], region['shape']
+            volume[tuple(slice(a, a + b) for a, b in zip(offset, shape))] = np.frombuffer(zlib.decompress(buffer), np.uint8).reshape(shape)
+        self.assertTrue(np.all(volume[2:4, 2:4, 2:4] == 2))
+        self.assertEqual(volume[0, 0, 0], 1)
+        self.assertTrue(np.all(volume[20:40, :10, :10] == 4))
+
+        header, buffer = sio.emit.call_args_list[1][0][1]
+        self.assertEqual(json.loads(header)['regions'], [{'offset': [0, 0, 19], 'shape': [1, 1, 1]}])
+        self.assertEqual(zlib.decompress(buffer), bytes([255]))
+
+    def test_memmap_input_is_read_not_modified(self):
+        volume = self.volume.copy()
+        volume[5:8] = np.nan
+        expected = np.where(np.isnan(volume), 255, volume * 254).astype(np.uint8)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = np.lib.format.open_memmap(os.path.join(tmp, 'volume.npy'), mode='w+', dtype=np.float32, shape=volume.shape)
+            source[:] = np.where(np.isnan(volume), np.nan, volume * 254)
+            source.flush()
+            source = np.load(os.path.join(tmp, 'volume.npy'), mmap_mode='r')
+
+            with patch.object(urchin.client, 'sio') as sio, patch.object(urchin.volumes, 'SLAB_BYTES', 4000):
+                vol = urchin.volumes.Volume(source, block_size=1000)
+                stream = urchin.volumes.Volume(source)
+
+            self.assertNotEqual(vol.hash, stream.hash)
+            self.assertTrue(np.all(np.isnan(source[5:8])))
+            del source
+
+        blocks = [call[0][1] for call in sio.emit.call_args_list if call[0][0] == 'SetVolumeBlock']
+        received = bytearray(vol.n_bytes)
+        for header, data in blocks:
+            header = json.loads(header)
+            received[header['offset'] : header['offset'] + header['nBytes']] = zlib.decompress(data)
+        self.assertEqual(bytes(received), expected.tobytes())
+
+        chunks = [call[0][1] for call in sio.emit.call_args_list if call[0][0] == 'SetVolumeData']
+        self.assertEqual(zlib.decompress(b''.join(chunk[1] for chunk in chunks)), expected.tobytes())
+
+    def test_colormap_matches_legacy_layout(self):
+        # legacy builder: one hex string per index, reserved colors appended
+        expected = ['#%02x%02x%02x%02x' % (0, int(np.round(i / 252 * 255)), 0, 255) for i in range(252)]
+        expected += ['#ff0000ff', '#0000ffff']
+        self.assertEqual(urchin.volumes.colormap('greens', ['#ff0000', '#0000ff']), expected)
+
+        # datapoints=None used to crash, datapoints resample the map non-uniformly
+        lut = urchin.volumes.colormap_lut('viridis', datapoints=np.linspace(0, 1, 254) ** 2)
+        self.assertEqual(lut.shape, (256, 4))
+        self.assertEqual(lut[0].tolist(), [0x44, 0x01, 0x54, 255])
+        self.assertEqual(lut[253].tolist(), [0xfd, 0xe7, 0x25, 255])
+        self.assertEqual(lut[255, 3], 0)
+
+    def test_colormap_is_sent_as_packed_table(self):
+        volume = (self.volume * 254).astype(np.uint8)
+        lut = urchin.volumes.colormap_lut(control_points=[(0, '#000000'), (1, '#ff0000')])
+
+        with patch.object(urchin.client, 'sio') as sio:
+            vol = urchin.volumes.Volume(volume, colormap=urchin.volumes.colormap('reds'))
+            vol.set_colormap(lut)
+
+        tables = [call[0][1] for call in sio.emit.call_args_list if call[0][0] == 'SetVolumeColormap']
+        self.assertEqual(len(tables), 2)
+        self.assertTrue(all(len(table[1]) == 1024 for table in tables))
+        np.testing.assert_array_equal(np.frombuffer(tables[1][1], np.uint8).reshape(256, 4), lut)
+        # the hex list and the control points describe the same map
+        self.assertEqual(tables[0][1][:254 * 4], tables[1][1][:254 * 4])
@@ -29,7 +29,7 @@ Socket2Type = {};
 
 reserved_messages = ['connection','disconnect','ID','CameraImgMeta','CameraImg',
                       'log','log-warning','log-error',
-                    'VolumeClick', 'NeuronCallback']
+                    'VolumeClick', 'NeuronCallback', 'urchin-cache-reply', 'urchin-batch']
 
 io.on("connection", function (socket) {
   console.log("Client connected with ID: " + socket.id);
@@ -89,6 +89,9 @@ io.on("connection", function (socket) {
   socket.on('NeuronCallback', function(data) {
     emitToSender(socket.id, 'NeuronCallback', data);
   });
+  socket.on('urchin-cache-reply', function(data) {
+    emitToSender(socket.id, 'urchin-cache-reply', data);
+  });
   
   // Receiver events
   socket.on('log', function(data) {
@@ -101,6 +104,14 @@ io.on("connection", function (socket) {
     emitToSender(socket.id, 'log-error', data);
   });
 
+  // Sender events
+  // A batch frame is a list of [event, data] pairs, the renderer receives them as separate events, in order
+  socket.on('urchin-batch', function(frame) {
+    for (var [event, data] of frame) {
+      emitToReceiver(socket.id, event, data);
+    }
+  });
+
   // For all remaining events, asssume they are a sender -> receiver broadcast and emit them automatically
   socket.onAny((eventName, data) => {
     if (!reserved_messages.includes(eventName)) {